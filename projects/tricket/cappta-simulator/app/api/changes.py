@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
+from datetime import datetime
+
+from app.models.change import ChangeEntity, ChangeFeedResponse
+from app.services.change_feed import ChangeFeed, ChangeFeedUnavailableError
+from app.api.auth import verify_token_and_ip
+from config.serialization import FastJSONResponse
+from config.settings import settings
+
+router = APIRouter()
+
+@router.get("/", response_model=ChangeFeedResponse)
+async def list_changes(
+    after: int = Query(0, ge=0, description="Último seq já processado (0 para começar do início)"),
+    limit: int = Query(settings.CHANGE_FEED_DEFAULT_LIMIT, ge=1, le=settings.CHANGE_FEED_MAX_LIMIT),
+    entity: Optional[List[ChangeEntity]] = Query(None, description="Restringe o feed a estas entidades"),
+    _: str = Depends(verify_token_and_ip)
+):
+    """Feed incremental de mudanças para conciliação
+    
+    Retorna transações, liquidações e estornos criados ou alterados depois
+    de `after`, em ordem de seq. Para sincronizar, chame de novo com
+    `after=next_after` até `has_more` ser false; a próxima rodada começa do
+    último `next_after` recebido.
+    """
+    
+    try:
+        feed = await ChangeFeed().changes_after(after, limit, entity)
+        
+        # Resposta montada direto em dict: páginas de milhares de itens sem validação pydantic
+        return FastJSONResponse(content={
+            "success": True,
+            "message": f"Found {len(feed['changes'])} changes",
+            "timestamp": datetime.utcnow(),
+            **feed
+        })
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except ChangeFeedUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to list changes: {str(e)}"
+        )
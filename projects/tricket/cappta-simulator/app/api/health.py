@@ -3,8 +3,12 @@ from datetime import datetime
 import psutil
 import os
 
-from app.database.connection import test_connection
+from app.database.connection import test_async_connection
 from app.services.asaas_client import AsaasClient
+from app.services.webhook_sender import webhook_dispatcher
+from app.services.http_client import http_client_pool
+from app.middleware.audit import audit_log_writer
+from config.logging import get_logging_stats
 from config.settings import settings
 
 router = APIRouter()
@@ -37,7 +41,7 @@ async def detailed_health_check():
     
     # Verifica conexão com banco de dados
     try:
-        db_healthy = test_connection()
+        db_healthy = await test_async_connection()
         health_data["checks"]["database"] = {
             "status": "healthy" if db_healthy else "unhealthy",
             "details": "SQLite connection test"
@@ -71,11 +75,24 @@ async def detailed_health_check():
             "details": f"Asaas client error: {str(e)}"
         }
     
-    # Verifica configuração do webhook
+    # Verifica configuração do webhook e fila de entrega
     health_data["checks"]["webhook"] = {
         "status": "configured" if settings.TRICKET_WEBHOOK_URL else "not_configured",
         "details": f"Webhook URL: {settings.TRICKET_WEBHOOK_URL}"
     }
+    try:
+        health_data["checks"]["webhook"]["delivery"] = await webhook_dispatcher.get_stats()
+    except Exception as e:
+        health_data["checks"]["webhook"]["delivery"] = {"error": str(e)}
+    
+    # Uso dos clientes HTTP compartilhados
+    health_data["http_clients"] = http_client_pool.get_metrics()
+    
+    # Filas de log e de auditoria (registros descartados quando cheias)
+    health_data["logging"] = {
+        "log_queue": get_logging_stats(),
+        "audit_writer": audit_log_writer.get_stats()
+    }
     
     # Informações do sistema
     try:
@@ -110,7 +127,7 @@ async def readiness_check():
     
     # Database
     try:
-        if test_connection():
+        if await test_async_connection():
             checks.append({"name": "database", "status": "ready"})
         else:
             checks.append({"name": "database", "status": "not_ready"})
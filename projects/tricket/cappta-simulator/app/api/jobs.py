@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import Optional
+from datetime import datetime
+
+from app.models.job import JobListResponse, JobRunListResponse, JobRunStatus
+from app.services.scheduler import job_scheduler
+from app.api.auth import verify_token_and_ip
+from config.serialization import FastJSONResponse
+
+router = APIRouter()
+
+@router.get("/", response_model=JobListResponse)
+async def list_jobs(
+    _: str = Depends(verify_token_and_ip)
+):
+    """Jobs periódicos registrados, próxima execução neste worker e lease no cluster"""
+    
+    try:
+        jobs = await job_scheduler.list_jobs()
+        
+        return FastJSONResponse(content={
+            "success": True,
+            "message": f"Found {len(jobs)} scheduled jobs",
+            "timestamp": datetime.utcnow(),
+            "owner": job_scheduler.owner,
+            "running": job_scheduler.is_running,
+            "jobs": jobs
+        })
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to list jobs: {str(e)}"
+        )
+
+@router.get("/runs", response_model=JobRunListResponse)
+async def list_job_runs(
+    job: Optional[str] = Query(None, description="Filtra pelo nome do job"),
+    run_status: Optional[JobRunStatus] = Query(None, alias="status"),
+    limit: int = Query(50, ge=1, le=500),
+    _: str = Depends(verify_token_and_ip)
+):
+    """Histórico de execuções dos jobs (todos os workers), mais recentes primeiro"""
+    
+    try:
+        runs = await job_scheduler.list_runs(job, run_status, limit)
+        
+        return FastJSONResponse(content={
+            "success": True,
+            "message": f"Found {len(runs)} job runs",
+            "timestamp": datetime.utcnow(),
+            "runs": runs
+        })
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to list job runs: {str(e)}"
+        )
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
 
-from app.database.connection import get_db_session
+from app.database.connection import get_db
 from app.services.merchant_plan_service import MerchantPlanService
 from app.models.merchant_plan import (
     MerchantPlanCreate, MerchantPlanUpdate, MerchantPlanResponse, MerchantPlanListResponse,
     MerchantPlanAssociation, MerchantPlanAssociationResponse, PlanCalculation,
-    PlanFilter, PlanSort, PlanStatus, PaymentMethod
+    PlanFilter, PlanSort, PlanStatus, PaymentMethod,
+    PlanQuoteRequest, PlanQuoteMatrix, PlanQuoteResponse
 )
+from config.serialization import FastJSONResponse
 from app.middleware.reseller_auth import require_reseller, ResellerAuth
 from config.logging import get_logger
 
@@ -20,7 +22,7 @@ router = APIRouter()
 async def create_merchant_plan(
     plan_data: MerchantPlanCreate,
     reseller: ResellerAuth = Depends(require_reseller),
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db)
 ):
     """
     Criar um novo plano de merchant
@@ -78,7 +80,7 @@ async def list_merchant_plans(
     per_page: int = Query(20, ge=1, le=100, description="Itens por página"),
     
     reseller: ResellerAuth = Depends(require_reseller),
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db)
 ):
     """
     Listar planos de merchant do reseller
@@ -130,7 +132,7 @@ async def list_merchant_plans(
 async def get_merchant_plan(
     plan_id: str,
     reseller: ResellerAuth = Depends(require_reseller),
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db)
 ):
     """
     Buscar um plano de merchant específico por ID
@@ -173,7 +175,7 @@ async def update_merchant_plan(
     plan_id: str,
     update_data: MerchantPlanUpdate,
     reseller: ResellerAuth = Depends(require_reseller),
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db)
 ):
     """
     Atualizar dados de um plano de merchant
@@ -226,7 +228,7 @@ async def associate_plan_to_merchant(
     merchant_id: str,
     association: MerchantPlanAssociation,
     reseller: ResellerAuth = Depends(require_reseller),
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db)
 ):
     """
     Associar um plano a um merchant
@@ -282,7 +284,7 @@ async def calculate_transaction_fees(
     payment_method: PaymentMethod = Query(..., description="Método de pagamento"),
     installments: int = Query(1, ge=1, le=24, description="Número de parcelas"),
     reseller: ResellerAuth = Depends(require_reseller),
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db)
 ):
     """
     Calcular taxas para uma transação usando um plano específico
@@ -325,6 +327,11 @@ async def calculate_transaction_fees(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error calculating transaction fees: {str(e)}")
         raise HTTPException(
@@ -332,10 +339,132 @@ async def calculate_transaction_fees(
             detail="Internal server error while calculating transaction fees"
         )
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already covers this ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _quote_response(
+    request: Request,
+    plan_id: str,
+    quote_request: PlanQuoteRequest,
+    reseller_id: str,
+    db: Session
+) -> Response:
+    plan_service = MerchantPlanService(db)
+    schedule = plan_service.get_fee_schedule(plan_id, reseller_id)
+    
+    if not schedule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Merchant plan {plan_id} not found"
+        )
+    
+    # The ETag only depends on the plan version and the request, so a
+    # revalidation is answered before any fee is computed
+    etag = plan_service.quote_etag(schedule, quote_request)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    try:
+        quote = plan_service.quote_fees(schedule, quote_request)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    logger.debug("Plan fees quoted via API", extra={
+        "plan_id": plan_id,
+        "plan_version": schedule.version,
+        "count": quote["count"],
+        "reseller_id": reseller_id
+    })
+    
+    # Columnar lists are returned as built, without a pydantic round trip
+    return FastJSONResponse(content=quote, headers=headers)
+
+@router.post("/{plan_id}/quotes", response_model=PlanQuoteResponse)
+def quote_transaction_fees(
+    plan_id: str,
+    quote_request: PlanQuoteRequest,
+    request: Request,
+    reseller: ResellerAuth = Depends(require_reseller),
+    db: Session = Depends(get_db)
+):
+    """
+    Cotar taxas de várias transações em uma única chamada
+    
+    Aceita um dos formatos:
+    - **quotes**: lista de combinações `{amount, payment_method, installments}`
+    - **matrix**: `{amounts, payment_methods, max_installments}` - cota todas as
+      combinações; parcelas de 1 até `max_installments` apenas no crédito
+    
+    A resposta é colunar: a posição i de `amount`, `payment_method`,
+    `installments`, `total_fee` e `net_amount` descreve a mesma combinação.
+    
+    Responde com `ETag` (versão do plano + conteúdo da cotação); enviar o valor
+    em `If-None-Match` retorna 304 enquanto o plano não mudar.
+    """
+    try:
+        return _quote_response(request, plan_id, quote_request, reseller.reseller_id, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error quoting transaction fees: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while quoting transaction fees"
+        )
+
+@router.get("/{plan_id}/quotes/matrix", response_model=PlanQuoteResponse)
+def quote_fee_matrix(
+    plan_id: str,
+    request: Request,
+    amounts: List[int] = Query(..., description="Valores em centavos (repetir o parâmetro)"),
+    payment_methods: Optional[List[PaymentMethod]] = Query(None, description="Métodos de pagamento (padrão: todos)"),
+    max_installments: Optional[int] = Query(None, ge=1, le=24, description="Parcelas máximas no crédito"),
+    reseller: ResellerAuth = Depends(require_reseller),
+    db: Session = Depends(get_db)
+):
+    """
+    Matriz de taxas (valores x métodos x parcelas) via GET
+    
+    Mesmo resultado de `POST /{plan_id}/quotes` com `matrix`, mas cacheável por
+    URL - indicado para páginas de preço. Suporta `If-None-Match`/`ETag`.
+    """
+    try:
+        matrix = {"amounts": amounts, "max_installments": max_installments}
+        if payment_methods:
+            matrix["payment_methods"] = payment_methods
+        quote_request = PlanQuoteRequest(matrix=PlanQuoteMatrix(**matrix))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    try:
+        return _quote_response(request, plan_id, quote_request, reseller.reseller_id, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error quoting fee matrix: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while quoting transaction fees"
+        )
+
 @router.post("/create-defaults", response_model=List[MerchantPlanResponse])
 async def create_default_plans(
     reseller: ResellerAuth = Depends(require_reseller),
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db)
 ):
     """
     Criar planos padrão para o reseller
@@ -370,7 +499,7 @@ async def create_default_plans(
 async def delete_merchant_plan(
     plan_id: str,
     reseller: ResellerAuth = Depends(require_reseller),
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db)
 ):
     """
     Excluir ou desativar um plano de merchant
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import Optional, List
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.connection import get_db
+from app.database.connection import get_async_db, get_async_read_db
 from app.database.models import MerchantDB
 from app.models.merchant import MerchantCreate, MerchantCreateResponse, MerchantListResponse, MerchantResponse
 from app.models.common import ErrorResponse
@@ -14,15 +15,13 @@ router = APIRouter()
 async def create_merchant(
     merchant_data: MerchantCreate,
     _: str = Depends(verify_token_and_ip),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cadastra um novo comerciante no simulador"""
     
     try:
         # Verifica se já existe comerciante com mesmo ID
-        existing_merchant = db.query(MerchantDB).filter(
-            MerchantDB.merchant_id == merchant_data.merchant_id
-        ).first()
+        existing_merchant = await db.get(MerchantDB, merchant_data.merchant_id)
         
         if existing_merchant:
             return MerchantCreateResponse(
@@ -32,9 +31,9 @@ async def create_merchant(
             )
         
         # Verifica se já existe comerciante com mesmo documento
-        existing_document = db.query(MerchantDB).filter(
-            MerchantDB.document == merchant_data.document
-        ).first()
+        existing_document = (await db.execute(
+            select(MerchantDB).where(MerchantDB.document == merchant_data.document)
+        )).scalars().first()
         
         if existing_document:
             raise HTTPException(
@@ -43,9 +42,9 @@ async def create_merchant(
             )
         
         # Verifica se já existe comerciante com mesma conta Asaas
-        existing_asaas = db.query(MerchantDB).filter(
-            MerchantDB.asaas_account_id == merchant_data.asaas_account_id
-        ).first()
+        existing_asaas = (await db.execute(
+            select(MerchantDB).where(MerchantDB.asaas_account_id == merchant_data.asaas_account_id)
+        )).scalars().first()
         
         if existing_asaas:
             raise HTTPException(
@@ -64,8 +63,8 @@ async def create_merchant(
         )
         
         db.add(db_merchant)
-        db.commit()
-        db.refresh(db_merchant)
+        await db.commit()
+        await db.refresh(db_merchant)
         
         return MerchantCreateResponse(
             success=True,
@@ -76,7 +75,7 @@ async def create_merchant(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create merchant: {str(e)}"
@@ -86,13 +85,11 @@ async def create_merchant(
 async def get_merchant(
     merchant_id: str,
     _: str = Depends(verify_token_and_ip),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Consulta dados de um comerciante"""
     
-    merchant = db.query(MerchantDB).filter(
-        MerchantDB.merchant_id == merchant_id
-    ).first()
+    merchant = await db.get(MerchantDB, merchant_id)
     
     if not merchant:
         raise HTTPException(
@@ -112,21 +109,25 @@ async def list_merchants(
     per_page: int = Query(20, ge=1, le=100),
     is_active: Optional[bool] = Query(None),
     _: str = Depends(verify_token_and_ip),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Lista comerciantes com paginação"""
     
-    query = db.query(MerchantDB)
+    query = select(MerchantDB)
     
     if is_active is not None:
-        query = query.filter(MerchantDB.is_active == is_active)
+        query = query.where(MerchantDB.is_active == is_active)
     
     # Conta total
-    total = query.count()
+    total = (await db.execute(
+        select(func.count()).select_from(query.subquery())
+    )).scalar_one()
     
     # Paginação
     offset = (page - 1) * per_page
-    merchants = query.order_by(MerchantDB.created_at.desc()).offset(offset).limit(per_page).all()
+    merchants = (await db.execute(
+        query.order_by(MerchantDB.created_at.desc()).offset(offset).limit(per_page)
+    )).scalars().all()
     
     return MerchantListResponse(
         success=True,
@@ -140,13 +141,11 @@ async def update_merchant_status(
     merchant_id: str,
     is_active: bool,
     _: str = Depends(verify_token_and_ip),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Atualiza status ativo/inativo do comerciante"""
     
-    merchant = db.query(MerchantDB).filter(
-        MerchantDB.merchant_id == merchant_id
-    ).first()
+    merchant = await db.get(MerchantDB, merchant_id)
     
     if not merchant:
         raise HTTPException(
@@ -155,8 +154,8 @@ async def update_merchant_status(
         )
     
     merchant.is_active = is_active
-    db.commit()
-    db.refresh(merchant)
+    await db.commit()
+    await db.refresh(merchant)
     
     status_text = "activated" if is_active else "deactivated"
     
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
+from datetime import date, datetime
 
 from app.models.settlement import (
     SettlementCreate,
     SettlementCreateResponse,
     SettlementListResponse
 )
-from app.models.common import SettlementStatus, ErrorResponse
+from app.models.common import SettlementStatus, ExportFormat, ErrorResponse
 from app.services.settlement_processor import SettlementProcessor
+from app.services.data_exporter import DataExporter
 from app.api.auth import verify_token_and_ip
 
 router = APIRouter()
@@ -40,6 +43,44 @@ async def create_settlement(
             detail=f"Failed to create settlement: {str(e)}"
         )
 
+@router.get("/export")
+async def export_settlements(
+    format: ExportFormat = Query(ExportFormat.NDJSON, description="ndjson (uma linha JSON por registro) ou csv"),
+    merchant_id: Optional[str] = Query(None),
+    settlement_status: Optional[SettlementStatus] = Query(None, alias="status"),
+    created_from: Optional[datetime] = Query(None, description="created_at >= created_from"),
+    created_to: Optional[datetime] = Query(None, description="created_at < created_to"),
+    updated_since: Optional[datetime] = Query(None, description="Criadas ou alteradas desde (sincronização incremental)"),
+    _: str = Depends(verify_token_and_ip)
+):
+    """Exporta liquidações em streaming (NDJSON ou CSV)
+    
+    Lê as linhas com um cursor do servidor, em ordem de (created_at, settlement_id),
+    e escreve em lotes com memória constante: serve para conciliações que
+    precisam de milhões de linhas numa única requisição.
+    """
+    
+    try:
+        stream = DataExporter().export_settlements(
+            format,
+            merchant_id=merchant_id,
+            status=settlement_status,
+            created_from=created_from,
+            created_to=created_to,
+            updated_since=updated_since
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return StreamingResponse(
+        stream,
+        media_type="text/csv; charset=utf-8" if format == ExportFormat.CSV else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="settlements.{format.value}"'}
+    )
+
 @router.get("/{settlement_id}", response_model=SettlementCreateResponse)
 async def get_settlement(
     settlement_id: str,
@@ -74,20 +115,22 @@ async def get_settlement(
 @router.get("/", response_model=SettlementListResponse)
 async def list_settlements(
     merchant_id: Optional[str] = Query(None),
-    status: Optional[SettlementStatus] = Query(None),
+    settlement_status: Optional[SettlementStatus] = Query(None, alias="status"),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor opaco retornado em next_cursor (ignora page)"),
     _: str = Depends(verify_token_and_ip)
 ):
     """Lista liquidações com filtros"""
     
     try:
         processor = SettlementProcessor()
-        settlements = await processor.list_settlements(
+        settlements, cursor_out = await processor.list_settlements(
             merchant_id=merchant_id,
-            status=status,
+            status=settlement_status,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor
         )
         
         return SettlementListResponse(
@@ -96,9 +139,15 @@ async def list_settlements(
             data=settlements,
             total=len(settlements),
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            next_cursor=cursor_out
         )
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -113,11 +162,12 @@ async def trigger_auto_settlement(
     
     try:
         processor = SettlementProcessor()
-        await processor.auto_settle_eligible_transactions()
+        result = await processor.auto_settle_eligible_transactions()
         
         return {
             "success": True,
-            "message": "Auto settlement process triggered successfully"
+            "message": "Auto settlement process triggered successfully",
+            "data": result
         }
         
     except Exception as e:
@@ -126,6 +176,38 @@ async def trigger_auto_settlement(
             detail=f"Failed to trigger auto settlement: {str(e)}"
         )
 
+@router.post("/replay")
+async def replay_settlements(
+    up_to: date = Query(..., description="Liquida as coortes com data prevista até esta data (inclusive)"),
+    _: str = Depends(verify_token_and_ip)
+):
+    """Liquida retroativamente as coortes previstas até `up_to` (backfill)
+    
+    Cada comerciante recebe uma liquidação por data prevista, com
+    settlement_date igual à data original da coorte.
+    """
+    
+    try:
+        processor = SettlementProcessor()
+        result = await processor.settle_due_cohorts(up_to)
+        
+        return {
+            "success": True,
+            "message": f"Settlement cohorts up to {up_to.isoformat()} processed",
+            "data": result
+        }
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to replay settlements: {str(e)}"
+        )
+
 @router.get("/merchant/{merchant_id}/summary")
 async def get_merchant_settlement_summary(
     merchant_id: str,
@@ -136,30 +218,13 @@ async def get_merchant_settlement_summary(
     try:
         processor = SettlementProcessor()
         
-        # Lista todas as liquidações do comerciante
-        settlements = await processor.list_settlements(merchant_id=merchant_id, page=1, per_page=1000)
-        
-        # Calcula estatísticas
-        pending_settlements = [s for s in settlements if s.status == SettlementStatus.PENDING]
-        completed_settlements = [s for s in settlements if s.status == SettlementStatus.COMPLETED]
-        
-        pending_amount = sum(s.net_amount for s in pending_settlements)
-        completed_amount = sum(s.net_amount for s in completed_settlements)
-        
-        last_settlement = max(settlements, key=lambda s: s.settlement_date) if settlements else None
+        # Agregado calculado no banco (ou lido do rollup, se habilitado)
+        summary = await processor.get_merchant_summary(merchant_id)
         
         return {
             "success": True,
             "message": "Settlement summary generated",
-            "data": {
-                "merchant_id": merchant_id,
-                "pending_settlements": len(pending_settlements),
-                "pending_amount": pending_amount,
-                "completed_settlements": len(completed_settlements),
-                "completed_amount": completed_amount,
-                "total_settlements": len(settlements),
-                "last_settlement_date": last_settlement.settlement_date if last_settlement else None
-            }
+            "data": summary.model_dump()
         }
         
     except Exception as e:
@@ -62,7 +62,7 @@ async def create_terminal(
 async def list_terminals(
     # Filtering parameters
     merchant_id: Optional[str] = Query(None, description="Filtrar por merchant ID"),
-    status: Optional[TerminalStatus] = Query(None, description="Filtrar por status"),
+    terminal_status: Optional[TerminalStatus] = Query(None, alias="status", description="Filtrar por status"),
     serial_number: Optional[str] = Query(None, description="Filtrar por serial number (busca parcial)"),
     brand: Optional[CardBrand] = Query(None, description="Filtrar por bandeira aceita"),
     has_pos_devices: Optional[bool] = Query(None, description="Filtrar terminais com/sem dispositivos POS"),
@@ -73,6 +73,8 @@ async def list_terminals(
     # Pagination parameters
     page: int = Query(1, ge=1, description="Número da página"),
     per_page: int = Query(20, ge=1, le=100, description="Itens por página"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco retornado em next_cursor (ignora page)"),
+    include_total: bool = Query(True, description="Calcular total de registros (COUNT)"),
     
     reseller: ResellerAuth = Depends(require_reseller),
     db: Session = Depends(get_db_session)
@@ -94,7 +96,7 @@ async def list_terminals(
         
         filters = TerminalFilter(
             merchant_id=merchant_id,
-            status=status,
+            status=terminal_status,
             serial_number=serial_number,
             brand=brand,
             has_pos_devices=has_pos_devices
@@ -105,7 +107,9 @@ async def list_terminals(
             filters=filters,
             sort=sort,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor,
+            include_total=include_total
         )
         
         logger.info(f"Terminals listed via API", extra={
@@ -117,6 +121,11 @@ async def list_terminals(
         
         return terminals
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error listing terminals: {str(e)}")
         raise HTTPException(
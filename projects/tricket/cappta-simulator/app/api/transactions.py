@@ -1,16 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import logging
+import uuid
 from datetime import datetime
 
 from app.models.transaction import (
     TransactionCreate, 
     TransactionCreateResponse, 
     TransactionListResponse,
-    TransactionStatusUpdate
+    TransactionStatusUpdate,
+    TransactionSimulationRequest,
+    BulkItemStatus,
+    BulkTransactionResponse
 )
-from app.models.common import TransactionStatus, ErrorResponse
+from app.models.common import TransactionStatus, ExportFormat, ErrorResponse
 from app.services.transaction_processor import TransactionProcessor
+from app.services.transaction_simulator import TransactionSimulator
+from app.services.data_exporter import DataExporter
 from app.api.auth import verify_token_and_ip
+from config.serialization import FastJSONResponse, dumps, loads
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -42,6 +55,187 @@ async def create_transaction(
             detail=f"Failed to create transaction: {str(e)}"
         )
 
+def _parse_bulk_item(index: int, item: Any) -> Tuple[Optional[TransactionCreate], Optional[Dict[str, Any]]]:
+    """Valida um item do lote: (transação, None) ou (None, resultado de erro)"""
+    
+    def error(message: str) -> Dict[str, Any]:
+        return TransactionProcessor.bulk_item_result(
+            index, BulkItemStatus.ERROR,
+            item.get("external_event_id") if isinstance(item, dict) else None,
+            error=message
+        )
+    
+    if not isinstance(item, dict):
+        return None, error("Item must be a JSON object")
+    
+    # O NSU padrão de 6 dígitos colide com frequência em milhares de itens
+    if not item.get("nsu"):
+        item["nsu"] = f"{uuid.uuid4().int % 10**20:020d}"
+    if not item.get("transaction_id"):
+        item["transaction_id"] = f"txn_{uuid.uuid4().hex}"
+    
+    try:
+        return TransactionCreate.model_validate(item), None
+    except ValidationError as e:
+        return None, error("; ".join(
+            f"{'.'.join(str(part) for part in err['loc']) or 'item'}: {err['msg']}" for err in e.errors()
+        ))
+
+async def _ndjson_items(request: Request) -> AsyncIterator[Any]:
+    """Itens de um corpo NDJSON, lidos à medida que chegam"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield _loads_line(line)
+    if buffer.strip():
+        yield _loads_line(buffer)
+
+def _loads_line(line: bytes) -> Any:
+    try:
+        return loads(line)
+    except ValueError:
+        # Linha inválida vira erro do item, sem derrubar o lote
+        return None
+
+@router.post("/bulk", response_model=BulkTransactionResponse)
+async def create_transactions_bulk(
+    request: Request,
+    _: str = Depends(verify_token_and_ip)
+):
+    """Cria transações em lote (replay de capturas)
+    
+    Aceita um array JSON de transações (mesmo formato do POST /transactions)
+    ou um stream NDJSON (`Content-Type: application/x-ndjson`), processado
+    em lotes à medida que chega.
+    
+    Idempotente por `external_event_id`: itens já gravados voltam como
+    `duplicate` com os dados da transação original. Retorna um resultado por
+    item, na ordem enviada; erros de validação afetam só o próprio item.
+    """
+    
+    processor = TransactionProcessor()
+    chunk_size = settings.BULK_TRANSACTIONS_CHUNK_SIZE
+    max_items = settings.BULK_TRANSACTIONS_MAX_ITEMS
+    results: List[Dict[str, Any]] = []
+    pending: List[Tuple[int, TransactionCreate]] = []
+    
+    async def flush():
+        results.extend(await processor.create_transactions_bulk(pending))
+        pending.clear()
+    
+    async def add(index: int, item: Any):
+        if index >= max_items:
+            results.append(TransactionProcessor.bulk_item_result(
+                index, BulkItemStatus.ERROR, None,
+                error=f"Bulk request limit of {max_items} items exceeded"
+            ))
+            return
+        
+        transaction, error = _parse_bulk_item(index, item)
+        if error:
+            results.append(error)
+        else:
+            pending.append((index, transaction))
+            if len(pending) >= chunk_size:
+                await flush()
+    
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            index = 0
+            async for item in _ndjson_items(request):
+                await add(index, item)
+                index += 1
+        else:
+            try:
+                items = loads(await request.body())
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body")
+            
+            if not isinstance(items, list):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Body must be a JSON array of transactions"
+                )
+            if len(items) > max_items:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Bulk request limit of {max_items} items exceeded"
+                )
+            
+            for index, item in enumerate(items):
+                await add(index, item)
+        
+        if pending:
+            await flush()
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk transaction ingestion failed after {len(results)} items: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create transactions: {str(e)}"
+        )
+    
+    results.sort(key=lambda result: result["index"])
+    counts = {item_status.value: 0 for item_status in BulkItemStatus}
+    for result in results:
+        counts[result["result"]] += 1
+    
+    # Resposta montada direto em dict: milhares de itens sem validação pydantic
+    return FastJSONResponse(content={
+        "success": True,
+        "message": f"Processed {len(results)} transactions",
+        "timestamp": datetime.utcnow(),
+        "total": len(results),
+        "created": counts[BulkItemStatus.CREATED.value],
+        "duplicates": counts[BulkItemStatus.DUPLICATE.value],
+        "errors": counts[BulkItemStatus.ERROR.value],
+        "results": results
+    })
+
+@router.get("/export")
+async def export_transactions(
+    format: ExportFormat = Query(ExportFormat.NDJSON, description="ndjson (uma linha JSON por registro) ou csv"),
+    merchant_id: Optional[str] = Query(None),
+    transaction_status: Optional[TransactionStatus] = Query(None, alias="status"),
+    created_from: Optional[datetime] = Query(None, description="created_at >= created_from"),
+    created_to: Optional[datetime] = Query(None, description="created_at < created_to"),
+    updated_since: Optional[datetime] = Query(None, description="Criadas ou alteradas desde (sincronização incremental)"),
+    _: str = Depends(verify_token_and_ip)
+):
+    """Exporta transações em streaming (NDJSON ou CSV)
+    
+    Lê as linhas com um cursor do servidor, em ordem de (created_at, transaction_id),
+    e escreve em lotes com memória constante: serve para conciliações que
+    precisam de milhões de linhas numa única requisição.
+    """
+    
+    try:
+        stream = DataExporter().export_transactions(
+            format,
+            merchant_id=merchant_id,
+            status=transaction_status,
+            created_from=created_from,
+            created_to=created_to,
+            updated_since=updated_since
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return StreamingResponse(
+        stream,
+        media_type="text/csv; charset=utf-8" if format == ExportFormat.CSV else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format.value}"'}
+    )
+
 @router.get("/{transaction_id}", response_model=TransactionCreateResponse)
 async def get_transaction(
     transaction_id: str,
@@ -76,20 +270,22 @@ async def get_transaction(
 @router.get("/", response_model=TransactionListResponse)
 async def list_transactions(
     merchant_id: Optional[str] = Query(None),
-    status: Optional[TransactionStatus] = Query(None),
+    transaction_status: Optional[TransactionStatus] = Query(None, alias="status"),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor opaco retornado em next_cursor (ignora page)"),
     _: str = Depends(verify_token_and_ip)
 ):
     """Lista transações com filtros"""
     
     try:
         processor = TransactionProcessor()
-        transactions = await processor.list_transactions(
+        transactions, cursor_out = await processor.list_transactions(
             merchant_id=merchant_id,
-            status=status,
+            status=transaction_status,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor
         )
         
         return TransactionListResponse(
@@ -98,9 +294,15 @@ async def list_transactions(
             data=transactions,
             total=len(transactions),
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            next_cursor=cursor_out
         )
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -145,50 +347,39 @@ async def update_transaction_status(
 
 @router.post("/simulate-batch")
 async def simulate_batch_transactions(
-    merchant_id: str,
-    count: int = Query(10, ge=1, le=100),
-    base_amount: int = Query(10000, ge=100),  # R$ 100,00 in cents
+    config: TransactionSimulationRequest,
     _: str = Depends(verify_token_and_ip)
 ):
-    """Simula múltiplas transações para testes"""
+    """Simula transações em massa para testes de carga
+    
+    Gera `count` transações a partir das distribuições informadas (mix de
+    métodos, parcelas e bandeiras, histograma de valores, taxa de aprovação)
+    sobre os terminais ativos reais, com as taxas do plano de cada comerciante.
+    
+    A resposta é um stream NDJSON com uma linha de progresso por lote gravado;
+    a última linha tem `done: true` (ou `error`, se a simulação falhar no meio).
+    """
+    
+    simulator = TransactionSimulator()
     
     try:
-        processor = TransactionProcessor()
-        transactions = []
-        
-        for i in range(count):
-            # Varia o valor em ±20%
-            import random
-            amount_variation = random.uniform(0.8, 1.2)
-            amount = int(base_amount * amount_variation)
-            
-            transaction_data = TransactionCreate(
-                merchant_id=merchant_id,
-                terminal_id=f"term_{random.randint(1, 5):03d}",
-                gross_amount=amount,
-                installments=random.choice([1, 2, 3, 6, 12]),
-                captured_at=datetime.now()
-            )
-            
-            transaction = await processor.create_transaction(transaction_data)
-            transactions.append(transaction)
-        
-        return TransactionListResponse(
-            success=True,
-            message=f"Created {len(transactions)} test transactions",
-            data=transactions,
-            total=len(transactions),
-            page=1,
-            per_page=count
-        )
-        
+        plan = await simulator.prepare(config)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to simulate transactions: {str(e)}"
-        )
\ No newline at end of file
+    
+    async def progress_stream():
+        try:
+            async for progress in simulator.run(plan):
+                yield dumps(progress) + b"\n"
+        except Exception as e:
+            logger.error(f"Simulation {plan.simulation_id} failed: {e}")
+            yield dumps({"simulation_id": plan.simulation_id, "done": True, "error": str(e)}) + b"\n"
+    
+    return StreamingResponse(
+        progress_stream(),
+        media_type="application/x-ndjson",
+        headers={"X-Simulation-ID": plan.simulation_id}
+    )
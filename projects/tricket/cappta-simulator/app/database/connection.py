@@ -1,12 +1,13 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
-from contextlib import contextmanager
-from typing import Generator
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from contextlib import contextmanager, asynccontextmanager
+from typing import Generator, AsyncGenerator
 import logging
 
 from config.settings import settings
-from .models import Base
+from .models import Base, create_change_triggers
 
 logger = logging.getLogger(__name__)
 
@@ -14,29 +15,134 @@ def get_database_url() -> str:
     """Get database URL from settings"""
     return settings.DATABASE_URL
 
-# Database engine configuration
+def get_async_database_url() -> str:
+    """Get database URL with the async driver for the configured backend"""
+    url = settings.DATABASE_URL
+    
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql://") or url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    
+    # URL already carries an explicit driver (e.g. sqlite+aiosqlite://)
+    return url
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _is_sqlite_memory(url: str) -> bool:
+    """In-memory databases live in a single connection and cannot be pooled"""
+    return _is_sqlite(url) and (":memory:" in url or "mode=memory" in url or url.split("://", 1)[-1] in ("", "/"))
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection (journal_mode is persisted in the file)"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        # Negative cache_size is in KiB instead of pages
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+def _set_sqlite_query_only(dbapi_connection, connection_record):
+    """Reader connections refuse writes instead of competing for the write lock"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+def _pool_kwargs(url: str, pool_size: int, is_async: bool = False) -> dict:
+    """Pool configuration per backend"""
+    if _is_sqlite_memory(url):
+        return {"poolclass": StaticPool}
+    if _is_sqlite(url):
+        # The SQLite dialects default to NullPool/QueuePool without sizing; pool explicitly
+        return {
+            "poolclass": AsyncAdaptedQueuePool if is_async else QueuePool,
+            "pool_size": pool_size,
+            "max_overflow": 0
+        }
+    return {
+        "pool_size": pool_size,
+        "max_overflow": pool_size,
+        "pool_pre_ping": True
+    }
+
+SQLITE_FILE = _is_sqlite(settings.DATABASE_URL) and not _is_sqlite_memory(settings.DATABASE_URL)
+
+# Database engine configuration (migrations, seeding and the sync routers)
 engine_kwargs = {
-    "echo": settings.DEBUG,
+    "echo": settings.DATABASE_ECHO,
     "future": True,
+    **_pool_kwargs(settings.DATABASE_URL, settings.DATABASE_POOL_SIZE)
 }
 
 # SQLite specific configuration
-if settings.DATABASE_URL.startswith("sqlite"):
-    engine_kwargs.update({
-        "poolclass": StaticPool,
-        "connect_args": {
-            "check_same_thread": False,
-            "timeout": 20,
-        }
-    })
+if _is_sqlite(settings.DATABASE_URL):
+    engine_kwargs["connect_args"] = {
+        "check_same_thread": False,
+        "timeout": 20,
+    }
 
 engine = create_engine(settings.DATABASE_URL, **engine_kwargs)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if SQLITE_FILE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+
+# Async engines for the request path
+#
+# SQLite allows a single writer at a time, so on a file database the async
+# writer engine holds exactly one connection: concurrent write transactions
+# queue on the pool instead of failing with "database is locked", while reads
+# go to a separate pool of query_only connections that WAL lets run alongside
+# the writer. Other backends use one pool sized by DATABASE_POOL_SIZE.
+# Pooled aiosqlite connections run on non-daemon threads: call close_db()
+# before the process exits (the app lifespan does).
+async_engine_kwargs = {
+    "echo": settings.DATABASE_ECHO,
+    **_pool_kwargs(settings.DATABASE_URL, 1 if SQLITE_FILE else settings.DATABASE_POOL_SIZE, is_async=True)
+}
+
+if _is_sqlite(settings.DATABASE_URL):
+    async_engine_kwargs["connect_args"] = {"timeout": 20}
+
+async_engine = create_async_engine(get_async_database_url(), **async_engine_kwargs)
+
+if SQLITE_FILE:
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    
+    async_read_engine = create_async_engine(get_async_database_url(), **{
+        **async_engine_kwargs,
+        **_pool_kwargs(settings.DATABASE_URL, settings.DATABASE_POOL_SIZE, is_async=True)
+    })
+    event.listen(async_read_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_read_engine.sync_engine, "connect", _set_sqlite_query_only)
+else:
+    async_read_engine = async_engine
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False  # Objects stay usable after commit without lazy loads
+)
+AsyncReadSessionLocal = async_sessionmaker(
+    bind=async_read_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 def create_tables():
     """Create all database tables"""
     try:
         Base.metadata.create_all(bind=engine)
+        create_change_triggers(engine)
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
@@ -68,6 +174,39 @@ def get_db_session() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Get async database session for dependency injection"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Database session error: {e}")
+            await db.rollback()
+            raise
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Get read-only async session for dependency injection"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+@asynccontextmanager
+async def get_async_read_db_session() -> AsyncGenerator[AsyncSession, None]:
+    """Get read-only async session for manual usage (never commits)"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+@asynccontextmanager
+async def get_async_db_session() -> AsyncGenerator[AsyncSession, None]:
+    """Get async database session for manual usage"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Database transaction error: {e}")
+            await db.rollback()
+            raise
+
 def test_connection():
     """Test database connection"""
     try:
@@ -79,6 +218,16 @@ def test_connection():
         logger.error(f"Database connection test failed: {e}")
         return False
 
+async def test_async_connection():
+    """Test async database connection"""
+    try:
+        async with get_async_db_session() as db:
+            await db.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        logger.error(f"Async database connection test failed: {e}")
+        return False
+
 async def init_db():
     """Initialize database (create tables if needed)"""
     try:
@@ -91,6 +240,9 @@ async def init_db():
 async def close_db():
     """Close database connections"""
     try:
+        await async_engine.dispose()
+        if async_read_engine is not async_engine:
+            await async_read_engine.dispose()
         engine.dispose()
         logger.info("Database connections closed")
     except Exception as e:
@@ -1,6 +1,6 @@
 from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker
-from .models import Base, create_indexes
+from .models import Base, add_missing_columns, create_change_triggers, create_indexes, drop_obsolete_indexes
 from .connection import get_database_url
 from config.logging import get_logger
 from typing import List, Dict, Any
@@ -41,6 +41,7 @@ class DatabaseMigrator:
             
             # Create indexes
             create_indexes(self.engine)
+            create_change_triggers(self.engine)
             
             logger.info("Database tables created successfully")
             return True
@@ -117,6 +118,11 @@ class DatabaseMigrator:
             
             if not migration_info["migration_needed"]:
                 logger.info("No migration needed - database is up to date")
+                # Columns and indexes declared after a table was created still
+                # need the column and index stages
+                self.ensure_columns()
+                self.ensure_indexes()
+                self.ensure_change_triggers()
                 return True
             
             logger.info(f"Migration needed: {migration_info}")
@@ -136,8 +142,9 @@ class DatabaseMigrator:
                     self.engine.execute(f"DROP TABLE IF EXISTS {table_name}")
                     logger.warning(f"Dropped table: {table_name}")
             
-            # Create indexes
-            create_indexes(self.engine)
+            self.ensure_columns()
+            self.ensure_indexes()
+            self.ensure_change_triggers()
             
             logger.info("Database migration completed successfully")
             return True
@@ -146,6 +153,84 @@ class DatabaseMigrator:
             logger.error(f"Database migration failed: {str(e)}")
             return False
     
+    def ensure_columns(self) -> List[str]:
+        """
+        Column stage: add every declared column missing from existing tables
+        
+        Returns:
+            Names of the columns added ("table.column")
+        """
+        added = add_missing_columns(self.engine)
+        if added:
+            logger.info(f"Added columns: {added}")
+        return added
+    
+    def ensure_indexes(self) -> List[str]:
+        """
+        Index stage: create every declared index missing from the database
+        and drop the ones replaced since (OBSOLETE_INDEXES)
+        
+        Returns:
+            Names of the indexes created
+        """
+        created = create_indexes(self.engine)
+        if created:
+            logger.info(f"Created indexes: {created}")
+        
+        dropped = drop_obsolete_indexes(self.engine)
+        if dropped:
+            logger.info(f"Dropped obsolete indexes: {dropped}")
+        return created
+    
+    def ensure_change_triggers(self) -> List[str]:
+        """
+        Change feed stage: install the change_seq triggers (numbers existing rows once)
+        
+        Returns:
+            Names of the triggers created
+        """
+        created = create_change_triggers(self.engine)
+        if created:
+            logger.info(f"Created change feed triggers: {created}")
+        return created
+    
+    def explain_hot_queries(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Run EXPLAIN QUERY PLAN (EXPLAIN on other dialects) for the hot queries
+        
+        Returns:
+            Dictionary keyed by query name with the plan lines and whether
+            any table is read with a full scan
+        """
+        report = {}
+        explain = "EXPLAIN QUERY PLAN" if self.engine.dialect.name == "sqlite" else "EXPLAIN"
+        
+        with self.engine.connect() as conn:
+            for name, statement in _hot_queries().items():
+                sql = str(statement.compile(dialect=self.engine.dialect, compile_kwargs={"literal_binds": True}))
+                rows = conn.exec_driver_sql(f"{explain} {sql}").all()
+                plan = [str(row[-1]) for row in rows]
+                
+                report[name] = {
+                    "plan": plan,
+                    "full_scan": any(_is_full_scan(line) for line in plan)
+                }
+        
+        return report
+    
+    def report_index_usage(self) -> Dict[str, Dict[str, Any]]:
+        """Log the query plan of each hot query, warning on full table scans"""
+        report = self.explain_hot_queries()
+        
+        for name, result in report.items():
+            plan = " | ".join(result["plan"])
+            if result["full_scan"]:
+                logger.warning(f"Hot query '{name}' does a full table scan: {plan}")
+            else:
+                logger.info(f"Hot query '{name}': {plan}")
+        
+        return report
+    
     def seed_default_data(self) -> bool:
         """
         Seed database with default data
@@ -284,6 +369,63 @@ class DatabaseMigrator:
             return False
 
 
+def _hot_queries() -> Dict[str, Any]:
+    """Representative statements of the hot paths (sample literals only feed the planner)"""
+    from datetime import datetime
+    from sqlalchemy import and_, func, select
+    from .models import TransactionDB, SettlementDB, TerminalDB, WebhookLogDB, TransactionStatus
+    
+    merchant_id = "00000000-0000-0000-0000-000000000000"
+    now = datetime(2024, 1, 1)
+    due = and_(
+        TransactionDB.status == TransactionStatus.APPROVED.value,
+        TransactionDB.settlement_id.is_(None),
+        TransactionDB.expected_settlement_date <= now.date()
+    )
+    
+    return {
+        # SettlementProcessor.settle_due_cohorts
+        "settlement_cohorts": select(
+            TransactionDB.merchant_id, TransactionDB.expected_settlement_date, func.count(TransactionDB.transaction_id)
+        ).where(due).group_by(TransactionDB.merchant_id, TransactionDB.expected_settlement_date),
+        "settlement_cohort_batch": select(TransactionDB.transaction_id)
+            .where(and_(
+                due,
+                TransactionDB.merchant_id == merchant_id,
+                TransactionDB.expected_settlement_date == now.date()
+            )).limit(5000),
+        # Listings (keyset pagination)
+        "transactions_by_merchant": select(TransactionDB.transaction_id)
+            .where(TransactionDB.merchant_id == merchant_id)
+            .order_by(TransactionDB.created_at.desc(), TransactionDB.transaction_id.desc()).limit(50),
+        "settlements_by_merchant": select(SettlementDB.settlement_id)
+            .where(SettlementDB.merchant_id == merchant_id)
+            .order_by(SettlementDB.created_at.desc(), SettlementDB.settlement_id.desc()).limit(50),
+        "terminals_by_merchant": select(TerminalDB.terminal_id)
+            .where(TerminalDB.merchant_id == merchant_id)
+            .order_by(TerminalDB.created_at.desc(), TerminalDB.terminal_id.desc()).limit(50),
+        # Settlement transaction_refs prefetch and merchant summary
+        "settlement_refs": select(TransactionDB.settlement_id, TransactionDB.external_event_id)
+            .where(TransactionDB.settlement_id.in_(["stl_a", "stl_b"])),
+        "settlement_summary": select(func.count(SettlementDB.settlement_id), func.max(SettlementDB.settlement_date))
+            .where(SettlementDB.merchant_id == merchant_id),
+        # WebhookDispatcher outbox claim
+        "webhook_due": select(WebhookLogDB.id, WebhookLogDB.next_retry_at)
+            .where(and_(WebhookLogDB.is_final == False, WebhookLogDB.next_retry_at <= now))
+            .order_by(WebhookLogDB.next_retry_at).limit(100),
+        # ChangeFeed.changes_after
+        "transaction_changes": select(TransactionDB.transaction_id)
+            .where(TransactionDB.change_seq > 0).order_by(TransactionDB.change_seq).limit(500),
+    }
+
+
+def _is_full_scan(plan_line: str) -> bool:
+    """Whether a plan line reads a whole table (SQLite "SCAN t", PostgreSQL "Seq Scan")"""
+    if plan_line.startswith("SCAN "):
+        return "USING" not in plan_line
+    return "Seq Scan" in plan_line
+
+
 # Global migrator instance
 migrator = DatabaseMigrator()
 
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, Date, Text, ForeignKey, Float, Enum as SQLEnum
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, Date, Text, ForeignKey, Float, Index, Enum as SQLEnum, inspect
 from sqlalchemy.dialects.sqlite import JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from enum import Enum
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -19,6 +23,7 @@ class TransactionStatus(str, Enum):
     SETTLED = "settled"
 
 class SettlementStatus(str, Enum):
+    BUILDING = "building"  # Linking transactions in batches; hidden from readers until PENDING
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
@@ -121,6 +126,11 @@ class MerchantDB(Base):
 
 class TerminalDB(Base):
     __tablename__ = "terminals"
+    __table_args__ = (
+        # Keyset pagination on (created_at, terminal_id)
+        Index("idx_terminals_merchant_created", "merchant_id", "created_at", "terminal_id"),
+        Index("idx_terminals_created_id", "created_at", "terminal_id"),
+    )
     
     terminal_id = Column(String, primary_key=True)
     external_terminal_id = Column(String, unique=True)  # ID from Tricket
@@ -148,6 +158,20 @@ class TerminalDB(Base):
 
 class TransactionDB(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Keyset pagination on (created_at, transaction_id)
+        Index("idx_transactions_merchant_created", "merchant_id", "created_at", "transaction_id"),
+        Index("idx_transactions_created_id", "created_at", "transaction_id"),
+        Index("idx_transactions_merchant_status", "merchant_id", "status"),
+        Index("idx_transactions_settlement", "settlement_id"),
+        # Settlement cohorts: status = approved AND settlement_id IS NULL AND expected_settlement_date <= day,
+        # grouped/filtered by merchant (replaces idx_transactions_settle_eligible on captured_at)
+        Index("idx_transactions_settle_due", "status", "settlement_id", "merchant_id", "expected_settlement_date"),
+        # Incremental export: updated_at >= updated_since
+        Index("idx_transactions_updated", "updated_at"),
+        # Change feed: change_seq > after ORDER BY change_seq
+        Index("idx_transactions_change_seq", "change_seq"),
+    )
     
     transaction_id = Column(String, primary_key=True)
     merchant_id = Column(String, ForeignKey("merchants.merchant_id"), nullable=False)
@@ -189,6 +213,9 @@ class TransactionDB(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
     
+    # Change feed position, maintained by the triggers of create_change_triggers()
+    change_seq = Column(Integer)
+    
     # Relationships
     merchant = relationship("MerchantDB", back_populates="transactions")
     terminal = relationship("TerminalDB", back_populates="transactions")
@@ -197,6 +224,17 @@ class TransactionDB(Base):
 
 class SettlementDB(Base):
     __tablename__ = "settlements"
+    __table_args__ = (
+        # Keyset pagination on (created_at, settlement_id)
+        Index("idx_settlements_merchant_created", "merchant_id", "created_at", "settlement_id"),
+        Index("idx_settlements_created_id", "created_at", "settlement_id"),
+        Index("idx_settlements_merchant_date", "merchant_id", "settlement_date"),
+        Index("idx_settlements_status", "status"),
+        # Incremental export: updated_at >= updated_since
+        Index("idx_settlements_updated", "updated_at"),
+        # Change feed: change_seq > after ORDER BY change_seq
+        Index("idx_settlements_change_seq", "change_seq"),
+    )
     
     settlement_id = Column(String, primary_key=True)
     merchant_id = Column(String, ForeignKey("merchants.merchant_id"), nullable=False)
@@ -235,17 +273,39 @@ class SettlementDB(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
     
+    # Change feed position, maintained by the triggers of create_change_triggers()
+    change_seq = Column(Integer)
+    
     # Relationships
     merchant = relationship("MerchantDB", back_populates="settlements")
     transactions = relationship("TransactionDB", back_populates="settlement")
 
+class MerchantSettlementRollupDB(Base):
+    """Resumo materializado de liquidações por comerciante (atualizado incrementalmente)"""
+    __tablename__ = "merchant_settlement_rollups"
+    
+    merchant_id = Column(String, ForeignKey("merchants.merchant_id"), primary_key=True)
+    
+    pending_count = Column(Integer, nullable=False, default=0)
+    pending_amount = Column(Integer, nullable=False, default=0)  # net, em centavos
+    completed_count = Column(Integer, nullable=False, default=0)
+    completed_amount = Column(Integer, nullable=False, default=0)  # net, em centavos
+    total_count = Column(Integer, nullable=False, default=0)
+    last_settlement_date = Column(Date)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 # New Tables for Expanded Functionality
 
 class MerchantPlanDB(Base):
     __tablename__ = "merchant_plans"
+    __table_args__ = (
+        Index("idx_merchant_plans_reseller", "created_by_reseller_id"),
+    )
     
     plan_id = Column(String, primary_key=True)
     plan_name = Column(String(100), nullable=False)
+    created_by_reseller_id = Column(String)  # None for plans shared by every reseller
     
     # Fee Structure (JSON for flexibility)
     fee_structure = Column(JSON)  # {"credit": {"percentage": 3.0, "fixed": 30}, "debit": ...}
@@ -293,6 +353,10 @@ class POSDeviceDB(Base):
 
 class RefundDB(Base):
     __tablename__ = "refunds"
+    __table_args__ = (
+        # Change feed: change_seq > after ORDER BY change_seq
+        Index("idx_refunds_change_seq", "change_seq"),
+    )
     
     refund_id = Column(String, primary_key=True)
     transaction_id = Column(String, ForeignKey("transactions.transaction_id"), nullable=False)
@@ -313,12 +377,29 @@ class RefundDB(Base):
     requested_at = Column(DateTime, default=datetime.utcnow)
     processed_at = Column(DateTime)
     
+    # Change feed position, maintained by the triggers of create_change_triggers()
+    change_seq = Column(Integer)
+    
     # Relationships
     transaction = relationship("TransactionDB", back_populates="refunds")
 
 
+class ChangeSequenceDB(Base):
+    """Monotonic counter shared by the change feed tables (one row per feed)"""
+    __tablename__ = "change_sequences"
+    
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
 class WebhookLogDB(Base):
     __tablename__ = "webhook_logs"
+    __table_args__ = (
+        Index("idx_webhooks_event_type", "event_type"),
+        Index("idx_webhooks_merchant", "merchant_id"),
+        # Outbox poller: is_final = false AND next_retry_at <= now ORDER BY next_retry_at
+        Index("idx_webhooks_retry", "is_final", "next_retry_at"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     
@@ -363,6 +444,11 @@ class WebhookLogDB(Base):
 
 class AuditLogDB(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("idx_audit_entity", "entity_type", "entity_id"),
+        Index("idx_audit_client", "client_id"),
+        Index("idx_audit_created", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     
@@ -391,27 +477,249 @@ class AuditLogDB(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class AuthTokenDB(Base):
+    __tablename__ = "auth_tokens"
+    __table_args__ = (
+        Index("idx_auth_tokens_client", "client_id"),
+        # Expiry sweep: expires_at <= now
+        Index("idx_auth_tokens_expires", "expires_at"),
+    )
+    
+    token_hash = Column(String(64), primary_key=True)  # SHA-256 of the bearer token
+    token_prefix = Column(String(8), nullable=False)  # For display only
+    client_id = Column(String(50), nullable=False)
+    permissions = Column(JSON)
+    
+    # Usage (written behind by TokenManager)
+    usage_count = Column(Integer, default=0)
+    last_used = Column(DateTime)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class JobLeaseDB(Base):
+    """Per-job lease that lets a single worker run each scheduled slot"""
+    __tablename__ = "job_leases"
+    
+    job_name = Column(String(100), primary_key=True)
+    owner = Column(String(100))  # Worker holding the lease (host:pid:suffix)
+    leased_until = Column(DateTime)
+    last_slot = Column(DateTime)  # Last cron slot claimed by any worker
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class JobRunDB(Base):
+    __tablename__ = "job_runs"
+    __table_args__ = (
+        # History of one job: job_name = ? ORDER BY started_at DESC
+        Index("idx_job_runs_job_started", "job_name", "started_at"),
+        # Retention sweep: started_at < cutoff
+        Index("idx_job_runs_started", "started_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_name = Column(String(100), nullable=False)
+    owner = Column(String(100), nullable=False)
+    
+    # Timing
+    scheduled_for = Column(DateTime)  # Cron slot (null for manual runs)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
+    duration_ms = Column(Integer)
+    
+    # Outcome
+    status = Column(String(20), nullable=False)  # succeeded, failed, timeout, cancelled
+    error = Column(Text)
+    result = Column(JSON)
+
+
+# Indexes removed from the models that migrations drop from existing databases
+OBSOLETE_INDEXES = {
+    "transactions": ("idx_transactions_settle_eligible",),
+}
+
+
 # Create all indexes and constraints
-def create_indexes(engine):
-    """Create database indexes for better performance"""
-    from sqlalchemy import Index
-    
-    # Transaction indexes
-    Index('idx_transactions_merchant_status', TransactionDB.merchant_id, TransactionDB.status)
-    Index('idx_transactions_created_at', TransactionDB.created_at)
-    Index('idx_transactions_settlement', TransactionDB.settlement_id)
-    Index('idx_transactions_nsu', TransactionDB.nsu)
-    
-    # Settlement indexes
-    Index('idx_settlements_merchant_date', SettlementDB.merchant_id, SettlementDB.settlement_date)
-    Index('idx_settlements_status', SettlementDB.status)
-    
-    # Webhook indexes
-    Index('idx_webhooks_event_type', WebhookLogDB.event_type)
-    Index('idx_webhooks_merchant', WebhookLogDB.merchant_id)
-    Index('idx_webhooks_retry', WebhookLogDB.success, WebhookLogDB.is_final)
-    
-    # Audit indexes
-    Index('idx_audit_entity', AuditLogDB.entity_type, AuditLogDB.entity_id)
-    Index('idx_audit_client', AuditLogDB.client_id)
-    Index('idx_audit_created', AuditLogDB.created_at)
\ No newline at end of file
+def create_indexes(engine) -> List[str]:
+    """
+    Create the indexes declared in __table_args__ that are missing from the database.
+    
+    create_all() only builds indexes together with a brand new table, so tables
+    that already existed never get indexes declared afterwards.
+    
+    Returns:
+        Names of the indexes created
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+                created.append(index.name)
+    
+    return created
+
+
+def drop_obsolete_indexes(engine) -> List[str]:
+    """
+    Drop the indexes listed in OBSOLETE_INDEXES that still exist.
+    
+    Returns:
+        Names of the indexes dropped
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    dropped = []
+    
+    for table_name, index_names in OBSOLETE_INDEXES.items():
+        if table_name not in existing_tables:
+            continue
+        
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table_name)}
+        for index_name in index_names:
+            if index_name in existing_indexes:
+                with engine.begin() as conn:
+                    conn.exec_driver_sql(f"DROP INDEX {index_name}")
+                dropped.append(index_name)
+    
+    return dropped
+
+
+def add_missing_columns(engine) -> List[str]:
+    """
+    Add the columns declared on the models that are missing from existing tables.
+    
+    Like create_indexes(), this covers what create_all() skips for tables that
+    already exist. Columns are added with ALTER TABLE ADD COLUMN, so only
+    nullable columns or columns with a server default are added; others are
+    skipped with a warning.
+    
+    Returns:
+        "table.column" names of the columns added
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            
+            if column.primary_key or (not column.nullable and column.server_default is None):
+                # Needs a table rebuild; left to a manual migration
+                logger.warning(
+                    f"Column {table.name}.{column.name} is NOT NULL without a server default "
+                    "and cannot be added automatically"
+                )
+                continue
+            
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                default = default.text if hasattr(default, "text") else f"'{default}'"
+                ddl += f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            
+            with engine.begin() as conn:
+                conn.exec_driver_sql(ddl)
+            added.append(f"{table.name}.{column.name}")
+    
+    return added
+
+
+# Tables whose inserts and updates are numbered into the change feed
+CHANGE_FEED_TABLES = ("transactions", "settlements", "refunds")
+CHANGE_FEED_SEQUENCE = "changes"
+
+
+def _change_seq_trigger(table: str, operation: str) -> str:
+    """
+    SQLite trigger that gives the inserted/updated row the next change_seq.
+    
+    The UPDATE trigger skips statements that already changed change_seq: that
+    covers the trigger's own write-back, so neither trigger re-fires the other.
+    The INSERT trigger skips rows inserted with a change_seq, numbered by bulk
+    inserts from a reserved block (ChangeFeed.assign_change_seqs).
+    """
+    if operation == "UPDATE":
+        condition = "WHEN NEW.change_seq IS OLD.change_seq"
+    else:
+        condition = "WHEN NEW.change_seq IS NULL"
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_change_seq_{operation.lower()}
+        AFTER {operation} ON {table} {condition}
+        BEGIN
+            UPDATE change_sequences SET value = value + 1 WHERE name = '{CHANGE_FEED_SEQUENCE}';
+            UPDATE {table} SET change_seq = (
+                SELECT value FROM change_sequences WHERE name = '{CHANGE_FEED_SEQUENCE}'
+            ) WHERE rowid = NEW.rowid;
+        END
+    """
+
+
+def create_change_triggers(engine) -> List[str]:
+    """
+    Install the triggers that keep change_seq current on CHANGE_FEED_TABLES.
+    
+    Triggers cover every write path (ORM, Core executemany, bulk UPDATEs)
+    without touching the services. SQLite serializes write transactions and
+    the counter is bumped inside the writing transaction, so change_seq
+    follows commit order and a reader never sees a lower sequence appear
+    after a higher one. Rows written before the triggers existed are numbered
+    once, when the triggers are created.
+    
+    Only SQLite is supported; other backends keep change_seq empty and have
+    no counter row, so GET /changes answers 501 instead of an empty feed.
+    
+    Returns:
+        Names of the triggers created
+    """
+    if engine.dialect.name != "sqlite":
+        logger.warning(f"Change feed triggers are not available on {engine.dialect.name}; change_seq will stay empty")
+        return []
+    
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    if "change_sequences" not in existing_tables:
+        return []
+    
+    created = []
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f"INSERT OR IGNORE INTO change_sequences (name, value) VALUES ('{CHANGE_FEED_SEQUENCE}', 0)"
+        )
+        existing_triggers = {
+            row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        }
+        
+        for table in CHANGE_FEED_TABLES:
+            if table not in existing_tables:
+                continue
+            
+            names = [f"trg_{table}_change_seq_{operation}" for operation in ("insert", "update")]
+            if all(name in existing_triggers for name in names):
+                continue
+            
+            for operation in ("INSERT", "UPDATE"):
+                conn.exec_driver_sql(_change_seq_trigger(table, operation))
+            created.extend(name for name in names if name not in existing_triggers)
+            
+            # A no-op UPDATE fires the new trigger once for each row not yet numbered
+            conn.exec_driver_sql(f"UPDATE {table} SET change_seq = NULL WHERE change_seq IS NULL")
+    
+    return created
@@ -0,0 +1,64 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(created_at: datetime, key: str) -> str:
+    """Encode the (created_at, id) position of the last row of a page"""
+    raw = json.dumps([created_at.isoformat(), key], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode an opaque cursor back into (created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), str(key)
+    except Exception:
+        raise InvalidCursorError("Invalid pagination cursor")
+
+
+def keyset_filter(created_column: Any, key_column: Any, cursor: str, descending: bool = True):
+    """
+    Build the WHERE clause that continues a (created_at, id) ordered listing
+    after the cursor position.
+
+    Written as `created <= c AND (created < c OR id < k)` (mirrored for
+    ascending order) so the leading range predicate can use a composite
+    index on (created_at, id) or (merchant_id, created_at, id).
+    """
+    created_at, key = decode_cursor(cursor)
+
+    if descending:
+        return and_(
+            created_column <= created_at,
+            or_(created_column < created_at, key_column < key)
+        )
+
+    return and_(
+        created_column >= created_at,
+        or_(created_column > created_at, key_column > key)
+    )
+
+
+def next_cursor(rows: list, per_page: int, created_attr: str, key_attr: str) -> Optional[str]:
+    """
+    Cursor for the page after the first `per_page` rows, or None when the
+    listing is exhausted.
+
+    `rows` must be fetched with `limit(per_page + 1)`: only the extra row
+    proves there is a next page, so a full last page gets no cursor.
+    """
+    if len(rows) <= per_page:
+        return None
+
+    last = rows[per_page - 1]
+    return encode_cursor(getattr(last, created_attr), getattr(last, key_attr))
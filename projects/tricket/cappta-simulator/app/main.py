@@ -1,30 +1,74 @@
 from fastapi import FastAPI, Request, status, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
 import uvicorn
 import asyncio
 from datetime import datetime
 
-from app.api import health, merchants, transactions, settlements, auth, terminals, pos_devices, merchant_plans
+from app.api import health, merchants, transactions, settlements, auth, terminals, pos_devices, merchant_plans, changes, jobs
 from app.database.connection import init_db, close_db
 from app.database.migrations import init_database
 from app.models.common import ErrorResponse
 from app.middleware.rate_limit import rate_limit_middleware, rate_limiter
-from app.middleware.audit import audit_middleware
+from app.middleware.audit import audit_middleware, audit_log_writer
 from app.middleware.auth import token_manager
+from app.services.webhook_sender import webhook_dispatcher
+from app.services.http_client import http_client_pool
+from app.services.settlement_processor import SettlementProcessor
+from app.services.scheduler import job_scheduler
 from config.settings import settings
+from config.serialization import FastJSONResponse
 from config.logging import setup_logging, get_logger
 
 # Setup structured logging
 setup_logging(
     log_level=settings.LOG_LEVEL,
-    json_format=not settings.DEBUG  # Use plain format in debug mode
+    json_format=not settings.DEBUG,  # Use plain format in debug mode
+    queue_size=settings.LOG_QUEUE_SIZE
 )
 logger = get_logger(__name__)
 
 
+def register_scheduled_jobs():
+    """Register the periodic jobs (cluster jobs run once per cron slot across workers)"""
+    job_scheduler.register(
+        "settlement_cohorts",
+        settings.SCHEDULER_SETTLEMENT_CRON,
+        SettlementProcessor().auto_settle_eligible_transactions,
+        timeout=settings.SCHEDULER_SETTLEMENT_TIMEOUT
+    )
+    job_scheduler.register(
+        "webhook_retries",
+        settings.SCHEDULER_WEBHOOK_RETRY_CRON,
+        webhook_dispatcher.retry_overdue
+    )
+    job_scheduler.register(
+        "token_cleanup",
+        settings.SCHEDULER_TOKEN_CLEANUP_CRON,
+        token_manager.cleanup_expired_tokens
+    )
+    # Memory backend state lives in each process
+    job_scheduler.register(
+        "rate_limit_cleanup",
+        settings.SCHEDULER_RATE_LIMIT_CLEANUP_CRON,
+        rate_limiter.cleanup_old_data,
+        cluster=False,
+        in_thread=False  # Iterates dicts the request path mutates on the loop
+    )
+    if settings.SETTLEMENT_ROLLUP_ENABLED:
+        job_scheduler.register(
+            "rollup_refresh",
+            settings.SCHEDULER_ROLLUP_REFRESH_CRON,
+            SettlementProcessor().rebuild_rollups
+        )
+    job_scheduler.register(
+        "job_runs_cleanup",
+        settings.SCHEDULER_RUN_CLEANUP_CRON,
+        job_scheduler.prune_runs
+    )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
@@ -45,11 +89,30 @@ async def lifespan(app: FastAPI):
         
         # Cleanup expired tokens and rate limit data
         if hasattr(token_manager, 'cleanup_expired_tokens'):
-            token_manager.cleanup_expired_tokens()
+            await asyncio.to_thread(token_manager.cleanup_expired_tokens)
         
         if hasattr(rate_limiter, 'cleanup_old_data'):
             rate_limiter.cleanup_old_data()
         
+        # Shared outbound HTTP clients (webhook, Asaas)
+        await http_client_pool.start()
+        
+        # Start background webhook delivery
+        await webhook_dispatcher.start()
+        
+        # Write-behind of token usage counters
+        await token_manager.start()
+        
+        # Batched audit_logs persistence
+        if settings.AUDIT_PERSIST_ENABLED:
+            await audit_log_writer.start()
+        
+        # Periodic jobs (settlement cohorts, webhook sweep, cleanups)
+        if settings.SCHEDULER_ENABLED:
+            if not job_scheduler.jobs:
+                register_scheduled_jobs()
+            await job_scheduler.start()
+        
         logger.info("Application startup completed")
         
     except Exception as e:
@@ -61,6 +124,12 @@ async def lifespan(app: FastAPI):
     # Cleanup
     logger.info("Shutting down Cappta Simulator...")
     try:
+        await job_scheduler.stop()
+        await webhook_dispatcher.stop()
+        await token_manager.stop()
+        await audit_log_writer.stop()
+        await http_client_pool.close()
+        await rate_limiter.close()
         await close_db()
         logger.info("Application shutdown completed")
     except Exception as e:
@@ -76,6 +145,7 @@ app = FastAPI(
     redoc_url="/redoc" if settings.DEBUG else None,
     openapi_url="/openapi.json" if settings.DEBUG else None,
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
     responses={
         422: {"model": ErrorResponse},
         500: {"model": ErrorResponse},
@@ -120,7 +190,8 @@ if settings.RATE_LIMIT_ENABLED:
     app.middleware("http")(rate_limit_middleware)
 
 # Audit middleware (logs requests/responses)
-app.middleware("http")(audit_middleware)
+if settings.AUDIT_ENABLED:
+    app.middleware("http")(audit_middleware)
 
 
 # Global exception handlers
@@ -138,7 +209,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         "validation_errors": exc.errors()
     })
     
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content=ErrorResponse(
             message="Invalid request data",
@@ -173,7 +244,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         "status_code": exc.status_code
     })
     
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=exc.status_code,
         content={
             "message": exc.detail,
@@ -199,7 +270,7 @@ async def general_exception_handler(request: Request, exc: Exception):
         "exception_message": str(exc)
     }, exc_info=True)
     
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content=ErrorResponse(
             message="Internal server error",
@@ -224,10 +295,10 @@ async def readiness_check():
     """Kubernetes readiness probe"""
     try:
         # Test database connection
-        from app.database.connection import get_db_session
+        from app.database.connection import get_async_read_db_session
         from sqlalchemy import text
-        with get_db_session() as session:
-            session.execute(text("SELECT 1"))
+        async with get_async_read_db_session() as session:
+            await session.execute(text("SELECT 1"))
         
         return {
             "status": "ready",
@@ -237,7 +308,7 @@ async def readiness_check():
         }
     except Exception as e:
         logger.error(f"Readiness check failed: {str(e)}")
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=503,
             content={
                 "status": "not_ready", 
@@ -256,6 +327,8 @@ app.include_router(pos_devices.router, tags=["POS Devices"])
 app.include_router(merchant_plans.router, prefix="/plans", tags=["Merchant Plans"])
 app.include_router(transactions.router, prefix="/transactions", tags=["Transactions"])
 app.include_router(settlements.router, prefix="/settlements", tags=["Settlements"])
+app.include_router(changes.router, prefix="/changes", tags=["Changes"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
 
 
 @app.get("/", include_in_schema=False)
@@ -283,36 +356,6 @@ async def root():
     }
 
 
-# Periodic cleanup task
-async def cleanup_task():
-    """Periodic cleanup of expired data"""
-    while True:
-        try:
-            # Wait 1 hour between cleanups
-            await asyncio.sleep(3600)
-            
-            # Cleanup expired tokens
-            if hasattr(token_manager, 'cleanup_expired_tokens'):
-                token_manager.cleanup_expired_tokens()
-            
-            # Cleanup old rate limit data
-            if hasattr(rate_limiter, 'cleanup_old_data'):
-                rate_limiter.cleanup_old_data()
-                
-            logger.info("Periodic cleanup completed")
-            
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            logger.error(f"Cleanup task error: {str(e)}")
-
-
-# Start cleanup task on application startup
-@app.on_event("startup")
-async def start_cleanup_task():
-    asyncio.create_task(cleanup_task())
-
-
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
@@ -1,19 +1,184 @@
 from fastapi import Request, Response
+from collections import deque
+from datetime import datetime
+import asyncio
+import logging
+import random
 import time
 import uuid
-from typing import Dict, Any
-from config.logging import ContextLogger
+from typing import Deque, Dict, Any, List, Optional, Tuple
+from app.database.connection import get_async_db_session
+from app.database.models import AuditLogDB
+from config.logging import ContextLogger, get_log_context
+from config.settings import settings
 
 logger = ContextLogger(__name__)
 
 
+class AuditLogWriter:
+    """
+    Batched persistence of audit entries into the audit_logs table
+    
+    record() only appends to a bounded in-memory buffer. A background task
+    inserts the buffer with one executemany INSERT every
+    AUDIT_PERSIST_INTERVAL seconds, or as soon as AUDIT_PERSIST_BATCH_SIZE
+    entries are waiting. When the buffer is full new entries are dropped and
+    counted instead of slowing requests down.
+    """
+    
+    def __init__(self, max_buffer: int, batch_size: int, interval: float):
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.interval = interval
+        self.buffer: Deque[Dict[str, Any]] = deque()
+        self.written = 0
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+    
+    def record(self, entry: Dict[str, Any]):
+        """Queue an audit_logs row (no-op while the writer is not running)"""
+        if self._task is None:
+            return
+        
+        if len(self.buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        
+        self.buffer.append(entry)
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffer depth and write/drop counters (for /health/detailed)"""
+        return {
+            "running": self._task is not None,
+            "buffered": len(self.buffer),
+            "max_buffer": self.max_buffer,
+            "written": self.written,
+            "dropped": self.dropped
+        }
+    
+    async def flush(self) -> int:
+        """Insert everything buffered so far"""
+        written = 0
+        
+        while self.buffer:
+            batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+            try:
+                async with get_async_db_session() as db:
+                    await db.execute(AuditLogDB.__table__.insert(), batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.error(f"Failed to persist {len(batch)} audit entries: {str(e)}")
+                break
+            written += len(batch)
+        
+        self.written += written
+        return written
+    
+    async def _run(self):
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Audit writer error: {str(e)}")
+    
+    async def start(self):
+        """Start the background writer"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the background writer and persist what is left"""
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        
+        await self.flush()
+
+
+# Global audit writer instance (started by the app lifespan when AUDIT_PERSIST_ENABLED)
+audit_log_writer = AuditLogWriter(
+    max_buffer=settings.AUDIT_PERSIST_MAX_BUFFER,
+    batch_size=settings.AUDIT_PERSIST_BATCH_SIZE,
+    interval=settings.AUDIT_PERSIST_INTERVAL
+)
+
+
 class AuditMiddleware:
     """
     Middleware for request/response auditing
+    
+    Successful requests are sampled per route (AUDIT_ROUTE_SAMPLE_RATES,
+    longest matching path prefix wins, AUDIT_SAMPLE_RATE otherwise); requests
+    answered with status >= 400 and failed requests are always logged. Only
+    allowlisted request/response headers are copied into the log entry.
     """
     
     def __init__(self):
-        self.start_times: Dict[str, float] = {}
+        self.route_sample_rates: List[Tuple[str, float]] = sorted(
+            settings.AUDIT_ROUTE_SAMPLE_RATES.items(),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self.header_allowlist = frozenset(name.lower() for name in settings.AUDIT_HEADER_ALLOWLIST)
+        self.response_header_allowlist = frozenset(
+            name.lower() for name in settings.AUDIT_RESPONSE_HEADER_ALLOWLIST
+        )
+    
+    def sample_rate(self, path: str) -> float:
+        """Sampling rate for successful requests to `path`"""
+        for prefix, rate in self.route_sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return settings.AUDIT_SAMPLE_RATE
+    
+    def _request_info(self, request: Request, client_id: str, client_ip: str) -> Dict[str, Any]:
+        headers = request.headers
+        return {
+            "method": request.method,
+            "path": request.url.path,
+            "query_params": dict(request.query_params),
+            "headers": {
+                name: headers[name] for name in self.header_allowlist if name in headers
+            },
+            "client_ip": client_ip,
+            "client_id": client_id,
+            "user_agent": headers.get("user-agent", "unknown")
+        }
+    
+    def _persist(self, request_id: str, request_info: Dict[str, Any], result: Dict[str, Any]):
+        audit_log_writer.record({
+            "event_type": "http_request",
+            "entity_type": "http_request",
+            "entity_id": request_info["path"],
+            "action": request_info["method"],
+            "client_id": request_info["client_id"],
+            "request_id": request_id,
+            "client_ip": request_info["client_ip"],
+            "user_agent": request_info["user_agent"],
+            "new_values": result,
+            "audit_metadata": {
+                "query_params": request_info["query_params"],
+                "headers": request_info["headers"]
+            },
+            "created_at": datetime.utcnow()
+        })
     
     async def __call__(self, request: Request, call_next) -> Response:
         """
@@ -30,92 +195,87 @@ class AuditMiddleware:
         request_id = str(uuid.uuid4())[:8]
         request.state.request_id = request_id
         
-        # Set logging context
-        logger.set_context(request_id=request_id)
+        # Set logging context (task-local; copied into the handler's task)
+        context_token = logger.set_context(request_id=request_id)
         
-        # Get client info
-        client_id = getattr(request.state, "client_id", "anonymous")
         client_ip = request.client.host if request.client else "unknown"
+        path = request.url.path
+        
+        rate = self.sample_rate(path)
+        sampled = rate >= 1.0 or (rate > 0.0 and random.random() < rate)
         
         # Record request start
         start_time = time.time()
-        self.start_times[request_id] = start_time
-        
-        # Log request
-        request_info = {
-            "method": request.method,
-            "url": str(request.url),
-            "path": request.url.path,
-            "query_params": dict(request.query_params),
-            "headers": {
-                key: value for key, value in request.headers.items()
-                if key.lower() not in ["authorization", "x-api-key"]
-            },
-            "client_ip": client_ip,
-            "client_id": client_id,
-            "user_agent": request.headers.get("user-agent", "unknown")
-        }
         
-        logger.info("Request started", extra={
-            "event_type": "request_started",
-            "client_id": client_id,
-            "client_ip": client_ip,
-            **request_info
-        })
+        if sampled and logger.logger.isEnabledFor(logging.DEBUG):
+            client_id = getattr(request.state, "client_id", "anonymous")
+            logger.debug("Request started", extra={
+                "event_type": "request_started",
+                **self._request_info(request, client_id, client_ip)
+            })
         
         try:
             # Process request
             response = await call_next(request)
             
             # Calculate processing time
-            processing_time = time.time() - start_time
-            
-            # Log successful response
-            response_info = {
-                "status_code": response.status_code,
-                "processing_time_ms": round(processing_time * 1000, 2),
-                "response_headers": {
-                    key: value for key, value in response.headers.items()
-                    if key.lower() not in ["set-cookie"]
-                }
-            }
-            
-            log_level = "info" if response.status_code < 400 else "warning"
-            getattr(logger, log_level)("Request completed", extra={
-                "event_type": "request_completed",
-                "client_id": client_id,
-                "client_ip": client_ip,
-                **request_info,
-                **response_info
-            })
+            processing_time_ms = round((time.time() - start_time) * 1000, 2)
             
             # Add audit headers to response
             response.headers["X-Request-ID"] = request_id
-            response.headers["X-Processing-Time"] = str(response_info["processing_time_ms"])
+            response.headers["X-Processing-Time"] = str(processing_time_ms)
+            
+            if sampled or response.status_code >= 400:
+                # Set by the auth dependencies while the request was handled
+                client_id = getattr(request.state, "client_id", "anonymous")
+                request_info = self._request_info(request, client_id, client_ip)
+                response_info = {
+                    "status_code": response.status_code,
+                    "processing_time_ms": processing_time_ms
+                }
+                
+                log_level = "info" if response.status_code < 400 else "warning"
+                getattr(logger, log_level)("Request completed", extra={
+                    "event_type": "request_completed",
+                    **request_info,
+                    **response_info,
+                    "response_headers": {
+                        name: response.headers[name]
+                        for name in self.response_header_allowlist if name in response.headers
+                    },
+                    "sample_rate": rate
+                })
+                
+                self._persist(request_id, request_info, response_info)
             
             return response
             
         except Exception as exc:
             # Calculate processing time for failed requests
-            processing_time = time.time() - start_time
+            processing_time_ms = round((time.time() - start_time) * 1000, 2)
+            client_id = getattr(request.state, "client_id", "anonymous")
+            request_info = self._request_info(request, client_id, client_ip)
             
             # Log error
             logger.error("Request failed", extra={
                 "event_type": "request_failed",
-                "client_id": client_id,
-                "client_ip": client_ip,
-                "processing_time_ms": round(processing_time * 1000, 2),
+                "processing_time_ms": processing_time_ms,
                 "error": str(exc),
                 "error_type": type(exc).__name__,
                 **request_info
             })
             
+            self._persist(request_id, request_info, {
+                "status_code": 500,
+                "processing_time_ms": processing_time_ms,
+                "error_type": type(exc).__name__
+            })
+            
             raise
         
         finally:
             # Clean up
-            self.start_times.pop(request_id, None)
-            logger.clear_context()
+            logger.clear_context(context_token)
 
 
 # Global audit middleware instance
@@ -146,12 +306,12 @@ def log_business_event(
     
     # Get context from request
     client_id = "system"
-    request_id = None
+    request_id = get_log_context().get("request_id")
     client_ip = "unknown"
     
     if request:
         client_id = getattr(request.state, "client_id", "anonymous")
-        request_id = getattr(request.state, "request_id", None)
+        request_id = getattr(request.state, "request_id", request_id)
         client_ip = request.client.host if request.client else "unknown"
     
     # Create audit log entry
@@ -171,6 +331,18 @@ def log_business_event(
         audit_entry["request_id"] = request_id
     
     logger.info(f"Business event: {event_type}", extra=audit_entry)
+    
+    audit_log_writer.record({
+        "event_type": event_type,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "action": action,
+        "client_id": client_id,
+        "request_id": request_id,
+        "client_ip": client_ip,
+        "new_values": details,
+        "created_at": datetime.utcnow()
+    })
 
 
 def log_integration_event(
@@ -195,11 +367,11 @@ def log_integration_event(
     
     # Get context from request
     client_id = "system"
-    request_id = None
+    request_id = get_log_context().get("request_id")
     
     if request:
         client_id = getattr(request.state, "client_id", "anonymous")
-        request_id = getattr(request.state, "request_id", None)
+        request_id = getattr(request.state, "request_id", request_id)
     
     # Create audit log entry
     audit_entry = {
@@ -1,9 +1,15 @@
 from fastapi import HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Dict, List, Optional, Set
+from sqlalchemy import bindparam
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import threading
 import time
 import hashlib
 from datetime import datetime, timedelta
+from app.database.connection import get_db_session
+from app.database.models import AuthTokenDB
 from config.settings import settings
 from config.logging import get_logger
 
@@ -12,30 +18,99 @@ logger = get_logger(__name__)
 class TokenManager:
     """
     Manages authentication tokens with expiry and client tracking
+    
+    Tokens are persisted in the auth_tokens table (keyed by SHA-256 hash), so
+    they survive restarts and are visible to every worker. Validation runs
+    against an in-memory copy that is re-read from the database at most once
+    every TOKEN_CACHE_TTL seconds; usage counters are written behind in
+    batches by flush_usage(). Expiry is tracked in a min-heap, so cleanup only
+    touches tokens that have actually expired.
+    
+    Database access goes through the synchronous engine; callers on the event
+    loop run it in a worker thread (asyncio.to_thread), so a cache miss never
+    blocks other requests. The in-memory indexes are guarded by an RLock.
+    
+    The default admin token comes from settings, exists in every worker and
+    is never persisted.
     """
     
     def __init__(self):
         self.tokens: Dict[str, Dict] = {}
         self.client_tokens: Dict[str, Set[str]] = {}
+        self.static_tokens: Set[str] = set()
+        
+        # (expires_at, token_hash); entries of revoked tokens are skipped lazily
+        self.expiry_heap: List[Tuple[datetime, str]] = []
+        
+        # token_hash -> monotonic time of the last database check
+        self.checked_at: Dict[str, float] = {}
+        self.missing: Dict[str, float] = {}
+        
+        # token_hash -> (usage count delta, last_used) waiting for flush_usage()
+        self.pending_usage: Dict[str, Tuple[int, datetime]] = {}
+        
+        self.lock = threading.RLock()
+        self._flush_task: Optional[asyncio.Task] = None
         
         # Add default admin token
         self._add_default_tokens()
     
+    @staticmethod
+    def _hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+    
     def _add_default_tokens(self):
         """Add default tokens for development"""
         admin_token = settings.API_TOKEN
-        self.tokens[admin_token] = {
+        token_hash = self._hash(admin_token)
+        self._remember(token_hash, {
             "client_id": "admin",
+            "token_prefix": admin_token[:8],
             "created_at": datetime.utcnow(),
             "expires_at": datetime.utcnow() + timedelta(hours=settings.TOKEN_EXPIRY_HOURS),
             "permissions": ["all"],
             "last_used": datetime.utcnow(),
             "usage_count": 0
+        })
+        self.static_tokens.add(token_hash)
+    
+    def _remember(self, token_hash: str, token_info: Dict):
+        """Add a token to the in-memory indexes"""
+        with self.lock:
+            self.tokens[token_hash] = token_info
+            self.client_tokens.setdefault(token_info["client_id"], set()).add(token_hash)
+            heapq.heappush(self.expiry_heap, (token_info["expires_at"], token_hash))
+            self.checked_at[token_hash] = time.monotonic()
+            self.missing.pop(token_hash, None)
+    
+    def _forget(self, token_hash: str) -> Optional[Dict]:
+        """Remove a token from the in-memory indexes"""
+        with self.lock:
+            token_info = self.tokens.pop(token_hash, None)
+            self.checked_at.pop(token_hash, None)
+            self.pending_usage.pop(token_hash, None)
+            self.static_tokens.discard(token_hash)
+            
+            if token_info:
+                client_id = token_info["client_id"]
+                if client_id in self.client_tokens:
+                    self.client_tokens[client_id].discard(token_hash)
+                    if not self.client_tokens[client_id]:
+                        del self.client_tokens[client_id]
+            
+            return token_info
+    
+    @staticmethod
+    def _row_to_info(row: AuthTokenDB) -> Dict:
+        return {
+            "client_id": row.client_id,
+            "token_prefix": row.token_prefix,
+            "created_at": row.created_at,
+            "expires_at": row.expires_at,
+            "permissions": row.permissions or [],
+            "last_used": row.last_used or row.created_at,
+            "usage_count": row.usage_count or 0
         }
-        
-        if "admin" not in self.client_tokens:
-            self.client_tokens["admin"] = set()
-        self.client_tokens["admin"].add(admin_token)
     
     def create_token(self, client_id: str, permissions: List[str] = None) -> str:
         """
@@ -55,53 +130,137 @@ class TokenManager:
         timestamp = str(time.time())
         token_data = f"{client_id}:{timestamp}:{settings.WEBHOOK_SIGNATURE_SECRET}"
         token = hashlib.sha256(token_data.encode()).hexdigest()[:32]
+        token_hash = self._hash(token)
         
-        # Store token info
-        self.tokens[token] = {
+        now = datetime.utcnow()
+        token_info = {
             "client_id": client_id,
-            "created_at": datetime.utcnow(),
-            "expires_at": datetime.utcnow() + timedelta(hours=settings.TOKEN_EXPIRY_HOURS),
+            "token_prefix": token[:8],
+            "created_at": now,
+            "expires_at": now + timedelta(hours=settings.TOKEN_EXPIRY_HOURS),
             "permissions": permissions,
-            "last_used": datetime.utcnow(),
+            "last_used": now,
             "usage_count": 0
         }
         
-        # Track client tokens
-        if client_id not in self.client_tokens:
-            self.client_tokens[client_id] = set()
-        self.client_tokens[client_id].add(token)
+        try:
+            with get_db_session() as db:
+                db.add(AuthTokenDB(
+                    token_hash=token_hash,
+                    token_prefix=token_info["token_prefix"],
+                    client_id=client_id,
+                    permissions=permissions,
+                    usage_count=0,
+                    last_used=now,
+                    created_at=now,
+                    expires_at=token_info["expires_at"]
+                ))
+        except Exception as e:
+            logger.error(f"Failed to persist token for client {client_id}, keeping it in memory only: {str(e)}")
+        
+        self._remember(token_hash, token_info)
         
         logger.info(f"Created new token for client: {client_id}", extra={"client_id": client_id})
         return token
     
-    def validate_token(self, token: str) -> Optional[Dict]:
+    def _refresh(self, token_hash: str) -> Optional[Dict]:
+        """
+        Re-read a token from the database
+        
+        Picks up tokens created and revocations made by other workers. If the
+        database is unavailable the in-memory copy keeps being used.
+        """
+        now = time.monotonic()
+        
+        with self.lock:
+            missing_since = self.missing.get(token_hash)
+            if missing_since is not None and now - missing_since < settings.TOKEN_CACHE_TTL:
+                return None
+        
+        try:
+            with get_db_session() as db:
+                row = db.query(AuthTokenDB).filter(AuthTokenDB.token_hash == token_hash).first()
+                stored_info = self._row_to_info(row) if row else None
+        except Exception as e:
+            logger.error(f"Failed to load token from database: {str(e)}")
+            with self.lock:
+                if token_hash in self.tokens:
+                    self.checked_at[token_hash] = now
+                return self.tokens.get(token_hash)
+        
+        with self.lock:
+            if stored_info is None:
+                self._forget(token_hash)
+                if len(self.missing) >= settings.TOKEN_CACHE_MAX_MISSING:
+                    self.missing.clear()
+                self.missing[token_hash] = now
+                return None
+            
+            # Usage not yet flushed is still only in memory
+            pending = self.pending_usage.get(token_hash)
+            if pending:
+                stored_info["usage_count"] += pending[0]
+                stored_info["last_used"] = max(stored_info["last_used"], pending[1])
+            
+            token_info = self.tokens.get(token_hash)
+            if token_info and token_info["expires_at"] == stored_info["expires_at"]:
+                token_info.update(stored_info)
+                self.checked_at[token_hash] = now
+                return token_info
+            
+            self._forget(token_hash)
+            if pending:
+                self.pending_usage[token_hash] = pending
+            self._remember(token_hash, stored_info)
+            return stored_info
+    
+    async def validate_token(self, token: str) -> Optional[Dict]:
         """
         Validate a token and return client info
         
+        Cached tokens are validated in memory; a cache miss or stale entry is
+        re-read from the database in a worker thread.
+        
         Args:
             token: Token to validate
             
         Returns:
             Client info if valid, None if invalid
         """
-        if token not in self.tokens:
+        token_hash = self._hash(token)
+        
+        with self.lock:
+            token_info = self.tokens.get(token_hash)
+            stale = (
+                token_hash not in self.static_tokens
+                and time.monotonic() - self.checked_at.get(token_hash, 0.0) > settings.TOKEN_CACHE_TTL
+            )
+        
+        if token_info is None or stale:
+            token_info = await asyncio.to_thread(self._refresh, token_hash)
+        
+        if token_info is None:
             logger.warning(f"Invalid token used: {token[:8]}...", extra={"token_prefix": token[:8]})
             return None
         
-        token_info = self.tokens[token]
+        now = datetime.utcnow()
         
         # Check if token expired
-        if datetime.utcnow() > token_info["expires_at"]:
+        if now > token_info["expires_at"]:
             logger.warning(f"Expired token used: {token[:8]}...", extra={
                 "token_prefix": token[:8],
                 "client_id": token_info["client_id"]
             })
-            self.revoke_token(token)
+            await asyncio.to_thread(self.revoke_token, token)
             return None
         
-        # Update usage
-        token_info["last_used"] = datetime.utcnow()
-        token_info["usage_count"] += 1
+        # Update usage (persisted by flush_usage)
+        with self.lock:
+            token_info["last_used"] = now
+            token_info["usage_count"] += 1
+            if token_hash not in self.static_tokens:
+                count, _ = self.pending_usage.get(token_hash, (0, now))
+                self.pending_usage[token_hash] = (count + 1, now)
         
         return token_info
     
@@ -115,21 +274,22 @@ class TokenManager:
         Returns:
             True if revoked, False if not found
         """
-        if token not in self.tokens:
+        token_hash = self._hash(token)
+        token_info = self._forget(token_hash)
+        
+        deleted = 0
+        try:
+            with get_db_session() as db:
+                deleted = db.query(AuthTokenDB).filter(
+                    AuthTokenDB.token_hash == token_hash
+                ).delete(synchronize_session=False)
+        except Exception as e:
+            logger.error(f"Failed to delete token from database: {str(e)}")
+        
+        if not token_info and not deleted:
             return False
         
-        token_info = self.tokens[token]
-        client_id = token_info["client_id"]
-        
-        # Remove from tokens
-        del self.tokens[token]
-        
-        # Remove from client tracking
-        if client_id in self.client_tokens:
-            self.client_tokens[client_id].discard(token)
-            if not self.client_tokens[client_id]:
-                del self.client_tokens[client_id]
-        
+        client_id = token_info["client_id"] if token_info else None
         logger.info(f"Token revoked for client: {client_id}", extra={"client_id": client_id})
         return True
     
@@ -143,16 +303,24 @@ class TokenManager:
         Returns:
             Number of tokens revoked
         """
-        if client_id not in self.client_tokens:
+        with self.lock:
+            token_hashes = set(self.client_tokens.get(client_id, ()))
+        
+        try:
+            with get_db_session() as db:
+                query = db.query(AuthTokenDB).filter(AuthTokenDB.client_id == client_id)
+                token_hashes.update(row.token_hash for row in query.with_entities(AuthTokenDB.token_hash))
+                query.delete(synchronize_session=False)
+        except Exception as e:
+            logger.error(f"Failed to delete tokens of client {client_id} from database: {str(e)}")
+        
+        for token_hash in token_hashes:
+            self._forget(token_hash)
+        
+        revoked_count = len(token_hashes)
+        if not revoked_count:
             return 0
         
-        tokens_to_revoke = list(self.client_tokens[client_id])
-        revoked_count = 0
-        
-        for token in tokens_to_revoke:
-            if self.revoke_token(token):
-                revoked_count += 1
-        
         logger.info(f"Revoked {revoked_count} tokens for client: {client_id}", extra={
             "client_id": client_id,
             "revoked_count": revoked_count
@@ -163,22 +331,111 @@ class TokenManager:
         """
         Clean up all expired tokens
         
+        Pops the expiry heap only while its head is expired and deletes
+        expired rows through the expires_at index, so the cost follows the
+        number of expired tokens rather than the number of live ones.
+        
         Returns:
             Number of tokens cleaned up
         """
         now = datetime.utcnow()
-        expired_tokens = [
-            token for token, info in self.tokens.items()
-            if now > info["expires_at"]
-        ]
+        expired: Set[str] = set()
+        
+        with self.lock:
+            while self.expiry_heap and self.expiry_heap[0][0] < now:
+                expires_at, token_hash = heapq.heappop(self.expiry_heap)
+                token_info = self.tokens.get(token_hash)
+                # Skip entries left behind by revoked or re-read tokens
+                if token_info is not None and token_info["expires_at"] == expires_at:
+                    self._forget(token_hash)
+                    expired.add(token_hash)
+            
+            # Drop stale entries once they dominate the heap
+            if len(self.expiry_heap) > 2 * len(self.tokens) + 64:
+                self.expiry_heap = [(info["expires_at"], token_hash) for token_hash, info in self.tokens.items()]
+                heapq.heapify(self.expiry_heap)
+        
+        try:
+            with get_db_session() as db:
+                query = db.query(AuthTokenDB).filter(AuthTokenDB.expires_at < now)
+                expired.update(row.token_hash for row in query.with_entities(AuthTokenDB.token_hash))
+                query.delete(synchronize_session=False)
+        except Exception as e:
+            logger.error(f"Failed to delete expired tokens from database: {str(e)}")
+        
+        for token_hash in expired:
+            self._forget(token_hash)
+        
+        if expired:
+            logger.info(f"Cleaned up {len(expired)} expired tokens")
+        
+        return len(expired)
+    
+    def flush_usage(self) -> int:
+        """
+        Write buffered last_used/usage_count updates to the database
+        
+        Returns:
+            Number of tokens updated
+        """
+        with self.lock:
+            pending, self.pending_usage = self.pending_usage, {}
         
-        for token in expired_tokens:
-            self.revoke_token(token)
+        if not pending:
+            return 0
         
-        if expired_tokens:
-            logger.info(f"Cleaned up {len(expired_tokens)} expired tokens")
+        table = AuthTokenDB.__table__
+        statement = table.update().where(
+            table.c.token_hash == bindparam("b_token_hash")
+        ).values(
+            usage_count=table.c.usage_count + bindparam("b_usage_count"),
+            last_used=bindparam("b_last_used")
+        )
+        
+        try:
+            with get_db_session() as db:
+                db.connection().execute(statement, [
+                    {"b_token_hash": token_hash, "b_usage_count": count, "b_last_used": last_used}
+                    for token_hash, (count, last_used) in pending.items()
+                ])
+        except Exception as e:
+            logger.error(f"Failed to flush token usage: {str(e)}")
+            # Put the counts back so the next flush retries them
+            with self.lock:
+                for token_hash, (count, last_used) in pending.items():
+                    if token_hash in self.tokens:
+                        newer_count, newer_last_used = self.pending_usage.get(token_hash, (0, last_used))
+                        self.pending_usage[token_hash] = (count + newer_count, max(last_used, newer_last_used))
+            return 0
         
-        return len(expired_tokens)
+        return len(pending)
+    
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(settings.TOKEN_USAGE_FLUSH_INTERVAL)
+                await asyncio.to_thread(self.flush_usage)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Token usage flush error: {str(e)}")
+    
+    async def start(self):
+        """Start the periodic write-behind of token usage"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        """Stop the write-behind loop and flush what is left"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        
+        await asyncio.to_thread(self.flush_usage)
     
     def get_client_info(self, client_id: str) -> Optional[Dict]:
         """
@@ -190,23 +447,45 @@ class TokenManager:
         Returns:
             Client token information
         """
-        if client_id not in self.client_tokens:
+        token_infos: Dict[str, Dict] = {}
+        
+        with self.lock:
+            pending_usage = dict(self.pending_usage)
+            local_infos = {
+                token_hash: dict(self.tokens[token_hash])
+                for token_hash in self.client_tokens.get(client_id, ())
+            }
+        
+        try:
+            with get_db_session() as db:
+                rows = db.query(AuthTokenDB).filter(AuthTokenDB.client_id == client_id).all()
+                for row in rows:
+                    token_info = self._row_to_info(row)
+                    pending = pending_usage.get(row.token_hash)
+                    if pending:
+                        token_info["usage_count"] += pending[0]
+                        token_info["last_used"] = max(token_info["last_used"], pending[1])
+                    token_infos[row.token_hash] = token_info
+        except Exception as e:
+            logger.error(f"Failed to load tokens of client {client_id}: {str(e)}")
+        
+        # Tokens that only exist in this worker (default tokens, failed persists)
+        for token_hash, token_info in local_infos.items():
+            token_infos.setdefault(token_hash, token_info)
+        
+        if not token_infos:
             return None
         
-        client_tokens = self.client_tokens[client_id]
         active_tokens = []
-        
-        for token in client_tokens:
-            if token in self.tokens:
-                token_info = self.tokens[token]
-                active_tokens.append({
-                    "token": token[:8] + "...",
-                    "created_at": token_info["created_at"].isoformat(),
-                    "expires_at": token_info["expires_at"].isoformat(),
-                    "last_used": token_info["last_used"].isoformat(),
-                    "usage_count": token_info["usage_count"],
-                    "permissions": token_info["permissions"]
-                })
+        for token_info in token_infos.values():
+            active_tokens.append({
+                "token": token_info["token_prefix"] + "...",
+                "created_at": token_info["created_at"].isoformat(),
+                "expires_at": token_info["expires_at"].isoformat(),
+                "last_used": token_info["last_used"].isoformat(),
+                "usage_count": token_info["usage_count"],
+                "permissions": token_info["permissions"]
+            })
         
         return {
             "client_id": client_id,
@@ -246,7 +525,7 @@ class AuthBearer(HTTPBearer):
                 )
             return None
         
-        token_info = token_manager.validate_token(credentials.credentials)
+        token_info = await token_manager.validate_token(credentials.credentials)
         if not token_info:
             if self.auto_error:
                 raise HTTPException(
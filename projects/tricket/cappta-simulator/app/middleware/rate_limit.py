@@ -1,82 +1,25 @@
 from fastapi import Request, HTTPException, status
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 import time
-from collections import defaultdict, deque
-from datetime import datetime, timedelta
 from config.settings import settings
 from config.logging import get_logger
+from app.middleware.rate_limit_backends import RateLimitBackend, create_rate_limit_backend
 
 logger = get_logger(__name__)
 
 
-class TokenBucket:
-    """
-    Token bucket implementation for rate limiting
-    """
-    
-    def __init__(self, capacity: int, refill_rate: float):
-        self.capacity = capacity
-        self.tokens = capacity
-        self.refill_rate = refill_rate  # tokens per second
-        self.last_refill = time.time()
-    
-    def consume(self, tokens: int = 1) -> bool:
-        """
-        Try to consume tokens from the bucket
-        
-        Args:
-            tokens: Number of tokens to consume
-            
-        Returns:
-            True if tokens were consumed, False if not enough tokens
-        """
-        now = time.time()
-        
-        # Refill tokens based on elapsed time
-        elapsed = now - self.last_refill
-        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
-        self.last_refill = now
-        
-        if self.tokens >= tokens:
-            self.tokens -= tokens
-            return True
-        
-        return False
-    
-    def time_until_refill(self, tokens: int = 1) -> float:
-        """
-        Calculate time until enough tokens are available
-        
-        Args:
-            tokens: Number of tokens needed
-            
-        Returns:
-            Time in seconds until tokens are available
-        """
-        if self.tokens >= tokens:
-            return 0.0
-        
-        needed_tokens = tokens - self.tokens
-        return needed_tokens / self.refill_rate
-
-
 class RateLimiter:
     """
     Rate limiter with multiple strategies
     """
     
-    def __init__(self):
-        # Token buckets per client
-        self.client_buckets: Dict[str, TokenBucket] = {}
-        
-        # Sliding window counters
-        self.request_windows: Dict[str, deque] = defaultdict(deque)
+    def __init__(self, backend: Optional[RateLimitBackend] = None):
+        # Bucket and window state (per process or shared, see RATE_LIMIT_BACKEND)
+        self.backend = backend or create_rate_limit_backend()
         
         # Global rate limiting
-        self.global_bucket = TokenBucket(
-            capacity=settings.RATE_LIMIT_BURST * 2,
-            refill_rate=settings.RATE_LIMIT_REQUESTS_PER_MINUTE / 60.0
-        )
+        self.global_capacity = settings.RATE_LIMIT_BURST * 2
+        self.refill_rate = settings.RATE_LIMIT_REQUESTS_PER_MINUTE / 60.0
         
         # Per-endpoint limits
         self.endpoint_limits = {
@@ -85,24 +28,7 @@ class RateLimiter:
             "/merchants": {"requests": 200, "window": 60},     # 200 req/min
         }
     
-    def get_client_bucket(self, client_id: str) -> TokenBucket:
-        """
-        Get or create token bucket for a client
-        
-        Args:
-            client_id: Client identifier
-            
-        Returns:
-            Token bucket for the client
-        """
-        if client_id not in self.client_buckets:
-            self.client_buckets[client_id] = TokenBucket(
-                capacity=settings.RATE_LIMIT_BURST,
-                refill_rate=settings.RATE_LIMIT_REQUESTS_PER_MINUTE / 60.0
-            )
-        return self.client_buckets[client_id]
-    
-    def check_sliding_window(self, key: str, limit: int, window: int) -> Tuple[bool, Dict]:
+    async def check_sliding_window(self, key: str, limit: int, window: int) -> Tuple[bool, Dict]:
         """
         Check sliding window rate limit
         
@@ -115,21 +41,10 @@ class RateLimiter:
             Tuple of (allowed, info)
         """
         now = time.time()
-        window_start = now - window
-        
-        # Get request window for this key
-        requests = self.request_windows[key]
+        allowed, count, reset_time = await self.backend.hit_sliding_window(key, limit, window)
         
-        # Remove old requests outside the window
-        while requests and requests[0] < window_start:
-            requests.popleft()
-        
-        current_count = len(requests)
-        
-        if current_count >= limit:
+        if not allowed:
             # Rate limited
-            oldest_request = requests[0] if requests else now
-            reset_time = oldest_request + window
             return False, {
                 "limit": limit,
                 "remaining": 0,
@@ -137,17 +52,14 @@ class RateLimiter:
                 "retry_after": int(reset_time - now)
             }
         
-        # Add current request
-        requests.append(now)
-        
         return True, {
             "limit": limit,
-            "remaining": limit - current_count - 1,
-            "reset_time": now + window,
+            "remaining": max(0, limit - count),
+            "reset_time": reset_time,
             "retry_after": 0
         }
     
-    def is_allowed(self, request: Request) -> Tuple[bool, Dict]:
+    async def is_allowed(self, request: Request) -> Tuple[bool, Dict]:
         """
         Check if request is allowed based on rate limits
         
@@ -160,13 +72,26 @@ class RateLimiter:
         if not settings.RATE_LIMIT_ENABLED:
             return True, {}
         
+        try:
+            return await self._check_limits(request)
+        except Exception as e:
+            # Backend unavailable (e.g. Redis down)
+            logger.error(f"Rate limit backend error: {e}")
+            if settings.RATE_LIMIT_FAIL_OPEN:
+                return True, {}
+            return False, {"error": "rate_limit_unavailable", "retry_after": 1}
+    
+    async def _check_limits(self, request: Request) -> Tuple[bool, Dict]:
+        """Apply global, per-client and per-endpoint limits in order"""
+        
         # Get client info
         client_id = getattr(request.state, "client_id", "anonymous")
         client_ip = request.client.host if request.client else "unknown"
         endpoint = request.url.path
         
         # Check global rate limit
-        if not self.global_bucket.consume():
+        allowed, retry_after = await self.backend.consume_token("global", self.global_capacity, self.refill_rate)
+        if not allowed:
             logger.warning(f"Global rate limit exceeded", extra={
                 "client_id": client_id,
                 "client_ip": client_ip,
@@ -174,13 +99,15 @@ class RateLimiter:
             })
             return False, {
                 "error": "global_rate_limit_exceeded",
-                "retry_after": int(self.global_bucket.time_until_refill())
+                "retry_after": int(retry_after)
             }
         
         # Check per-client rate limit
-        client_bucket = self.get_client_bucket(client_id)
-        if not client_bucket.consume():
-            retry_after = int(client_bucket.time_until_refill())
+        allowed, retry_after = await self.backend.consume_token(
+            f"client:{client_id}", settings.RATE_LIMIT_BURST, self.refill_rate
+        )
+        if not allowed:
+            retry_after = int(retry_after)
             logger.warning(f"Client rate limit exceeded", extra={
                 "client_id": client_id,
                 "client_ip": client_ip,
@@ -196,7 +123,7 @@ class RateLimiter:
         endpoint_config = self.endpoint_limits.get(endpoint)
         if endpoint_config:
             endpoint_key = f"endpoint:{endpoint}:{client_id}"
-            allowed, window_info = self.check_sliding_window(
+            allowed, window_info = await self.check_sliding_window(
                 endpoint_key,
                 endpoint_config["requests"],
                 endpoint_config["window"]
@@ -220,7 +147,7 @@ class RateLimiter:
         
         # Default sliding window for other endpoints
         client_key = f"client:{client_id}"
-        return self.check_sliding_window(
+        return await self.check_sliding_window(
             client_key,
             settings.RATE_LIMIT_REQUESTS_PER_MINUTE,
             60
@@ -230,19 +157,11 @@ class RateLimiter:
         """
         Clean up old rate limiting data
         """
-        now = time.time()
-        cutoff = now - 3600  # Keep last hour of data
-        
-        # Clean sliding windows
-        for key, requests in list(self.request_windows.items()):
-            while requests and requests[0] < cutoff:
-                requests.popleft()
-            
-            # Remove empty windows
-            if not requests:
-                del self.request_windows[key]
-        
-        logger.debug(f"Cleaned up rate limiter data, active windows: {len(self.request_windows)}")
+        self.backend.cleanup()
+    
+    async def close(self):
+        """Close the backend connections"""
+        await self.backend.close()
 
 
 # Global rate limiter instance
@@ -266,7 +185,7 @@ async def rate_limit_middleware(request: Request, call_next):
         return response
     
     # Check rate limits
-    allowed, rate_info = rate_limiter.is_allowed(request)
+    allowed, rate_info = await rate_limiter.is_allowed(request)
     
     if not allowed:
         # Rate limited - return 429
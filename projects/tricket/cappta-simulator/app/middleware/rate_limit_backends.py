@@ -0,0 +1,457 @@
+import hashlib
+import math
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, List, Optional, Tuple
+
+from config.settings import settings
+from config.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket implementation for rate limiting
+    """
+    
+    def __init__(self, capacity: int, refill_rate: float):
+        self.capacity = capacity
+        self.tokens = capacity
+        self.refill_rate = refill_rate  # tokens per second
+        self.last_refill = time.time()
+    
+    def consume(self, tokens: int = 1) -> bool:
+        """
+        Try to consume tokens from the bucket
+        
+        Args:
+            tokens: Number of tokens to consume
+            
+        Returns:
+            True if tokens were consumed, False if not enough tokens
+        """
+        now = time.time()
+        
+        # Refill tokens based on elapsed time
+        elapsed = now - self.last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self.last_refill = now
+        
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        
+        return False
+    
+    def time_until_refill(self, tokens: int = 1) -> float:
+        """
+        Calculate time until enough tokens are available
+        
+        Args:
+            tokens: Number of tokens needed
+            
+        Returns:
+            Time in seconds until tokens are available
+        """
+        if self.tokens >= tokens:
+            return 0.0
+        
+        needed_tokens = tokens - self.tokens
+        return needed_tokens / self.refill_rate
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for rate limiter state
+    
+    Each operation checks and updates one key atomically, so a backend shared
+    by several workers enforces a single limit for all of them.
+    """
+    
+    name = "base"
+    
+    @abstractmethod
+    async def consume_token(self, key: str, capacity: int, refill_rate: float, tokens: int = 1) -> Tuple[bool, float]:
+        """
+        Token bucket check
+        
+        Returns:
+            Tuple of (allowed, seconds until enough tokens are available)
+        """
+    
+    @abstractmethod
+    async def hit_sliding_window(self, key: str, limit: int, window: int) -> Tuple[bool, int, float]:
+        """
+        Sliding window check, counting the request when allowed
+        
+        Returns:
+            Tuple of (allowed, requests in the window, reset time as Unix timestamp)
+        """
+    
+    def cleanup(self):
+        """Drop expired state (backends with native expiry do nothing)"""
+    
+    async def close(self):
+        """Release connections"""
+
+
+class WindowCounter:
+    """
+    Approximate sliding window: counts of the current and previous fixed
+    windows, with the previous one weighted by how much it still overlaps
+    the sliding window. Constant memory regardless of the request rate.
+    """
+    
+    __slots__ = ("window", "start", "current", "previous")
+    
+    def __init__(self, window: int, start: float):
+        self.window = window
+        self.start = start
+        self.current = 0
+        self.previous = 0
+    
+    def roll(self, start: float):
+        """Advance to the fixed window beginning at `start`"""
+        if start != self.start:
+            self.previous = self.current if start - self.start == self.window else 0
+            self.current = 0
+            self.start = start
+
+
+def window_start(now: float, window: int) -> float:
+    """Start of the fixed window containing `now`"""
+    return now - (now % window)
+
+
+def approximate_window_check(limit: int, window: int, now: float, start: float,
+                             previous: int, current: int) -> Tuple[bool, float, float]:
+    """
+    Evaluate the approximate sliding window before counting a request
+    
+    Returns:
+        Tuple of (allowed, estimated requests in the window, reset time)
+    """
+    estimate = previous * (1 - (now - start) / window) + current
+    
+    if estimate + 1 <= limit:
+        return True, estimate, now + window
+    
+    # When the estimate drops enough to admit one more request
+    if current + 1 > limit:
+        reset_time = start + window + window * max(0.0, 1 - (limit - 1) / current)
+    else:
+        reset_time = start + window * max(0.0, 1 - (limit - 1 - current) / previous)
+    
+    return False, estimate, reset_time
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Per-process backend (default)
+    
+    Limits are enforced per worker: with N workers the effective limit is N
+    times the configured one. Entries are kept in least-recently-used order
+    and dropped once idle (a bucket that has refilled, a window with no
+    requests left), so state stays proportional to the active clients.
+    """
+    
+    name = "memory"
+    
+    def __init__(self, window_mode: Optional[str] = None):
+        self.window_mode = (window_mode or settings.RATE_LIMIT_WINDOW_MODE).lower()
+        
+        # Token buckets per key
+        self.client_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        
+        # Sliding window counters (approximate mode)
+        self.window_counters: "OrderedDict[str, WindowCounter]" = OrderedDict()
+        
+        # Request timestamps per key (exact mode)
+        self.request_windows: "OrderedDict[str, Tuple[int, deque]]" = OrderedDict()
+    
+    @staticmethod
+    def _bucket_idle(bucket: TokenBucket, now: float) -> bool:
+        # Full again, so dropping it loses nothing
+        return now - bucket.last_refill >= bucket.capacity / bucket.refill_rate
+    
+    @staticmethod
+    def _counter_idle(counter: WindowCounter, now: float) -> bool:
+        return now >= counter.start + 2 * counter.window
+    
+    @staticmethod
+    def _requests_idle(entry: Tuple[int, deque], now: float) -> bool:
+        window, requests = entry
+        return not requests or requests[-1] <= now - window
+    
+    @staticmethod
+    def _evict_idle(entries: OrderedDict, is_idle, now: float):
+        """Drop idle entries from the least recently used end (O(1) amortized)"""
+        while entries:
+            key = next(iter(entries))
+            if not is_idle(entries[key], now):
+                break
+            del entries[key]
+    
+    async def consume_token(self, key: str, capacity: int, refill_rate: float, tokens: int = 1) -> Tuple[bool, float]:
+        now = time.time()
+        self._evict_idle(self.client_buckets, self._bucket_idle, now)
+        
+        bucket = self.client_buckets.get(key)
+        if bucket is None:
+            bucket = self.client_buckets[key] = TokenBucket(capacity=capacity, refill_rate=refill_rate)
+        else:
+            self.client_buckets.move_to_end(key)
+        
+        if bucket.consume(tokens):
+            return True, 0.0
+        return False, bucket.time_until_refill(tokens)
+    
+    async def hit_sliding_window(self, key: str, limit: int, window: int) -> Tuple[bool, int, float]:
+        if self.window_mode == "exact":
+            return self._hit_exact_window(key, limit, window)
+        
+        now = time.time()
+        self._evict_idle(self.window_counters, self._counter_idle, now)
+        
+        start = window_start(now, window)
+        counter = self.window_counters.get(key)
+        if counter is None:
+            counter = self.window_counters[key] = WindowCounter(window, start)
+        else:
+            self.window_counters.move_to_end(key)
+            counter.roll(start)
+        
+        allowed, estimate, reset_time = approximate_window_check(
+            limit, window, now, start, counter.previous, counter.current
+        )
+        if not allowed:
+            return False, math.ceil(estimate), reset_time
+        
+        counter.current += 1
+        return True, math.ceil(estimate + 1), reset_time
+    
+    def _hit_exact_window(self, key: str, limit: int, window: int) -> Tuple[bool, int, float]:
+        """Sliding window log: one timestamp per request in the window"""
+        now = time.time()
+        self._evict_idle(self.request_windows, self._requests_idle, now)
+        window_start = now - window
+        
+        # Get request window for this key
+        entry = self.request_windows.get(key)
+        if entry is None:
+            entry = self.request_windows[key] = (window, deque())
+        else:
+            self.request_windows.move_to_end(key)
+        requests = entry[1]
+        
+        # Remove old requests outside the window
+        while requests and requests[0] < window_start:
+            requests.popleft()
+        
+        current_count = len(requests)
+        
+        if current_count >= limit:
+            oldest_request = requests[0] if requests else now
+            return False, current_count, oldest_request + window
+        
+        # Add current request
+        requests.append(now)
+        
+        return True, current_count + 1, now + window
+    
+    def cleanup(self):
+        now = time.time()
+        
+        for entries, is_idle in (
+            (self.client_buckets, self._bucket_idle),
+            (self.window_counters, self._counter_idle),
+            (self.request_windows, self._requests_idle)
+        ):
+            for key in [key for key, entry in entries.items() if is_idle(entry, now)]:
+                del entries[key]
+        
+        logger.debug(
+            f"Cleaned up rate limiter data, active buckets: {len(self.client_buckets)}, "
+            f"active windows: {len(self.window_counters) + len(self.request_windows)}"
+        )
+
+
+class LuaScript:
+    """
+    Server-side script invoked by SHA (EVALSHA), falling back to EVAL the
+    first time a server has not cached it yet
+    """
+    
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode("utf-8")).hexdigest()
+    
+    async def __call__(self, client, keys: List[str], args: List[Any]):
+        try:
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+        except Exception as e:
+            # redis-py maps the NOSCRIPT reply to NoScriptError and drops the prefix
+            if type(e).__name__ != "NoScriptError" and "NOSCRIPT" not in str(e):
+                raise
+            # EVAL also loads the script into the server cache
+            return await client.eval(self.source, len(keys), *keys, *args)
+
+
+# KEYS[1] = bucket hash; ARGV = capacity, refill_rate (tokens/s), now (s), tokens
+TOKEN_BUCKET_SCRIPT = LuaScript("""
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    retry_after = (requested - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+-- An idle bucket is full again after capacity / rate seconds
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+
+return {allowed, tostring(retry_after)}
+""")
+
+# Exact mode: KEYS[1] = sorted set of request timestamps; ARGV = limit, window (s), now (s), member
+SLIDING_WINDOW_SCRIPT = LuaScript("""
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+
+if count >= limit then
+    local reset = now + window
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    if oldest[2] then
+        reset = tonumber(oldest[2]) + window
+    end
+    return {0, count, tostring(reset)}
+end
+
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+
+return {1, count + 1, tostring(now + window)}
+""")
+
+
+# KEYS[1] = current window counter, KEYS[2] = previous window counter;
+# ARGV = limit, window (s), now (s), current window start (s)
+APPROXIMATE_WINDOW_SCRIPT = LuaScript("""
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local start = tonumber(ARGV[4])
+
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+
+if previous * (1 - (now - start) / window) + current + 1 > limit then
+    return {0, previous, current}
+end
+
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    -- Still read as the previous window during the next one
+    redis.call('PEXPIRE', KEYS[1], math.ceil(window * 2000))
+end
+
+return {1, previous, current - 1}
+""")
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Shared backend on Redis (or any server speaking its protocol and Lua)
+    
+    Each check is a single EVALSHA round trip that reads and updates the keys
+    atomically, so every worker and replica shares the same limits. Keys carry
+    a TTL and expire on their own. The approximate window uses two integer
+    counters per key; the exact mode keeps a sorted set entry per request.
+    """
+    
+    name = "redis"
+    
+    def __init__(self, client=None, key_prefix: Optional[str] = None, window_mode: Optional[str] = None):
+        if client is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError:
+                raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+            client = redis_asyncio.from_url(settings.RATE_LIMIT_REDIS_URL)
+        
+        self.client = client
+        self.key_prefix = key_prefix if key_prefix is not None else settings.RATE_LIMIT_KEY_PREFIX
+        self.window_mode = (window_mode or settings.RATE_LIMIT_WINDOW_MODE).lower()
+    
+    async def consume_token(self, key: str, capacity: int, refill_rate: float, tokens: int = 1) -> Tuple[bool, float]:
+        allowed, retry_after = await TOKEN_BUCKET_SCRIPT(
+            self.client,
+            [f"{self.key_prefix}bucket:{key}"],
+            [capacity, refill_rate, time.time(), tokens]
+        )
+        return bool(int(allowed)), float(retry_after)
+    
+    async def hit_sliding_window(self, key: str, limit: int, window: int) -> Tuple[bool, int, float]:
+        now = time.time()
+        
+        if self.window_mode != "exact":
+            start = window_start(now, window)
+            index = int(start // window)
+            # Hash tag keeps both counters in the same cluster slot
+            base = f"{self.key_prefix}counter:{{{key}}}"
+            allowed, previous, current = await APPROXIMATE_WINDOW_SCRIPT(
+                self.client,
+                [f"{base}:{index}", f"{base}:{index - 1}"],
+                [limit, window, now, start]
+            )
+            _, estimate, reset_time = approximate_window_check(
+                limit, window, now, start, int(previous), int(current)
+            )
+            if not int(allowed):
+                return False, math.ceil(estimate), reset_time
+            return True, math.ceil(estimate + 1), reset_time
+        
+        allowed, count, reset_time = await SLIDING_WINDOW_SCRIPT(
+            self.client,
+            [f"{self.key_prefix}window:{key}"],
+            [limit, window, now, f"{now}:{uuid.uuid4().hex[:8]}"]
+        )
+        return bool(int(allowed)), int(count), float(reset_time)
+    
+    async def close(self):
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+
+def create_rate_limit_backend(name: Optional[str] = None) -> RateLimitBackend:
+    """Backend configured in RATE_LIMIT_BACKEND"""
+    
+    name = (name or settings.RATE_LIMIT_BACKEND).lower()
+    
+    if name == "memory":
+        return MemoryRateLimitBackend()
+    if name == "redis":
+        return RedisRateLimitBackend()
+    
+    raise ValueError(f"Unknown rate limit backend: {name}")
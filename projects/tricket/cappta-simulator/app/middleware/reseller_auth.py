@@ -4,7 +4,7 @@ from typing import Optional
 from sqlalchemy.orm import Session
 
 from app.database.connection import get_db_session
-from app.services.reseller_service import ResellerService
+from app.services.reseller_service import ResellerService, reseller_token_cache
 from app.models.reseller import ResellerAuth, CapptaAuthContext
 from config.settings import settings
 from config.logging import get_logger
@@ -31,13 +31,19 @@ class ResellerAuthMiddleware:
             
         token = credentials.credentials
         
+        hit, reseller_auth = reseller_token_cache.get(token)
+        if hit:
+            return reseller_auth
+        
         try:
+            version = reseller_token_cache.version
             with get_db_session() as db:
                 reseller_service = ResellerService(db)
                 reseller_auth = reseller_service.validate_reseller_token(token)
+                reseller_token_cache.set(token, reseller_auth, version)
                 
                 if reseller_auth:
-                    logger.info("Reseller authentication successful", extra={
+                    logger.debug("Reseller authentication successful", extra={
                         "reseller_id": reseller_auth.reseller_id,
                         "document": reseller_auth.document
                     })
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from enum import Enum
+from .common import BaseResponse
+
+class ChangeEntity(str, Enum):
+    TRANSACTION = "transaction"
+    SETTLEMENT = "settlement"
+    REFUND = "refund"
+
+class ChangeItem(BaseModel):
+    seq: int = Field(..., description="Posição da mudança no feed (change_seq)")
+    entity: ChangeEntity
+    id: str = Field(..., description="ID do registro alterado")
+    data: Dict[str, Any] = Field(..., description="Estado atual do registro")
+
+class ChangeFeedResponse(BaseResponse):
+    success: bool = True
+    changes: List[ChangeItem] = []
+    next_after: int = Field(0, description="Valor de `after` para a próxima chamada")
+    has_more: bool = False
+    latest_seq: Optional[int] = Field(None, description="Última posição do feed no momento da leitura")
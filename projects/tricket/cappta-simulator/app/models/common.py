@@ -29,6 +29,10 @@ class SettlementStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
 class BaseResponse(BaseModel):
     success: bool
     message: str
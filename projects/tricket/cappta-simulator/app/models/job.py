@@ -0,0 +1,43 @@
+from pydantic import BaseModel, Field
+from typing import Any, List, Optional
+from datetime import datetime
+from enum import Enum
+from .common import BaseResponse
+
+class JobRunStatus(str, Enum):
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+    CANCELLED = "cancelled"
+
+class JobInfo(BaseModel):
+    name: str
+    cron: str
+    cluster: bool = Field(..., description="Executado por um único worker do cluster (lease no banco)")
+    timeout: int = Field(..., description="Tempo máximo de execução em segundos")
+    next_run_at: Optional[datetime] = None
+    lease_owner: Optional[str] = None
+    leased_until: Optional[datetime] = None
+    last_slot: Optional[datetime] = None
+
+class JobRun(BaseModel):
+    id: int
+    job_name: str
+    owner: str
+    scheduled_for: Optional[datetime] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[int] = None
+    status: JobRunStatus
+    error: Optional[str] = None
+    result: Optional[Any] = None
+
+class JobListResponse(BaseResponse):
+    success: bool = True
+    owner: str = Field(..., description="Identificador deste worker")
+    running: bool = False
+    jobs: List[JobInfo] = []
+
+class JobRunListResponse(BaseResponse):
+    success: bool = True
+    runs: List[JobRun] = []
@@ -146,6 +146,52 @@ class PlanCalculation(BaseModel):
     # Fee breakdown
     fee_breakdown: Dict[str, Any] = Field(default_factory=dict)
 
+class PlanQuoteItem(BaseModel):
+    """Single (amount, method, installments) combination to quote"""
+    amount: int = Field(..., gt=0, description="Valor da transação em centavos")
+    payment_method: PaymentMethod = PaymentMethod.CREDIT
+    installments: int = Field(1, ge=1, le=24, description="Número de parcelas")
+
+class PlanQuoteMatrix(BaseModel):
+    """Every amount x payment method x installment combination"""
+    amounts: List[int] = Field(..., min_length=1, description="Valores em centavos")
+    payment_methods: List[PaymentMethod] = Field(
+        default_factory=lambda: list(PaymentMethod),
+        description="Métodos de pagamento (padrão: todos)"
+    )
+    max_installments: Optional[int] = Field(
+        None, ge=1, le=24,
+        description="Parcelas de 1 até este valor no crédito (padrão: máximo do plano)"
+    )
+    
+    @validator('amounts')
+    def validate_amounts(cls, v):
+        if any(amount <= 0 for amount in v):
+            raise ValueError('Amounts must be greater than zero')
+        return v
+
+class PlanQuoteRequest(BaseModel):
+    """Batch fee quotation: either a list of combinations or a matrix"""
+    quotes: Optional[List[PlanQuoteItem]] = Field(None, min_length=1)
+    matrix: Optional[PlanQuoteMatrix] = None
+    
+    @validator('matrix', always=True)
+    def validate_mode(cls, v, values):
+        if (v is None) == (values.get('quotes') is None):
+            raise ValueError('Provide exactly one of quotes or matrix')
+        return v
+
+class PlanQuoteResponse(BaseModel):
+    """Columnar quotation: position i of every list is one combination"""
+    plan_id: str
+    plan_version: str
+    count: int
+    amount: List[int]
+    payment_method: List[PaymentMethod]
+    installments: List[int]
+    total_fee: List[int]
+    net_amount: List[int]
+
 class PlanFilter(BaseModel):
     """Model for plan filtering parameters"""
     status: Optional[PlanStatus] = None
@@ -269,44 +315,3 @@ class PlanBusinessRules:
             errors.append(f"Maximum installments cannot exceed {cls.MAX_INSTALLMENTS}")
         
         return len(errors) == 0, errors
-    
-    @classmethod
-    def calculate_fees(
-        cls,
-        fee_structure: PaymentMethodFees,
-        amount: int,
-        payment_method: PaymentMethod,
-        installments: int = 1
-    ) -> Dict[str, int]:
-        """Calculate fees for a transaction"""
-        
-        if payment_method == PaymentMethod.CREDIT:
-            fees = fee_structure.credit
-        elif payment_method == PaymentMethod.DEBIT:
-            fees = fee_structure.debit
-        elif payment_method == PaymentMethod.PIX:
-            fees = fee_structure.pix
-        else:
-            fees = fee_structure.credit  # Default fallback
-        
-        # Base fees
-        percentage_fee = int(amount * fees.percentage / 100)
-        fixed_fee = fees.fixed
-        
-        # Installment fees (only for credit cards with installments > 1)
-        installment_fee = 0
-        if payment_method == PaymentMethod.CREDIT and installments > 1:
-            additional_installments = installments - 1
-            installment_fee = int(amount * fee_structure.installments.percentage_per_installment * additional_installments / 100)
-        
-        total_fee = percentage_fee + fixed_fee + installment_fee
-        net_amount = amount - total_fee
-        
-        return {
-            "gross_amount": amount,
-            "percentage_fee": percentage_fee,
-            "fixed_fee": fixed_fee,
-            "installment_fee": installment_fee,
-            "total_fee": total_fee,
-            "net_amount": max(0, net_amount)  # Never negative
-        }
\ No newline at end of file
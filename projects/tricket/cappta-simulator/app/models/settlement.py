@@ -61,6 +61,7 @@ class SettlementListResponse(BaseResponse):
     total: int = 0
     page: int = 1
     per_page: int = 20
+    next_cursor: Optional[str] = None
 
 class SettlementStatusUpdate(BaseModel):
     status: SettlementStatus
@@ -74,4 +75,5 @@ class SettlementSummary(BaseModel):
     pending_amount: int
     completed_settlements: int
     completed_amount: int
+    total_settlements: int = 0
     last_settlement_date: Optional[date] = None
\ No newline at end of file
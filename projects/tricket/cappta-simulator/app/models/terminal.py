@@ -80,11 +80,12 @@ class TerminalResponse(TerminalBase):
 class TerminalListResponse(BaseModel):
     """Model for terminal list responses with pagination"""
     terminals: List[TerminalResponse]
-    total: int
+    total: Optional[int] = None  # None quando include_total=false
     page: int
     per_page: int
     has_next: bool
     has_prev: bool
+    next_cursor: Optional[str] = None
 
 class TerminalActivationRequest(BaseModel):
     """Model for terminal activation request"""
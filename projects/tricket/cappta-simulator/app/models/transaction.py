@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import Optional
-from datetime import datetime
+from typing import Dict, List, Optional
+from datetime import datetime, date
+from enum import Enum
 import uuid
 from .common import BaseResponse, TransactionStatus, PaymentMethod, CardBrand
 
@@ -65,6 +66,7 @@ class TransactionResponse(BaseModel):
     installments: int
     status: TransactionStatus
     captured_at: datetime
+    expected_settlement_date: Optional[date] = None
     external_event_id: str
     created_at: datetime
     updated_at: Optional[datetime] = None
@@ -79,8 +81,96 @@ class TransactionListResponse(BaseResponse):
     total: int = 0
     page: int = 1
     per_page: int = 20
+    next_cursor: Optional[str] = None
 
 class TransactionStatusUpdate(BaseModel):
     status: TransactionStatus
     reason: Optional[str] = None
 
+class BulkItemStatus(str, Enum):
+    CREATED = "created"
+    DUPLICATE = "duplicate"  # external_event_id já existente (idempotência)
+    ERROR = "error"
+
+class BulkTransactionResult(BaseModel):
+    index: int = Field(..., description="Posição do item no array/stream enviado")
+    result: BulkItemStatus
+    external_event_id: Optional[str] = None
+    transaction_id: Optional[str] = None
+    status: Optional[TransactionStatus] = None
+    fee_amount: Optional[int] = None
+    net_amount: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkTransactionResponse(BaseResponse):
+    success: bool = True
+    total: int = 0
+    created: int = 0
+    duplicates: int = 0
+    errors: int = 0
+    results: List[BulkTransactionResult] = []
+
+class AmountBucket(BaseModel):
+    """Faixa do histograma de valores (valor sorteado uniformemente na faixa)"""
+    min_amount: int = Field(..., gt=0, description="Valor mínimo em centavos")
+    max_amount: int = Field(..., gt=0, description="Valor máximo em centavos")
+    weight: float = Field(..., gt=0, description="Peso relativo da faixa")
+    
+    @model_validator(mode='after')
+    def validate_range(self):
+        if self.max_amount < self.min_amount:
+            raise ValueError('max_amount must be greater than or equal to min_amount')
+        return self
+
+def _default_amount_histogram() -> List[AmountBucket]:
+    return [
+        AmountBucket(min_amount=100, max_amount=2000, weight=0.35),
+        AmountBucket(min_amount=2000, max_amount=10000, weight=0.40),
+        AmountBucket(min_amount=10000, max_amount=50000, weight=0.20),
+        AmountBucket(min_amount=50000, max_amount=200000, weight=0.05)
+    ]
+
+class TransactionSimulationRequest(BaseModel):
+    """Configuração da simulação de transações em massa
+    
+    Os mixes são pesos relativos (não precisam somar 1). Parcelas só se
+    aplicam ao crédito; débito e PIX são sempre à vista.
+    """
+    count: int = Field(..., ge=1, description="Quantidade de transações a gerar")
+    merchant_ids: Optional[List[str]] = Field(None, description="Comerciantes (padrão: todos os ativos com terminal ativo)")
+    method_mix: Dict[PaymentMethod, float] = Field(
+        default_factory=lambda: {PaymentMethod.CREDIT: 0.60, PaymentMethod.DEBIT: 0.25, PaymentMethod.PIX: 0.15}
+    )
+    installment_mix: Dict[int, float] = Field(
+        default_factory=lambda: {1: 0.60, 2: 0.10, 3: 0.10, 6: 0.10, 12: 0.10}
+    )
+    card_brand_mix: Dict[CardBrand, float] = Field(
+        default_factory=lambda: {CardBrand.VISA: 0.45, CardBrand.MASTERCARD: 0.35, CardBrand.ELO: 0.15, CardBrand.AMEX: 0.05}
+    )
+    amount_histogram: List[AmountBucket] = Field(default_factory=_default_amount_histogram, min_length=1)
+    approval_rate: float = Field(0.95, ge=0.0, le=1.0)
+    captured_from: Optional[datetime] = Field(None, description="Início da janela de captura (padrão: 24h atrás)")
+    captured_to: Optional[datetime] = Field(None, description="Fim da janela de captura (padrão: agora)")
+    send_webhooks: bool = Field(True, description="Enfileira webhooks das transações aprovadas")
+    chunk_size: Optional[int] = Field(None, ge=1, le=50000, description="Transações por INSERT/commit")
+    seed: Optional[int] = Field(None, description="Semente para reproduzir a mesma massa de dados")
+    
+    @field_validator('method_mix', 'installment_mix', 'card_brand_mix')
+    @classmethod
+    def validate_mix(cls, v):
+        if not v or any(weight < 0 for weight in v.values()) or sum(v.values()) <= 0:
+            raise ValueError('Mix weights must be non-negative with a positive total')
+        return v
+    
+    @field_validator('installment_mix')
+    @classmethod
+    def validate_installments(cls, v):
+        if any(installments < 1 or installments > 12 for installments in v):
+            raise ValueError('Installments must be between 1 and 12')
+        return v
+    
+    @model_validator(mode='after')
+    def validate_window(self):
+        if self.captured_from and self.captured_to and self.captured_to < self.captured_from:
+            raise ValueError('captured_to must be after captured_from')
+        return self
@@ -1,11 +1,22 @@
 from .asaas_client import AsaasClient
 from .transaction_processor import TransactionProcessor
+from .transaction_simulator import TransactionSimulator
 from .settlement_processor import SettlementProcessor
-from .webhook_sender import WebhookSender
+from .data_exporter import DataExporter
+from .change_feed import ChangeFeed
+from .webhook_sender import WebhookSender, WebhookDispatcher, webhook_dispatcher
+from .scheduler import JobScheduler, job_scheduler
 
 __all__ = [
     "AsaasClient",
     "TransactionProcessor", 
+    "TransactionSimulator",
     "SettlementProcessor",
-    "WebhookSender"
+    "DataExporter",
+    "ChangeFeed",
+    "WebhookSender",
+    "WebhookDispatcher",
+    "webhook_dispatcher",
+    "JobScheduler",
+    "job_scheduler"
 ]
\ No newline at end of file
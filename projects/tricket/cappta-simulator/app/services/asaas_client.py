@@ -4,6 +4,7 @@ from typing import Optional, Dict, Any
 from datetime import datetime
 
 from config.settings import settings
+from .http_client import http_client_pool
 
 logger = logging.getLogger(__name__)
 
@@ -32,27 +33,27 @@ class AsaasClient:
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.request(
-                    method=method,
-                    url=url,
-                    headers=self.headers,
-                    json=data,
-                    params=params
+            client = http_client_pool.get_client("asaas", base_url=self.base_url, timeout=30.0)
+            response = await client.request(
+                method=method,
+                url=url,
+                headers=self.headers,
+                json=data,
+                params=params
+            )
+            
+            logger.info(f"Asaas API {method} {endpoint} - Status: {response.status_code}")
+            
+            if response.status_code >= 400:
+                logger.error(f"Asaas API error: {response.text}")
+                raise httpx.HTTPStatusError(
+                    f"Asaas API error: {response.status_code}", 
+                    request=response.request, 
+                    response=response
                 )
-                
-                logger.info(f"Asaas API {method} {endpoint} - Status: {response.status_code}")
-                
-                if response.status_code >= 400:
-                    logger.error(f"Asaas API error: {response.text}")
-                    raise httpx.HTTPStatusError(
-                        f"Asaas API error: {response.status_code}", 
-                        request=response.request, 
-                        response=response
-                    )
-                
-                return response.json() if response.content else {}
-                
+            
+            return response.json() if response.content else {}
+            
         except httpx.RequestError as e:
             logger.error(f"Request error to Asaas API: {e}")
             raise
@@ -0,0 +1,149 @@
+import heapq
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.connection import get_async_read_db_session
+from app.database.models import (
+    CHANGE_FEED_SEQUENCE,
+    ChangeSequenceDB,
+    RefundDB,
+    SettlementDB,
+    SettlementStatus as StoredSettlementStatus,
+    TransactionDB
+)
+from app.models.change import ChangeEntity
+from .data_exporter import SETTLEMENT_EXPORT_COLUMNS, TRANSACTION_EXPORT_COLUMNS
+
+REFUND_CHANGE_COLUMNS = (
+    "refund_id",
+    "transaction_id",
+    "refund_amount",
+    "refund_reason",
+    "refund_type",
+    "status",
+    "asaas_refund_id",
+    "external_refund_id",
+    "requested_at",
+    "processed_at",
+    "change_seq"
+)
+
+# Modelo, coluna de ID e colunas publicadas de cada entidade do feed
+CHANGE_SOURCES = {
+    ChangeEntity.TRANSACTION: (TransactionDB, "transaction_id", TRANSACTION_EXPORT_COLUMNS),
+    ChangeEntity.SETTLEMENT: (SettlementDB, "settlement_id", SETTLEMENT_EXPORT_COLUMNS),
+    ChangeEntity.REFUND: (RefundDB, "refund_id", REFUND_CHANGE_COLUMNS)
+}
+
+# Linhas fora do feed: liquidações em montagem entram com novo seq ao serem publicadas
+CHANGE_EXCLUSIONS = {
+    ChangeEntity.SETTLEMENT: SettlementDB.status != StoredSettlementStatus.BUILDING.value
+}
+
+
+class ChangeFeedUnavailableError(RuntimeError):
+    """O banco não tem o contador/triggers do feed (backend diferente do SQLite)"""
+
+
+class ChangeFeed:
+    """Feed incremental de mudanças de transações, liquidações e estornos
+    
+    Cada INSERT/UPDATE nessas tabelas recebe o próximo change_seq de um
+    contador global (triggers de create_change_triggers), em ordem de commit.
+    O cliente guarda o último `seq` recebido e pede só o que mudou depois
+    dele: o custo da conciliação acompanha o volume de mudanças, não o
+    tamanho das tabelas.
+    
+    O feed publica o estado atual de cada registro: um registro alterado
+    várias vezes entre duas leituras aparece uma vez, na posição da última
+    alteração. Exclusões não entram no feed.
+    """
+    
+    async def changes_after(
+        self,
+        after: int,
+        limit: int,
+        entities: Optional[Sequence[ChangeEntity]] = None
+    ) -> Dict[str, Any]:
+        """Mudanças com change_seq > after, em ordem de change_seq (no máximo `limit`)
+        
+        Levanta ChangeFeedUnavailableError se o banco não tem o contador do
+        feed: sem ele nenhuma linha recebe change_seq, e um feed vazio seria
+        indistinguível de "nenhuma mudança".
+        """
+        
+        if after < 0:
+            raise ValueError("after must be greater than or equal to 0")
+        
+        selected = list(dict.fromkeys(entities)) if entities else list(CHANGE_SOURCES)
+        
+        # Uma única transação de leitura: as consultas das três tabelas e o
+        # latest_seq veem o mesmo snapshot
+        async with get_async_read_db_session() as db:
+            latest_seq = (await db.execute(
+                select(ChangeSequenceDB.value).where(ChangeSequenceDB.name == CHANGE_FEED_SEQUENCE)
+            )).scalar()
+            if latest_seq is None:
+                raise ChangeFeedUnavailableError("The change feed is not available on this database backend")
+            
+            per_entity = []
+            for entity in selected:
+                model, key, columns = CHANGE_SOURCES[entity]
+                table = model.__table__
+                query = select(*(table.c[name] for name in columns)).where(
+                    table.c.change_seq > after
+                )
+                if entity in CHANGE_EXCLUSIONS:
+                    query = query.where(CHANGE_EXCLUSIONS[entity])
+                query = query.order_by(table.c.change_seq).limit(limit + 1)
+                rows = (await db.execute(query)).all()
+                per_entity.append([self._change(entity, key, columns, row) for row in rows])
+        
+        # Cada lista já vem ordenada por seq: merge sem reordenar tudo
+        merged = list(heapq.merge(*per_entity, key=lambda change: change["seq"]))
+        changes = merged[:limit]
+        
+        return {
+            "changes": changes,
+            "next_after": changes[-1]["seq"] if changes else after,
+            "has_more": len(merged) > limit,
+            "latest_seq": latest_seq
+        }
+    
+    @staticmethod
+    async def assign_change_seqs(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+        """Numera as linhas de uma inserção em massa antes do INSERT
+        
+        Reserva len(rows) posições do contador na transação de escrita atual
+        e grava change_seq em cada linha: o trigger de INSERT só numera linhas
+        sem change_seq, e o lote deixa de pagar um UPDATE extra por linha.
+        Posições de linhas descartadas (ON CONFLICT DO NOTHING) viram lacunas.
+        Sem o contador (banco sem os triggers), as linhas ficam sem change_seq.
+        """
+        
+        if not rows:
+            return
+        
+        last = (await db.execute(
+            update(ChangeSequenceDB)
+            .where(ChangeSequenceDB.name == CHANGE_FEED_SEQUENCE)
+            .values(value=ChangeSequenceDB.value + len(rows))
+            .returning(ChangeSequenceDB.value)
+        )).scalar()
+        if last is None:
+            return
+        
+        for seq, row in enumerate(rows, start=last - len(rows) + 1):
+            row["change_seq"] = seq
+    
+    @staticmethod
+    def _change(entity: ChangeEntity, key: str, columns: Sequence[str], row: Any) -> Dict[str, Any]:
+        data = dict(zip(columns, row))
+        return {
+            "seq": data["change_seq"],
+            "entity": entity.value,
+            "id": data[key],
+            "data": data
+        }
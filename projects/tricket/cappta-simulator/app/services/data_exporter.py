@@ -0,0 +1,207 @@
+import csv
+import io
+import logging
+import time
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+from sqlalchemy import or_, select
+
+from config.serialization import dumps
+from config.settings import settings
+from app.database.connection import get_async_read_db_session
+from app.database.models import SettlementDB, TransactionDB
+from app.database.models import SettlementStatus as StoredSettlementStatus
+from app.models.common import ExportFormat, SettlementStatus, TransactionStatus
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_EXPORT_COLUMNS = (
+    "transaction_id",
+    "merchant_id",
+    "terminal_id",
+    "nsu",
+    "authorization_code",
+    "external_event_id",
+    "payment_method",
+    "card_brand",
+    "installments",
+    "gross_amount",
+    "fee_amount",
+    "net_amount",
+    "status",
+    "is_captured",
+    "authorized_at",
+    "captured_at",
+    "cancelled_at",
+    "settlement_id",
+    "expected_settlement_date",
+    "created_at",
+    "updated_at",
+    "change_seq"
+)
+
+SETTLEMENT_EXPORT_COLUMNS = (
+    "settlement_id",
+    "merchant_id",
+    "gross_amount",
+    "fee_amount",
+    "net_amount",
+    "transaction_count",
+    "settlement_date",
+    "settlement_type",
+    "status",
+    "asaas_transfer_id",
+    "is_anticipation",
+    "anticipation_fee",
+    "requested_at",
+    "processed_at",
+    "failed_at",
+    "created_at",
+    "updated_at",
+    "change_seq"
+)
+
+
+def _plain(value: Any) -> Any:
+    """Valor de uma coluna no formato de exportação (enum -> valor, data -> ISO 8601)"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class DataExporter:
+    """Exportação em streaming de transações e liquidações
+    
+    As linhas vêm de um cursor do lado do servidor (AsyncSession.stream com
+    yield_per), em ordem de (created_at, id), e são escritas em NDJSON ou CSV
+    um lote de EXPORT_BATCH_SIZE linhas por vez: a memória fica constante
+    independentemente do tamanho da exportação e não há OFFSET nem modelos
+    Pydantic por linha.
+    
+    Em SQLite a exportação lê um snapshot do banco numa conexão de leitura;
+    gravações concorrentes não são bloqueadas (WAL), mas também não aparecem
+    na exportação em andamento.
+    """
+    
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    
+    def export_transactions(
+        self,
+        export_format: ExportFormat,
+        merchant_id: Optional[str] = None,
+        status: Optional[TransactionStatus] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        updated_since: Optional[datetime] = None
+    ) -> AsyncIterator[bytes]:
+        """Exporta transações com os mesmos filtros da listagem, mais período e updated_since
+        
+        Os filtros são validados aqui (ValueError) e o stream só começa a ler
+        o banco quando o iterador retornado é consumido.
+        """
+        
+        query = self._filtered(
+            TransactionDB, TransactionDB.transaction_id, TRANSACTION_EXPORT_COLUMNS,
+            merchant_id, status, created_from, created_to, updated_since
+        )
+        return self._stream(query, TRANSACTION_EXPORT_COLUMNS, export_format, "transactions")
+    
+    def export_settlements(
+        self,
+        export_format: ExportFormat,
+        merchant_id: Optional[str] = None,
+        status: Optional[SettlementStatus] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        updated_since: Optional[datetime] = None
+    ) -> AsyncIterator[bytes]:
+        """Exporta liquidações (sem transaction_refs: use settlement_id na exportação de transações)"""
+        
+        query = self._filtered(
+            SettlementDB, SettlementDB.settlement_id, SETTLEMENT_EXPORT_COLUMNS,
+            merchant_id, status, created_from, created_to, updated_since
+        )
+        # Liquidações ainda em montagem (BUILDING) não são publicadas
+        query = query.where(SettlementDB.status != StoredSettlementStatus.BUILDING.value)
+        return self._stream(query, SETTLEMENT_EXPORT_COLUMNS, export_format, "settlements")
+    
+    @staticmethod
+    def _filtered(
+        model: Any,
+        key_column: Any,
+        columns: Sequence[str],
+        merchant_id: Optional[str],
+        status: Optional[Enum],
+        created_from: Optional[datetime],
+        created_to: Optional[datetime],
+        updated_since: Optional[datetime]
+    ):
+        if created_from and created_to and created_from > created_to:
+            raise ValueError("created_from must be before created_to")
+        
+        table = model.__table__
+        query = select(*(table.c[name] for name in columns))
+        
+        if merchant_id:
+            query = query.where(model.merchant_id == merchant_id)
+        if status:
+            query = query.where(model.status == status.value)
+        if created_from:
+            query = query.where(model.created_at >= created_from)
+        if created_to:
+            query = query.where(model.created_at < created_to)
+        if updated_since:
+            # Linhas nunca alteradas têm updated_at nulo: contam pela criação
+            query = query.where(or_(model.updated_at >= updated_since, model.created_at >= updated_since))
+        
+        # Mesma ordem dos índices (created_at, id): sem ordenação em memória
+        return query.order_by(model.created_at, key_column)
+    
+    async def _stream(
+        self,
+        query,
+        columns: Sequence[str],
+        export_format: ExportFormat,
+        label: str
+    ) -> AsyncIterator[bytes]:
+        started = time.perf_counter()
+        exported = 0
+        
+        if export_format == ExportFormat.CSV:
+            encode = self._csv_encoder()
+            yield encode([columns])
+        else:
+            encode = self._ndjson_encoder(columns)
+        
+        async with get_async_read_db_session() as db:
+            result = await db.stream(query.execution_options(yield_per=self.batch_size))
+            async for rows in result.partitions():
+                exported += len(rows)
+                yield encode(rows)
+        
+        logger.info(f"Exported {exported} {label} as {export_format.value} in {time.perf_counter() - started:.1f}s")
+    
+    @staticmethod
+    def _ndjson_encoder(columns: Sequence[str]):
+        def encode(rows: List[Sequence[Any]]) -> bytes:
+            # dumps já converte enum e datetime; uma linha JSON por registro
+            return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+        return encode
+    
+    @staticmethod
+    def _csv_encoder():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        
+        def encode(rows: List[Sequence[Any]]) -> bytes:
+            writer.writerows([_plain(value) for value in row] for row in rows)
+            data = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            return data
+        return encode
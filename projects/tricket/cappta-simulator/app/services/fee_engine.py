@@ -0,0 +1,262 @@
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from app.database.models import MerchantPlanDB
+from app.models.common import PaymentMethod
+
+# Percentuais são guardados em centésimos de ponto percentual (basis points):
+# 3,5% -> 350. Taxa = valor * bp // 10000, sempre em centavos inteiros.
+BASIS_POINTS = 10000
+
+Method = Union[PaymentMethod, str]
+
+
+def to_basis_points(percentage: Any) -> int:
+    """Converte um percentual (3.5) em basis points (350)"""
+    return int(round(float(percentage or 0) * 100))
+
+
+class FeeRule(NamedTuple):
+    """Regra compilada para um par (método, parcelas)"""
+    percentage_bp: int
+    fixed: int
+    installment_bp: int
+
+
+class FeeBreakdown(NamedTuple):
+    gross_amount: int
+    percentage_fee: int
+    fixed_fee: int
+    installment_fee: int
+    total_fee: int
+    net_amount: int
+
+
+def normalize_fee_structure(fee_structure: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Normaliza o JSON de fee_structure para o formato de PaymentMethodFees
+    
+    Aceita o formato antigo do seed ("installment_fee": {"percentage": ...}) e
+    preenche métodos ausentes com as taxas padrão do settings.
+    """
+    fee_structure = fee_structure or {}
+    defaults = default_fee_structure()
+    
+    normalized = {}
+    for method in ("credit", "debit", "pix"):
+        fees = fee_structure.get(method) or defaults[method]
+        normalized[method] = {
+            "percentage": float(fees.get("percentage", 0.0)),
+            "fixed": int(fees.get("fixed", 0))
+        }
+    
+    installments = dict(defaults["installments"])
+    if "installments" in fee_structure:
+        installments.update(fee_structure["installments"])
+    elif "installment_fee" in fee_structure:
+        installments["percentage_per_installment"] = fee_structure["installment_fee"].get("percentage", 0.0)
+    normalized["installments"] = installments
+    
+    return normalized
+
+
+def plan_version(plan: MerchantPlanDB) -> str:
+    """Versão da tabela de um plano: muda a cada alteração do plano"""
+    changed_at = plan.updated_at or plan.created_at
+    return changed_at.isoformat() if changed_at else "0"
+
+
+def default_fee_structure() -> Dict[str, Any]:
+    """Tabela de taxas do settings, usada por comerciantes sem plano"""
+    return {
+        "credit": {"percentage": settings.DEFAULT_FEE_PERCENTAGE, "fixed": settings.DEFAULT_FEE_FIXED},
+        "debit": {"percentage": settings.DEBIT_FEE_PERCENTAGE, "fixed": settings.DEBIT_FEE_FIXED},
+        "pix": {"percentage": 0.0, "fixed": settings.PIX_FEE_FIXED},
+        "installments": {
+            "min_installments": 2,
+            "max_installments": settings.MAX_INSTALLMENTS,
+            "percentage_per_installment": settings.INSTALLMENT_FEE_PERCENTAGE
+        }
+    }
+
+
+class CompiledFeeSchedule:
+    """Tabela de taxas de um plano compilada para consulta por (método, parcelas)
+    
+    Imutável: as regras ficam num MappingProxyType indexado tanto pelo enum
+    PaymentMethod quanto pelo valor string ("credit"), para que o cálculo não
+    precise normalizar o método a cada chamada.
+    """
+    
+    __slots__ = ("plan_id", "version", "fee_structure", "rules", "max_installments")
+    
+    def __init__(self, plan_id: Optional[str], fee_structure: Optional[Dict[str, Any]], version: str = "0"):
+        normalized = normalize_fee_structure(fee_structure)
+        installment_bp = to_basis_points(normalized["installments"].get("percentage_per_installment", 0.0))
+        # Só até o limite do plano: parcelas acima dele não têm regra (rule() -> ValueError)
+        max_installments = max(1, int(normalized["installments"].get("max_installments", 1)))
+        
+        rules: Dict[Tuple[Method, int], FeeRule] = {}
+        for method in PaymentMethod:
+            fees = normalized[method.value]
+            percentage_bp = to_basis_points(fees["percentage"])
+            for installments in range(1, max_installments + 1):
+                # Taxa de parcelamento só no crédito, por parcela adicional
+                extra_bp = installment_bp * (installments - 1) if method == PaymentMethod.CREDIT else 0
+                rule = FeeRule(percentage_bp, fees["fixed"], extra_bp)
+                rules[(method, installments)] = rule
+                rules[(method.value, installments)] = rule
+        
+        self.plan_id = plan_id
+        self.version = version
+        self.fee_structure = MappingProxyType(normalized)
+        self.rules: Mapping[Tuple[Method, int], FeeRule] = MappingProxyType(rules)
+        self.max_installments = max_installments
+    
+    def rule(self, payment_method: Method, installments: int = 1) -> FeeRule:
+        try:
+            return self.rules[(payment_method, installments)]
+        except KeyError:
+            raise ValueError(f"No fee rule for {payment_method} with {installments} installments")
+    
+    @staticmethod
+    def _total(amount: int, rule: FeeRule) -> int:
+        total_fee = (
+            amount * rule.percentage_bp // BASIS_POINTS
+            + rule.fixed
+            + amount * rule.installment_bp // BASIS_POINTS
+        )
+        # A taxa nunca consome o valor inteiro da transação
+        return max(0, min(total_fee, amount - 1))
+    
+    def calculate(self, amount: int, payment_method: Method, installments: int = 1) -> int:
+        """Taxa total em centavos"""
+        return self._total(amount, self.rule(payment_method, installments))
+    
+    def breakdown(self, amount: int, payment_method: Method, installments: int = 1) -> FeeBreakdown:
+        """Taxa detalhada por componente (percentual, fixa, parcelamento)"""
+        rule = self.rule(payment_method, installments)
+        total_fee = self._total(amount, rule)
+        return FeeBreakdown(
+            gross_amount=amount,
+            percentage_fee=amount * rule.percentage_bp // BASIS_POINTS,
+            fixed_fee=rule.fixed,
+            installment_fee=amount * rule.installment_bp // BASIS_POINTS,
+            total_fee=total_fee,
+            net_amount=amount - total_fee
+        )
+    
+    def calculate_many(
+        self,
+        amounts: Sequence[int],
+        methods: Sequence[Method],
+        installments: Sequence[int]
+    ) -> List[int]:
+        """Calcula as taxas de um lote de transações (simulação em massa, liquidação)
+        
+        Equivale a chamar calculate() para cada posição, sem o custo de
+        chamada por item.
+        """
+        if not (len(amounts) == len(methods) == len(installments)):
+            raise ValueError("amounts, methods and installments must have the same length")
+        
+        rules = self.rules
+        fees = []
+        append = fees.append
+        try:
+            for amount, method, count in zip(amounts, methods, installments):
+                percentage_bp, fixed, installment_bp = rules[(method, count)]
+                total_fee = amount * percentage_bp // BASIS_POINTS + fixed + amount * installment_bp // BASIS_POINTS
+                if total_fee >= amount:
+                    total_fee = max(0, amount - 1)
+                append(total_fee)
+        except KeyError as e:
+            raise ValueError(f"No fee rule for {e.args[0]}")
+        
+        return fees
+
+
+class FeeEngine:
+    """Cache de tabelas de taxas compiladas por plan_id
+    
+    Cada plano é compilado uma vez e reutilizado até ser invalidado
+    (MerchantPlanService.update_plan/delete_plan) ou até expirar o
+    FEE_SCHEDULE_CACHE_TTL, que limita a defasagem de alterações feitas por
+    outros workers. Comerciantes sem plano usam a tabela do settings.
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.schedules: Dict[str, Tuple[float, CompiledFeeSchedule]] = {}
+        self.lock = threading.Lock()
+        self._default: Optional[CompiledFeeSchedule] = None
+    
+    def default_schedule(self) -> CompiledFeeSchedule:
+        if self._default is None:
+            self._default = CompiledFeeSchedule(None, default_fee_structure(), version="default")
+        return self._default
+    
+    def get_cached(self, plan_id: str) -> Optional[CompiledFeeSchedule]:
+        with self.lock:
+            entry = self.schedules.get(plan_id)
+            if entry is None:
+                return None
+            loaded_at, schedule = entry
+            if time.monotonic() - loaded_at > self.ttl:
+                del self.schedules[plan_id]
+                return None
+            return schedule
+    
+    def compile(self, plan: MerchantPlanDB) -> CompiledFeeSchedule:
+        """Compila e guarda no cache a tabela de um plano já carregado"""
+        schedule = CompiledFeeSchedule(plan.plan_id, plan.fee_structure, version=plan_version(plan))
+        with self.lock:
+            self.schedules[plan.plan_id] = (time.monotonic(), schedule)
+        return schedule
+    
+    def for_plan(self, plan: MerchantPlanDB) -> CompiledFeeSchedule:
+        """Tabela de um plano já carregado, recompilada se o cache estiver defasado"""
+        schedule = self.get_cached(plan.plan_id)
+        if schedule is None or schedule.version != plan_version(plan):
+            schedule = self.compile(plan)
+        return schedule
+    
+    def get_schedule(self, db: Session, plan_id: Optional[str]) -> CompiledFeeSchedule:
+        """Tabela do plano (sessão síncrona), ou a padrão se não houver plano"""
+        if not plan_id:
+            return self.default_schedule()
+        
+        schedule = self.get_cached(plan_id)
+        if schedule is None:
+            plan = db.get(MerchantPlanDB, plan_id)
+            schedule = self.compile(plan) if plan else self.default_schedule()
+        return schedule
+    
+    async def get_schedule_async(self, db: AsyncSession, plan_id: Optional[str]) -> CompiledFeeSchedule:
+        """Tabela do plano (sessão assíncrona), ou a padrão se não houver plano"""
+        if not plan_id:
+            return self.default_schedule()
+        
+        schedule = self.get_cached(plan_id)
+        if schedule is None:
+            plan = await db.get(MerchantPlanDB, plan_id)
+            schedule = self.compile(plan) if plan else self.default_schedule()
+        return schedule
+    
+    def invalidate(self, plan_id: Optional[str] = None):
+        """Descarta a tabela de um plano (ou todas)"""
+        with self.lock:
+            if plan_id is None:
+                self.schedules.clear()
+                self._default = None
+            else:
+                self.schedules.pop(plan_id, None)
+
+
+# Instância global do motor de taxas
+fee_engine = FeeEngine(ttl=settings.FEE_SCHEDULE_CACHE_TTL)
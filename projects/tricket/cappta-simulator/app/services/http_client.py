@@ -0,0 +1,140 @@
+import httpx
+import logging
+from typing import Dict, Any, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """Transporte que conta falhas de rede (conexão recusada, timeout, reset)
+    
+    Essas falhas nunca chegam ao hook de resposta: sem o wrapper, uma
+    sequência de entregas sem conexão aparecia com errors = 0.
+    """
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport, metrics: Dict[str, int]):
+        self.transport = transport
+        self.metrics = metrics
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            return await self.transport.handle_async_request(request)
+        except httpx.TransportError:
+            self.metrics["transport_errors"] += 1
+            self.metrics["errors"] += 1
+            raise
+    
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+class HTTPClientPool:
+    """Pool de clientes HTTP compartilhados pelo processo
+    
+    Mantém um httpx.AsyncClient por destino (webhook do Tricket, API do Asaas),
+    reaproveitando conexões keep-alive em vez de abrir um cliente (e um
+    handshake TCP/TLS) a cada requisição. Criado e fechado no lifespan da app.
+    """
+    
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._metrics: Dict[str, Dict[str, int]] = {}
+        self._http2 = settings.HTTP_CLIENT_HTTP2 and self._http2_available()
+    
+    @staticmethod
+    def _http2_available() -> bool:
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            return False
+    
+    def _metrics_for(self, name: str) -> Dict[str, int]:
+        # errors = error_responses (status >= 400) + transport_errors
+        return self._metrics.setdefault(name, {
+            "requests": 0,
+            "responses": 0,
+            "errors": 0,
+            "error_responses": 0,
+            "transport_errors": 0
+        })
+    
+    def _event_hooks(self, name: str) -> Dict[str, Any]:
+        metrics = self._metrics_for(name)
+        
+        async def on_request(request: httpx.Request):
+            metrics["requests"] += 1
+        
+        async def on_response(response: httpx.Response):
+            metrics["responses"] += 1
+            if response.status_code >= 400:
+                metrics["error_responses"] += 1
+                metrics["errors"] += 1
+        
+        return {"request": [on_request], "response": [on_response]}
+    
+    def get_client(self, name: str, base_url: str = "", timeout: Optional[float] = None) -> httpx.AsyncClient:
+        """Retorna (criando se necessário) o cliente compartilhado de um destino"""
+        
+        client = self._clients.get(name)
+        if client is not None and not client.is_closed:
+            return client
+        
+        # Limites e HTTP/2 vão no transporte: com transport explícito o cliente os ignora
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY
+            ),
+            http2=self._http2
+        )
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout if timeout is not None else settings.HTTP_CLIENT_TIMEOUT,
+            transport=CountingTransport(transport, self._metrics_for(name)),
+            event_hooks=self._event_hooks(name)
+        )
+        self._clients[name] = client
+        
+        logger.info(f"HTTP client '{name}' created (http2={self._http2})")
+        return client
+    
+    async def start(self):
+        """Pré-cria os clientes conhecidos"""
+        self.get_client("webhook", timeout=settings.WEBHOOK_TIMEOUT)
+        self.get_client("asaas", base_url=settings.ASAAS_BASE_URL, timeout=30.0)
+    
+    async def close(self):
+        """Fecha todos os clientes e suas conexões"""
+        for name, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing HTTP client '{name}': {e}")
+        self._clients.clear()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Métricas de uso por cliente, incluindo conexões abertas/ociosas do pool"""
+        
+        result = {}
+        for name, client in self._clients.items():
+            metrics = dict(self._metrics.get(name, {}))
+            
+            # httpcore não expõe API pública para o estado do pool
+            transport = getattr(getattr(client, "_transport", None), "transport", None)
+            pool = getattr(transport, "_pool", None)
+            connections = getattr(pool, "connections", None)
+            if connections is not None:
+                metrics["open_connections"] = len(connections)
+                metrics["idle_connections"] = sum(1 for c in connections if c.is_idle())
+            
+            metrics["http2"] = self._http2
+            result[name] = metrics
+        
+        return result
+
+
+# Global client pool instance
+http_client_pool = HTTPClientPool()
@@ -0,0 +1,466 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import uuid
+from datetime import datetime
+
+from app.database.models import MerchantDB, MerchantPlanDB, TransactionDB
+from app.models.common import PaymentMethod, TransactionStatus
+from app.models.merchant_plan import (
+    MerchantPlanCreate, MerchantPlanUpdate, MerchantPlanResponse, MerchantPlanListResponse,
+    MerchantPlanAssociation, MerchantPlanAssociationResponse, PlanCalculation,
+    PlanFilter, PlanSort, PlanStatus, PaymentMethodFees, PlanBusinessRules, DefaultPlanTemplates,
+    PlanQuoteRequest
+)
+from app.services.fee_engine import CompiledFeeSchedule, fee_engine, normalize_fee_structure
+from config.serialization import dumps
+from config.settings import settings
+from config.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Shown as the owner of plans that are shared by every reseller
+SYSTEM_RESELLER_ID = "system"
+
+class MerchantPlanService:
+    """Service for managing merchant fee plans"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def create_plan(self, plan_data: MerchantPlanCreate, reseller_id: str) -> MerchantPlanResponse:
+        """Create a new merchant plan owned by the reseller"""
+        try:
+            self._validate_fee_structure(plan_data.fee_structure)
+            
+            plan_count = self.db.query(func.count(MerchantPlanDB.plan_id)).filter(
+                MerchantPlanDB.created_by_reseller_id == reseller_id
+            ).scalar()
+            if plan_count >= PlanBusinessRules.MAX_PLANS_PER_RESELLER:
+                raise ValueError(
+                    f"Reseller cannot have more than {PlanBusinessRules.MAX_PLANS_PER_RESELLER} plans"
+                )
+            
+            if plan_data.is_default:
+                self._unset_default_plans(reseller_id)
+            
+            db_plan = MerchantPlanDB(
+                plan_id=str(uuid.uuid4()),
+                plan_name=plan_data.plan_name,
+                created_by_reseller_id=reseller_id,
+                description=plan_data.description,
+                is_active=plan_data.is_active,
+                is_default=plan_data.is_default,
+                fee_structure=plan_data.fee_structure.model_dump()
+            )
+            
+            self.db.add(db_plan)
+            self.db.commit()
+            self.db.refresh(db_plan)
+            
+            logger.info(f"Created merchant plan: {db_plan.plan_id}", extra={
+                "plan_id": db_plan.plan_id,
+                "reseller_id": reseller_id
+            })
+            
+            return self._to_response(db_plan)
+        
+        except Exception as e:
+            logger.error(f"Error creating merchant plan: {str(e)}")
+            self.db.rollback()
+            raise
+    
+    def list_plans(
+        self,
+        reseller_id: str,
+        filters: Optional[PlanFilter] = None,
+        sort: PlanSort = PlanSort.CREATED_DESC,
+        page: int = 1,
+        per_page: int = 20
+    ) -> MerchantPlanListResponse:
+        """List the plans visible to the reseller (its own plus shared plans)"""
+        filters = filters or PlanFilter()
+        query = self._visible_plans(reseller_id)
+        
+        if filters.status == PlanStatus.ACTIVE:
+            query = query.filter(MerchantPlanDB.is_active == True)
+        elif filters.status is not None:
+            query = query.filter(MerchantPlanDB.is_active == False)
+        if filters.is_default is not None:
+            query = query.filter(MerchantPlanDB.is_default == filters.is_default)
+        if filters.created_after:
+            query = query.filter(MerchantPlanDB.created_at >= filters.created_after)
+        if filters.created_before:
+            query = query.filter(MerchantPlanDB.created_at <= filters.created_before)
+        
+        merchants_count = self.db.query(
+            MerchantDB.plan_id.label("plan_id"),
+            func.count(MerchantDB.merchant_id).label("merchants_count")
+        ).group_by(MerchantDB.plan_id).subquery()
+        
+        if filters.has_merchants is not None:
+            query = query.outerjoin(merchants_count, merchants_count.c.plan_id == MerchantPlanDB.plan_id)
+            if filters.has_merchants:
+                query = query.filter(merchants_count.c.merchants_count > 0)
+            else:
+                query = query.filter(merchants_count.c.merchants_count.is_(None))
+        
+        total = query.count()
+        
+        if sort in (PlanSort.MERCHANTS_ASC, PlanSort.MERCHANTS_DESC):
+            if filters.has_merchants is None:
+                query = query.outerjoin(merchants_count, merchants_count.c.plan_id == MerchantPlanDB.plan_id)
+            count = func.coalesce(merchants_count.c.merchants_count, 0)
+            order = count.asc() if sort == PlanSort.MERCHANTS_ASC else count.desc()
+        else:
+            order = {
+                PlanSort.NAME_ASC: MerchantPlanDB.plan_name.asc(),
+                PlanSort.NAME_DESC: MerchantPlanDB.plan_name.desc(),
+                PlanSort.CREATED_ASC: MerchantPlanDB.created_at.asc(),
+                PlanSort.CREATED_DESC: MerchantPlanDB.created_at.desc()
+            }[sort]
+        
+        plans = query.order_by(order, MerchantPlanDB.plan_id).offset((page - 1) * per_page).limit(per_page).all()
+        
+        # Usage statistics for the whole page in two grouped queries
+        stats = self._plan_stats([plan.plan_id for plan in plans])
+        
+        return MerchantPlanListResponse(
+            plans=[self._to_response(plan, stats.get(plan.plan_id)) for plan in plans],
+            total=total,
+            page=page,
+            per_page=per_page,
+            has_next=page * per_page < total,
+            has_prev=page > 1
+        )
+    
+    def get_plan_by_id(self, plan_id: str, reseller_id: str) -> Optional[MerchantPlanResponse]:
+        """Get a plan visible to the reseller by ID"""
+        plan = self._get_plan(plan_id, reseller_id)
+        if not plan:
+            return None
+        
+        return self._to_response(plan, self._plan_stats([plan_id]).get(plan_id))
+    
+    def update_plan(
+        self,
+        plan_id: str,
+        update_data: MerchantPlanUpdate,
+        reseller_id: str
+    ) -> Optional[MerchantPlanResponse]:
+        """Update a plan owned by the reseller"""
+        try:
+            plan = self._get_plan(plan_id, reseller_id, owned=True)
+            if not plan:
+                return None
+            
+            update_dict = update_data.model_dump(exclude_unset=True)
+            
+            if update_data.fee_structure is not None:
+                self._validate_fee_structure(update_data.fee_structure)
+                update_dict["fee_structure"] = update_data.fee_structure.model_dump()
+            
+            if update_dict.get("is_default"):
+                self._unset_default_plans(reseller_id, exclude_plan_id=plan_id)
+            
+            for field, value in update_dict.items():
+                setattr(plan, field, value)
+            
+            plan.updated_at = datetime.utcnow()
+            
+            self.db.commit()
+            self.db.refresh(plan)
+            
+            # Transactions created from now on use the new fee table
+            fee_engine.invalidate(plan_id)
+            
+            logger.info(f"Updated merchant plan: {plan_id}", extra={
+                "plan_id": plan_id,
+                "reseller_id": reseller_id,
+                "updated_fields": list(update_dict.keys())
+            })
+            
+            return self._to_response(plan, self._plan_stats([plan_id]).get(plan_id))
+        
+        except Exception as e:
+            logger.error(f"Error updating merchant plan {plan_id}: {str(e)}")
+            self.db.rollback()
+            raise
+    
+    def associate_plan_to_merchant(
+        self,
+        merchant_id: str,
+        association: MerchantPlanAssociation,
+        reseller_id: str
+    ) -> Optional[MerchantPlanAssociationResponse]:
+        """Associate a plan to one of the reseller's merchants"""
+        try:
+            merchant = self.db.query(MerchantDB).filter(
+                MerchantDB.merchant_id == merchant_id,
+                MerchantDB.reseller_id == reseller_id
+            ).first()
+            plan = self._get_plan(association.plan_id, reseller_id)
+            
+            if not merchant or not plan:
+                return None
+            
+            if not plan.is_active:
+                raise ValueError(f"Plan {plan.plan_id} is not active")
+            
+            previous_plan_id = merchant.plan_id
+            now = datetime.utcnow()
+            
+            merchant.plan_id = plan.plan_id
+            merchant.updated_at = now
+            
+            self.db.commit()
+            
+            logger.info(f"Associated plan {plan.plan_id} to merchant {merchant_id}", extra={
+                "merchant_id": merchant_id,
+                "plan_id": plan.plan_id,
+                "previous_plan_id": previous_plan_id,
+                "reseller_id": reseller_id
+            })
+            
+            return MerchantPlanAssociationResponse(
+                merchant_id=merchant_id,
+                plan_id=plan.plan_id,
+                plan_name=plan.plan_name,
+                previous_plan_id=previous_plan_id,
+                effective_date=association.effective_date or now,
+                association_metadata=association.metadata,
+                associated_at=now
+            )
+        
+        except Exception as e:
+            logger.error(f"Error associating plan to merchant {merchant_id}: {str(e)}")
+            self.db.rollback()
+            raise
+    
+    def calculate_transaction_fees(
+        self,
+        plan_id: str,
+        amount: int,
+        payment_method: PaymentMethod,
+        installments: int,
+        reseller_id: str
+    ) -> Optional[PlanCalculation]:
+        """Preview the fees a plan applies to a transaction"""
+        plan = self._get_plan(plan_id, reseller_id)
+        if not plan:
+            return None
+        
+        schedule = fee_engine.for_plan(plan)
+        breakdown = schedule.breakdown(amount, payment_method, installments)
+        
+        return PlanCalculation(
+            plan_id=plan_id,
+            transaction_amount=amount,
+            payment_method=payment_method,
+            installments=installments,
+            **breakdown._asdict(),
+            fee_breakdown={
+                "fees": dict(schedule.fee_structure[payment_method.value]),
+                "percentage_per_installment": schedule.fee_structure["installments"]["percentage_per_installment"]
+            }
+        )
+    
+    def get_fee_schedule(self, plan_id: str, reseller_id: str) -> Optional[CompiledFeeSchedule]:
+        """Compiled fee table of a plan visible to the reseller"""
+        plan = self._get_plan(plan_id, reseller_id)
+        return fee_engine.for_plan(plan) if plan else None
+    
+    @staticmethod
+    def quote_etag(schedule: CompiledFeeSchedule, quote_request: PlanQuoteRequest) -> str:
+        """ETag of a quotation: changes with the plan version or the requested combinations"""
+        digest = hashlib.sha256(f"{schedule.plan_id}:{schedule.version}:".encode("utf-8"))
+        digest.update(dumps(quote_request.model_dump(mode="json")))
+        return f'"{digest.hexdigest()[:32]}"'
+    
+    def quote_fees(self, schedule: CompiledFeeSchedule, quote_request: PlanQuoteRequest) -> Dict[str, Any]:
+        """
+        Price every requested combination in one pass over the compiled table
+        
+        Returns a columnar dict (PlanQuoteResponse shape): position i of each
+        list describes one combination.
+        """
+        if quote_request.quotes is not None:
+            count = len(quote_request.quotes)
+            if count > settings.PLAN_QUOTE_MAX_ITEMS:
+                raise ValueError(f"A quotation cannot have more than {settings.PLAN_QUOTE_MAX_ITEMS} items")
+            
+            amounts = [item.amount for item in quote_request.quotes]
+            methods = [item.payment_method.value for item in quote_request.quotes]
+            installments = [item.installments for item in quote_request.quotes]
+        else:
+            matrix = quote_request.matrix
+            max_installments = matrix.max_installments or schedule.fee_structure["installments"]["max_installments"]
+            # Installments only apply to credit; other methods are quoted as a single payment
+            counts = [
+                (method.value, range(1, max_installments + 1) if method == PaymentMethod.CREDIT else range(1, 2))
+                for method in dict.fromkeys(matrix.payment_methods)
+            ]
+            
+            count = len(matrix.amounts) * sum(len(installment_range) for _, installment_range in counts)
+            if count > settings.PLAN_QUOTE_MAX_ITEMS:
+                raise ValueError(
+                    f"The quotation matrix has {count} combinations; "
+                    f"the limit is {settings.PLAN_QUOTE_MAX_ITEMS}"
+                )
+            
+            amounts, methods, installments = [], [], []
+            for amount in matrix.amounts:
+                for method, installment_range in counts:
+                    for installment_count in installment_range:
+                        amounts.append(amount)
+                        methods.append(method)
+                        installments.append(installment_count)
+        
+        total_fees = schedule.calculate_many(amounts, methods, installments)
+        
+        return {
+            "plan_id": schedule.plan_id,
+            "plan_version": schedule.version,
+            "count": count,
+            "amount": amounts,
+            "payment_method": methods,
+            "installments": installments,
+            "total_fee": total_fees,
+            "net_amount": [amount - fee for amount, fee in zip(amounts, total_fees)]
+        }
+    
+    def create_default_plans(self, reseller_id: str) -> List[MerchantPlanResponse]:
+        """Create the default plan templates the reseller does not have yet"""
+        existing_names = {
+            name for (name,) in self.db.query(MerchantPlanDB.plan_name).filter(
+                MerchantPlanDB.created_by_reseller_id == reseller_id
+            )
+        }
+        
+        created = []
+        for template in DefaultPlanTemplates.get_all_templates():
+            plan_data = MerchantPlanCreate(**template)
+            if plan_data.plan_name in existing_names:
+                continue
+            created.append(self.create_plan(plan_data, reseller_id))
+        
+        return created
+    
+    def delete_plan(self, plan_id: str, reseller_id: str) -> bool:
+        """Delete a plan (soft delete while merchants still use it)"""
+        try:
+            plan = self._get_plan(plan_id, reseller_id, owned=True)
+            if not plan:
+                return False
+            
+            merchant_count = self.db.query(func.count(MerchantDB.merchant_id)).filter(
+                MerchantDB.plan_id == plan_id
+            ).scalar()
+            
+            if merchant_count > 0:
+                # Soft delete - merchants keep the plan, new associations are refused
+                plan.is_active = False
+                plan.is_default = False
+                plan.updated_at = datetime.utcnow()
+                self.db.commit()
+                
+                logger.info(f"Soft deleted merchant plan with merchants: {plan_id}", extra={
+                    "plan_id": plan_id,
+                    "merchant_count": merchant_count
+                })
+            else:
+                self.db.delete(plan)
+                self.db.commit()
+                
+                logger.info(f"Hard deleted merchant plan: {plan_id}", extra={
+                    "plan_id": plan_id
+                })
+            
+            fee_engine.invalidate(plan_id)
+            
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error deleting merchant plan {plan_id}: {str(e)}")
+            self.db.rollback()
+            raise
+    
+    def _visible_plans(self, reseller_id: str):
+        return self.db.query(MerchantPlanDB).filter(
+            or_(
+                MerchantPlanDB.created_by_reseller_id == reseller_id,
+                MerchantPlanDB.created_by_reseller_id.is_(None)
+            )
+        )
+    
+    def _get_plan(self, plan_id: str, reseller_id: str, owned: bool = False) -> Optional[MerchantPlanDB]:
+        """Plan by ID; shared plans are visible but only owned plans can be changed"""
+        query = self._visible_plans(reseller_id) if not owned else self.db.query(MerchantPlanDB).filter(
+            MerchantPlanDB.created_by_reseller_id == reseller_id
+        )
+        return query.filter(MerchantPlanDB.plan_id == plan_id).first()
+    
+    def _unset_default_plans(self, reseller_id: str, exclude_plan_id: Optional[str] = None):
+        query = self.db.query(MerchantPlanDB).filter(
+            MerchantPlanDB.created_by_reseller_id == reseller_id,
+            MerchantPlanDB.is_default == True
+        )
+        if exclude_plan_id:
+            query = query.filter(MerchantPlanDB.plan_id != exclude_plan_id)
+        query.update({MerchantPlanDB.is_default: False}, synchronize_session=False)
+    
+    def _validate_fee_structure(self, fee_structure: PaymentMethodFees):
+        is_valid, errors = PlanBusinessRules.validate_fee_limits(fee_structure)
+        if not is_valid:
+            raise ValueError("; ".join(errors))
+    
+    def _plan_stats(self, plan_ids: List[str]) -> Dict[str, Tuple[int, int, int]]:
+        """(merchants_count, total_transactions, total_volume) per plan"""
+        if not plan_ids:
+            return {}
+        
+        stats = {plan_id: [0, 0, 0] for plan_id in plan_ids}
+        
+        merchant_rows = self.db.query(
+            MerchantDB.plan_id, func.count(MerchantDB.merchant_id)
+        ).filter(MerchantDB.plan_id.in_(plan_ids)).group_by(MerchantDB.plan_id)
+        for plan_id, count in merchant_rows:
+            stats[plan_id][0] = count
+        
+        transaction_rows = self.db.query(
+            MerchantDB.plan_id,
+            func.count(TransactionDB.transaction_id),
+            func.coalesce(func.sum(TransactionDB.gross_amount), 0)
+        ).join(TransactionDB, TransactionDB.merchant_id == MerchantDB.merchant_id).filter(
+            MerchantDB.plan_id.in_(plan_ids),
+            TransactionDB.status == TransactionStatus.APPROVED.value
+        ).group_by(MerchantDB.plan_id)
+        for plan_id, count, volume in transaction_rows:
+            stats[plan_id][1] = count
+            stats[plan_id][2] = volume
+        
+        return {plan_id: tuple(values) for plan_id, values in stats.items()}
+    
+    def _to_response(
+        self,
+        plan: MerchantPlanDB,
+        stats: Optional[Tuple[int, int, int]] = None
+    ) -> MerchantPlanResponse:
+        merchants_count, total_transactions, total_volume = stats or (0, 0, 0)
+        
+        return MerchantPlanResponse(
+            plan_id=plan.plan_id,
+            plan_name=plan.plan_name,
+            description=plan.description,
+            is_active=bool(plan.is_active),
+            is_default=bool(plan.is_default),
+            # Seeded plans may still use the legacy "installment_fee" shape
+            fee_structure=normalize_fee_structure(plan.fee_structure),
+            merchants_count=merchants_count,
+            total_transactions=total_transactions,
+            total_volume=int(total_volume),
+            created_at=plan.created_at,
+            updated_at=plan.updated_at,
+            created_by_reseller_id=plan.created_by_reseller_id or SYSTEM_RESELLER_ID
+        )
@@ -1,15 +1,115 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
+from collections import OrderedDict
+import hashlib
+import threading
+import time
 import uuid
 from datetime import datetime
 
 from app.database.models import ResellerDB
 from app.models.reseller import ResellerCreate, ResellerUpdate, ResellerResponse, ResellerAuth
+from config.settings import settings
 from config.logging import get_logger
 
 logger = get_logger(__name__)
 
+class ResellerTokenCache:
+    """
+    Bounded LRU + TTL cache of validated reseller tokens
+    
+    Keys are SHA-256 hashes of the bearer token, so raw tokens are never kept
+    as dict keys. Misses (unknown or inactive tokens) are cached as None too,
+    which keeps the legacy admin token fallback off the database. Entries are
+    dropped explicitly when a reseller is created, updated or deleted; the TTL
+    bounds staleness for changes made by other workers.
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[float, Optional[ResellerAuth]]]" = OrderedDict()
+        self.reseller_keys: Dict[str, str] = {}
+        self.version = 0
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+    
+    def get(self, token: str) -> Tuple[bool, Optional[ResellerAuth]]:
+        """Return (hit, reseller); reseller is None for a cached invalid token"""
+        key = self.token_key(token)
+        now = time.monotonic()
+        
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            
+            expires_at, reseller = entry
+            if expires_at <= now:
+                self._pop(key)
+                return False, None
+            
+            self.entries.move_to_end(key)
+            return True, reseller
+    
+    def set(self, token: str, reseller: Optional[ResellerAuth], version: int) -> None:
+        """
+        Store a validation result read from the database
+        
+        `version` is the cache version observed before the query; if an
+        invalidation happened in between the result may be stale and is
+        not stored.
+        """
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        
+        key = self.token_key(token)
+        
+        with self.lock:
+            if version != self.version:
+                return
+            
+            self._pop(key)
+            self.entries[key] = (time.monotonic() + self.ttl, reseller)
+            if reseller:
+                self.reseller_keys[reseller.reseller_id] = key
+            
+            while len(self.entries) > self.max_size:
+                oldest = next(iter(self.entries))
+                self._pop(oldest)
+    
+    def invalidate(self, reseller_id: Optional[str] = None, token: Optional[str] = None) -> None:
+        """Drop the cached entry of a reseller and/or of a token"""
+        with self.lock:
+            self.version += 1
+            if reseller_id:
+                key = self.reseller_keys.get(reseller_id)
+                if key:
+                    self._pop(key)
+            if token:
+                self._pop(self.token_key(token))
+    
+    def clear(self) -> None:
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+            self.reseller_keys.clear()
+    
+    def _pop(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry and entry[1] and self.reseller_keys.get(entry[1].reseller_id) == key:
+            del self.reseller_keys[entry[1].reseller_id]
+
+# Global token cache instance
+reseller_token_cache = ResellerTokenCache(
+    max_size=settings.RESELLER_TOKEN_CACHE_SIZE,
+    ttl=settings.RESELLER_TOKEN_CACHE_TTL
+)
+
 class ResellerService:
     """Service for managing resellers and compatibility with official API"""
     
@@ -42,6 +142,9 @@ class ResellerService:
             self.db.commit()
             self.db.refresh(db_reseller)
             
+            # The token may be cached as invalid from an earlier attempt
+            reseller_token_cache.invalidate(token=db_reseller.api_token)
+            
             logger.info(f"Created reseller: {db_reseller.reseller_id}", extra={
                 "reseller_id": db_reseller.reseller_id,
                 "document": db_reseller.document
@@ -98,6 +201,8 @@ class ResellerService:
             self.db.commit()
             self.db.refresh(reseller)
             
+            reseller_token_cache.invalidate(reseller_id=reseller_id, token=reseller.api_token)
+            
             logger.info(f"Updated reseller: {reseller_id}", extra={
                 "reseller_id": reseller_id,
                 "updated_fields": list(update_dict.keys())
@@ -150,6 +255,8 @@ class ResellerService:
                     "reseller_id": reseller_id
                 })
             
+            reseller_token_cache.invalidate(reseller_id=reseller_id)
+            
             return True
             
         except Exception as e:
@@ -171,7 +278,7 @@ class ResellerService:
         reseller = query.first()
         
         if reseller:
-            logger.info(f"Token validation successful", extra={
+            logger.debug(f"Token validation successful", extra={
                 "reseller_id": reseller.reseller_id,
                 "document": reseller.document
             })
@@ -0,0 +1,423 @@
+import asyncio
+import inspect
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Union
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from config.serialization import dumps, loads
+from config.settings import settings
+from app.database.connection import get_async_db_session, get_async_read_db_session
+from app.database.models import JobLeaseDB, JobRunDB
+from app.models.job import JobRunStatus
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+class CronSchedule:
+    """Expressão cron de 5 campos: minuto hora dia-do-mês mês dia-da-semana
+    
+    Cada campo aceita `*`, valores, intervalos (`1-5`), listas (`0,30`) e
+    passos (`*/5`, `8-18/2`). Dia da semana: 0 ou 7 = domingo. Como no cron,
+    se dia-do-mês e dia-da-semana forem ambos restritos, basta um coincidir.
+    """
+    
+    FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7))
+    
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Invalid cron expression '{expression}': expected 5 fields")
+        
+        self.expression = expression
+        minutes, hours, days, months, weekdays = (
+            self._parse_field(part, name, low, high) for part, (name, low, high) in zip(parts, self.FIELDS)
+        )
+        self.minutes = minutes
+        self.hours = hours
+        self.days = days
+        self.months = months
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        # `*` e `*/N` não restringem o campo para a regra dia-do-mês OU dia-da-semana
+        self.any_day = parts[2].startswith("*")
+        self.any_weekday = parts[4].startswith("*")
+    
+    @staticmethod
+    def _parse_field(field: str, name: str, low: int, high: int) -> FrozenSet[int]:
+        values = set()
+        for item in field.split(","):
+            base, _, step = item.partition("/")
+            try:
+                step_value = int(step) if step else 1
+                if base == "*":
+                    start, end = low, high
+                elif "-" in base:
+                    start, end = (int(value) for value in base.split("-", 1))
+                else:
+                    start = int(base)
+                    end = high if step else start
+            except ValueError:
+                raise ValueError(f"Invalid cron {name} field: '{field}'")
+            
+            if step_value < 1 or not low <= start <= end <= high:
+                raise ValueError(f"Invalid cron {name} field: '{field}' (allowed {low}-{high})")
+            values.update(range(start, end + 1, step_value))
+        return frozenset(values)
+    
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = moment.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+    
+    def next_after(self, moment: datetime) -> datetime:
+        """Primeiro horário do cron estritamente depois de `moment`"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment.year + 5
+        
+        while candidate.year <= limit:
+            if candidate.month not in self.months:
+                month_start = candidate.replace(day=1, hour=0, minute=0)
+                candidate = (month_start + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+
+class ScheduledJob:
+    """Job registrado no agendador"""
+    
+    def __init__(self, name: str, schedule: CronSchedule, func: JobFunc, cluster: bool, timeout: int, in_thread: bool = True):
+        self.name = name
+        self.schedule = schedule
+        self.func = func
+        self.cluster = cluster
+        self.timeout = timeout
+        self.in_thread = in_thread
+        self.next_run_at: Optional[datetime] = None
+        self.last_slot: Optional[datetime] = None
+
+
+class JobScheduler:
+    """Agendador em processo de jobs periódicos (cron) com eleição por job
+    
+    Cada worker roda um loop por job que dorme até o próximo horário do cron
+    mais um jitter aleatório (SCHEDULER_JITTER_SECONDS), para os workers não
+    disputarem o banco no mesmo instante. Jobs de cluster só rodam no worker
+    que reivindicar o horário na tabela job_leases: um UPDATE condicional
+    (lease livre ou expirado e horário ainda não reivindicado) garante uma
+    execução por horário no cluster, e o lease (timeout + margem) impede que
+    outro worker inicie o job enquanto a execução anterior não terminou.
+    Jobs locais (cluster=False) rodam em todos os workers, para limpar
+    estado em memória de cada processo.
+    
+    Toda execução é gravada em job_runs com duração, status e resultado.
+    """
+    
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.jitter = max(0.0, settings.SCHEDULER_JITTER_SECONDS)
+        self.default_timeout = settings.SCHEDULER_JOB_TIMEOUT
+        self.lease_margin = settings.SCHEDULER_LEASE_MARGIN
+        self.retention_days = settings.SCHEDULER_RUN_RETENTION_DAYS
+        
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+        
+        self.stats = {"runs": 0, "failed": 0, "skipped": 0}
+    
+    @property
+    def is_running(self) -> bool:
+        return self._running
+    
+    @property
+    def jobs(self) -> List[ScheduledJob]:
+        return list(self._jobs.values())
+    
+    def register(
+        self,
+        name: str,
+        cron: str,
+        func: JobFunc,
+        cluster: bool = True,
+        timeout: Optional[int] = None,
+        in_thread: bool = True
+    ) -> Optional[ScheduledJob]:
+        """Registra um job (antes de start); cron vazio deixa o job desativado
+        
+        Funções síncronas rodam em uma thread (asyncio.to_thread), para não
+        bloquear o event loop e para o timeout valer. Use in_thread=False só
+        para trabalho rápido em memória que compartilha estado com o loop.
+        """
+        
+        if not cron:
+            logger.info(f"Scheduled job {name} disabled (empty cron)")
+            return None
+        if name in self._jobs:
+            raise ValueError(f"Job {name} already registered")
+        
+        schedule = CronSchedule(cron)
+        schedule.next_after(datetime.utcnow())  # Rejeita expressões que nunca coincidem
+        
+        job = ScheduledJob(name, schedule, func, cluster, timeout or self.default_timeout, in_thread)
+        self._jobs[name] = job
+        return job
+    
+    async def start(self):
+        """Cria os leases dos jobs de cluster e inicia um loop por job"""
+        if self._running:
+            return
+        
+        self._running = True
+        await self._ensure_leases()
+        
+        self._tasks = [
+            asyncio.create_task(self._job_loop(job), name=f"job-{job.name}")
+            for job in self._jobs.values()
+        ]
+        
+        logger.info(f"Job scheduler started with {len(self._tasks)} jobs (owner {self.owner})")
+    
+    async def stop(self):
+        """Cancela os loops; uma execução em andamento é gravada como cancelada"""
+        if not self._running:
+            return
+        
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        logger.info("Job scheduler stopped")
+    
+    async def _ensure_leases(self):
+        names = [job.name for job in self._jobs.values() if job.cluster]
+        if not names:
+            return
+        
+        # Dois workers subindo juntos podem inserir o mesmo lease: o perdedor tenta de novo
+        for attempt in range(2):
+            try:
+                async with get_async_db_session() as db:
+                    existing = set((await db.execute(
+                        select(JobLeaseDB.job_name).where(JobLeaseDB.job_name.in_(names))
+                    )).scalars())
+                    for name in names:
+                        if name not in existing:
+                            db.add(JobLeaseDB(job_name=name))
+                return
+            except IntegrityError:
+                if attempt:
+                    raise
+    
+    async def _job_loop(self, job: ScheduledJob):
+        while self._running:
+            now = datetime.utcnow()
+            # Nunca repete um horário já executado, mesmo se o relógio acordar adiantado
+            slot = job.schedule.next_after(max(now, job.last_slot or now))
+            job.next_run_at = slot
+            
+            delay = (slot - now).total_seconds() + random.uniform(0, self.jitter)
+            await asyncio.sleep(max(0.0, delay))
+            
+            job.last_slot = slot
+            try:
+                await self.run_job(job.name, slot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduled job {job.name} loop error: {e}")
+    
+    async def run_job(self, name: str, slot: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Executa um job agora e grava a execução
+        
+        Com `slot` (horário do cron), um job de cluster só roda se este worker
+        reivindicar o horário; sem `slot` (execução manual) basta o lease
+        estar livre. Retorna o registro da execução ou None se outro worker
+        ficou com ela.
+        """
+        
+        job = self._jobs.get(name)
+        if job is None:
+            raise ValueError(f"Unknown job: {name}")
+        
+        if job.cluster and not await self._acquire(job, slot):
+            self.stats["skipped"] += 1
+            logger.debug(f"Scheduled job {name} ({slot}) claimed by another worker")
+            return None
+        
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        status, error, result = JobRunStatus.SUCCEEDED, None, None
+        
+        try:
+            result = await asyncio.wait_for(self._call(job), timeout=job.timeout)
+        except asyncio.TimeoutError:
+            status, error = JobRunStatus.TIMEOUT, f"Timed out after {job.timeout}s"
+        except asyncio.CancelledError:
+            status, error = JobRunStatus.CANCELLED, "Scheduler stopped"
+            raise
+        except Exception as e:
+            status, error = JobRunStatus.FAILED, str(e)
+        finally:
+            run = {
+                "job_name": job.name,
+                "owner": self.owner,
+                "scheduled_for": slot,
+                "started_at": started_at,
+                "finished_at": datetime.utcnow(),
+                "duration_ms": int((time.perf_counter() - started) * 1000),
+                "status": status.value,
+                "error": error,
+                "result": self._json_safe(result)
+            }
+            await self._finish(job, run)
+        
+        if status == JobRunStatus.SUCCEEDED:
+            logger.info(f"Scheduled job {name} succeeded in {run['duration_ms']}ms")
+        else:
+            self.stats["failed"] += 1
+            logger.error(f"Scheduled job {name} {status.value}: {error}")
+        
+        return run
+    
+    @staticmethod
+    async def _call(job: ScheduledJob) -> Any:
+        if job.in_thread and not inspect.iscoroutinefunction(job.func):
+            # O timeout só abandona a thread: a função síncrona termina sozinha
+            result = await asyncio.to_thread(job.func)
+        else:
+            result = job.func()
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+    
+    async def _acquire(self, job: ScheduledJob, slot: Optional[datetime]) -> bool:
+        """Reivindica o lease do job (e o horário `slot`) com um UPDATE condicional"""
+        
+        now = datetime.utcnow()
+        conditions = [
+            JobLeaseDB.job_name == job.name,
+            or_(JobLeaseDB.leased_until.is_(None), JobLeaseDB.leased_until <= now)
+        ]
+        values = {
+            "owner": self.owner,
+            "leased_until": now + timedelta(seconds=job.timeout + self.lease_margin)
+        }
+        if slot is not None:
+            conditions.append(or_(JobLeaseDB.last_slot.is_(None), JobLeaseDB.last_slot < slot))
+            values["last_slot"] = slot
+        
+        async with get_async_db_session() as db:
+            result = await db.execute(update(JobLeaseDB).where(and_(*conditions)).values(**values))
+            return result.rowcount == 1
+    
+    async def _finish(self, job: ScheduledJob, run: Dict[str, Any]):
+        """Grava a execução e libera o lease na mesma transação
+        
+        Após timeout ou cancelamento o trabalho pode continuar (thread de um
+        job síncrono, coorte protegida por shield): o lease não é liberado e
+        expira sozinho, para outro worker não iniciar o job por cima.
+        """
+        
+        still_running = run["status"] in (JobRunStatus.TIMEOUT.value, JobRunStatus.CANCELLED.value)
+        
+        self.stats["runs"] += 1
+        try:
+            async with get_async_db_session() as db:
+                db.add(JobRunDB(**run))
+                if job.cluster and not still_running:
+                    await db.execute(
+                        update(JobLeaseDB)
+                        .where(and_(JobLeaseDB.job_name == job.name, JobLeaseDB.owner == self.owner))
+                        .values(leased_until=run["finished_at"])
+                    )
+        except Exception as e:
+            # O lease expira sozinho; só o histórico desta execução se perde
+            logger.error(f"Failed to record run of scheduled job {job.name}: {e}")
+    
+    @staticmethod
+    def _json_safe(result: Any) -> Any:
+        """Resultado do job em tipos JSON (datas em ISO 8601, enums pelo valor)"""
+        if result is None:
+            return None
+        try:
+            return loads(dumps(result))
+        except TypeError:
+            return repr(result)
+    
+    async def prune_runs(self) -> int:
+        """Remove do histórico as execuções mais antigas que SCHEDULER_RUN_RETENTION_DAYS"""
+        
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        async with get_async_db_session() as db:
+            result = await db.execute(delete(JobRunDB).where(JobRunDB.started_at < cutoff))
+            return result.rowcount
+    
+    async def list_jobs(self) -> List[Dict[str, Any]]:
+        """Jobs registrados neste worker com o estado do lease no banco"""
+        
+        async with get_async_read_db_session() as db:
+            leases = {
+                lease.job_name: lease
+                for lease in (await db.execute(
+                    select(JobLeaseDB).where(JobLeaseDB.job_name.in_(list(self._jobs)))
+                )).scalars()
+            }
+        
+        jobs = []
+        for job in self._jobs.values():
+            lease = leases.get(job.name)
+            jobs.append({
+                "name": job.name,
+                "cron": job.schedule.expression,
+                "cluster": job.cluster,
+                "timeout": job.timeout,
+                "next_run_at": job.next_run_at,
+                "lease_owner": lease.owner if lease else None,
+                "leased_until": lease.leased_until if lease else None,
+                "last_slot": lease.last_slot if lease else None
+            })
+        return jobs
+    
+    async def list_runs(
+        self,
+        job_name: Optional[str] = None,
+        status: Optional[JobRunStatus] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Execuções mais recentes primeiro (de todos os workers)"""
+        
+        table = JobRunDB.__table__
+        query = select(table)
+        if job_name:
+            query = query.where(table.c.job_name == job_name)
+        if status:
+            query = query.where(table.c.status == status.value)
+        query = query.order_by(table.c.started_at.desc(), table.c.id.desc()).limit(limit)
+        
+        async with get_async_read_db_session() as db:
+            return [dict(row) for row in (await db.execute(query)).mappings()]
+
+
+# Instância global do agendador
+job_scheduler = JobScheduler()
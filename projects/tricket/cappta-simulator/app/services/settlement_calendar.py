@@ -0,0 +1,112 @@
+import math
+from datetime import date, datetime, timedelta
+from typing import Dict, FrozenSet, Iterable, Tuple, Union
+
+from config.settings import settings
+from app.models.common import PaymentMethod
+
+Method = Union[PaymentMethod, str]
+
+
+def easter_sunday(year: int) -> date:
+    """Domingo de Páscoa (algoritmo de Meeus/Jones/Butcher, calendário gregoriano)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def national_holidays(year: int) -> FrozenSet[date]:
+    """Feriados nacionais sem expediente bancário (calendário FEBRABAN)"""
+    easter = easter_sunday(year)
+    holidays = {
+        date(year, 1, 1),    # Confraternização Universal
+        date(year, 4, 21),   # Tiradentes
+        date(year, 5, 1),    # Dia do Trabalho
+        date(year, 9, 7),    # Independência
+        date(year, 10, 12),  # Nossa Senhora Aparecida
+        date(year, 11, 2),   # Finados
+        date(year, 11, 15),  # Proclamação da República
+        date(year, 12, 25),  # Natal
+        easter - timedelta(days=48),  # Carnaval (segunda)
+        easter - timedelta(days=47),  # Carnaval (terça)
+        easter - timedelta(days=2),   # Sexta-feira Santa
+        easter + timedelta(days=60),  # Corpus Christi
+    }
+    if year >= 2024:
+        holidays.add(date(year, 11, 20))  # Consciência Negra (Lei 14.759/2023)
+    return frozenset(holidays)
+
+
+class SettlementCalendar:
+    """Calendário de dias úteis para a agenda de liquidação D+N
+    
+    O prazo de cada método vem de SETTLEMENT_DELAY_CREDIT/DEBIT/PIX (em horas,
+    arredondadas para cima em dias úteis: 24h = D+1). A contagem começa no
+    primeiro dia útil a partir da captura, então uma venda de sábado em D+1
+    liquida na terça. Feriados: nacionais + SETTLEMENT_EXTRA_HOLIDAYS.
+    
+    As datas são memorizadas por (dia da captura, método): o cálculo por
+    transação em inserções em massa é uma consulta a dicionário.
+    """
+    
+    def __init__(self, extra_holidays: Iterable[date] = ()):
+        self.extra_holidays = frozenset(extra_holidays)
+        self._holidays: Dict[int, FrozenSet[date]] = {}
+        self._expected: Dict[Tuple[date, str], date] = {}
+    
+    def holidays(self, year: int) -> FrozenSet[date]:
+        holidays = self._holidays.get(year)
+        if holidays is None:
+            holidays = national_holidays(year) | {day for day in self.extra_holidays if day.year == year}
+            self._holidays[year] = holidays
+        return holidays
+    
+    def is_business_day(self, day: date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays(day.year)
+    
+    def next_business_day(self, day: date) -> date:
+        """O próprio dia, se for útil, ou o próximo dia útil"""
+        while not self.is_business_day(day):
+            day += timedelta(days=1)
+        return day
+    
+    def add_business_days(self, day: date, days: int) -> date:
+        """Avança `days` dias úteis a partir do primeiro dia útil em `day`"""
+        day = self.next_business_day(day)
+        for _ in range(days):
+            day = self.next_business_day(day + timedelta(days=1))
+        return day
+    
+    @staticmethod
+    def delay_days(payment_method: Method) -> int:
+        """Prazo de liquidação do método em dias úteis"""
+        hours = {
+            PaymentMethod.CREDIT.value: settings.SETTLEMENT_DELAY_CREDIT,
+            PaymentMethod.DEBIT.value: settings.SETTLEMENT_DELAY_DEBIT,
+            PaymentMethod.PIX.value: settings.SETTLEMENT_DELAY_PIX
+        }[getattr(payment_method, "value", payment_method)]
+        return math.ceil(hours / 24)
+    
+    def expected_settlement_date(self, captured_at: Union[datetime, date], payment_method: Method) -> date:
+        """Data prevista de liquidação de uma transação capturada em `captured_at`"""
+        captured_day = captured_at.date() if isinstance(captured_at, datetime) else captured_at
+        method = getattr(payment_method, "value", payment_method)
+        
+        key = (captured_day, method)
+        expected = self._expected.get(key)
+        if expected is None:
+            expected = self.add_business_days(captured_day, self.delay_days(method))
+            self._expected[key] = expected
+        return expected
+
+
+# Instância global do calendário de liquidação
+settlement_calendar = SettlementCalendar(settings.SETTLEMENT_EXTRA_HOLIDAYS)
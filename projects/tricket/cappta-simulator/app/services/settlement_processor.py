@@ -1,19 +1,26 @@
+import asyncio
 import logging
-from typing import List, Optional
-from datetime import datetime, date, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, date
+from sqlalchemy import and_, case, func, select, update
 
 from config.settings import settings
-from app.database.connection import get_db_session
-from app.database.models import SettlementDB, TransactionDB, MerchantDB
-from app.models.settlement import SettlementCreate, SettlementResponse
+from app.database.connection import get_async_db_session, get_async_read_db_session
+from app.database.models import SettlementDB, TransactionDB, MerchantDB, MerchantSettlementRollupDB
+from app.database.models import SettlementStatus as StoredSettlementStatus
+from app.database.pagination import keyset_filter, next_cursor
+from app.models.settlement import SettlementCreate, SettlementResponse, SettlementSummary
 from app.models.common import SettlementStatus, TransactionStatus
 from .asaas_client import AsaasClient
+from .settlement_calendar import settlement_calendar
 from .webhook_sender import WebhookSender
 
 logger = logging.getLogger(__name__)
 
+# Liquidação ainda recebendo lotes de transações: invisível para leituras e rollups
+SETTLEMENT_BUILDING = StoredSettlementStatus.BUILDING.value
+
 class SettlementProcessor:
     """Processador de liquidações do simulador Cappta"""
     
@@ -24,34 +31,33 @@ class SettlementProcessor:
     async def create_settlement(self, settlement_data: SettlementCreate) -> SettlementResponse:
         """Cria uma nova liquidação"""
         
-        with get_db_session() as db:
+        async with get_async_db_session() as db:
             # Verifica se o comerciante existe
-            merchant = db.query(MerchantDB).filter(
-                MerchantDB.merchant_id == settlement_data.merchant_id
-            ).first()
+            merchant = await db.get(MerchantDB, settlement_data.merchant_id)
             
             if not merchant:
                 raise ValueError(f"Merchant {settlement_data.merchant_id} not found")
             
             # Busca transações pendentes de liquidação
-            transactions = db.query(TransactionDB).filter(
-                and_(
-                    TransactionDB.external_event_id.in_(settlement_data.transaction_refs),
-                    TransactionDB.merchant_id == settlement_data.merchant_id,
-                    TransactionDB.status == TransactionStatus.APPROVED.value,
-                    TransactionDB.settlement_id.is_(None)
+            transactions = (await db.execute(
+                select(TransactionDB).where(
+                    and_(
+                        TransactionDB.external_event_id.in_(settlement_data.transaction_refs),
+                        TransactionDB.merchant_id == settlement_data.merchant_id,
+                        TransactionDB.status == TransactionStatus.APPROVED.value,
+                        TransactionDB.settlement_id.is_(None)
+                    )
                 )
-            ).all()
+            )).scalars().all()
             
             if not transactions:
                 raise ValueError("No eligible transactions found for settlement")
             
-            # Verifica se as transações estão dentro do prazo para liquidação
+            # Verifica se as transações já chegaram à data prevista de liquidação
             if not settlement_data.force_settlement:
-                cutoff_date = datetime.now() - timedelta(hours=settings.SETTLEMENT_DELAY_HOURS)
-                recent_transactions = [t for t in transactions if t.captured_at > cutoff_date]
-                if recent_transactions:
-                    recent_ids = [t.transaction_id for t in recent_transactions]
+                today = date.today()
+                recent_ids = [t.transaction_id for t in transactions if self._expected_date(t) > today]
+                if recent_ids:
                     raise ValueError(f"Transactions {recent_ids} are not yet eligible for settlement")
             
             # Calcula totais
@@ -72,7 +78,12 @@ class SettlementProcessor:
             )
             
             db.add(db_settlement)
-            db.flush()  # Para obter o ID antes do commit
+            await db.flush()  # Para obter o ID antes do commit
+            
+            await self._update_rollup(
+                db, db_settlement.merchant_id, db_settlement.settlement_date,
+                old_status=None, new_status=SettlementStatus.PENDING.value, new_net=net_amount
+            )
             
             # Associa transações à liquidação
             for transaction in transactions:
@@ -80,42 +91,53 @@ class SettlementProcessor:
                 transaction.status = TransactionStatus.SETTLED.value
                 transaction.updated_at = datetime.utcnow()
             
-            db.commit()
-            db.refresh(db_settlement)
-            
-            response = self._db_to_response(db_settlement)
-            
-            # Processa liquidação assincronamente
-            await self._process_settlement(response)
-            
-            logger.info(f"Settlement {response.settlement_id} created for merchant {response.merchant_id}")
+            await db.commit()
+            await db.refresh(db_settlement)
             
-            return response
+            response = await self._db_to_response(db, db_settlement)
+        
+        # Processa liquidação após liberar a sessão (no SQLite há uma única conexão de escrita)
+        await self._process_settlement(response)
+        
+        logger.info(f"Settlement {response.settlement_id} created for merchant {response.merchant_id}")
+        
+        return response
     
     async def _process_settlement(self, settlement: SettlementResponse):
         """Processa a liquidação fazendo transferência via Asaas"""
         
         try:
-            with get_db_session() as db:
-                # Atualiza status para processando
-                db_settlement = db.query(SettlementDB).filter(
-                    SettlementDB.settlement_id == settlement.settlement_id
-                ).first()
-                
-                if not db_settlement:
-                    raise ValueError("Settlement not found")
+            async with get_async_db_session() as db:
+                # Reivindica a liquidação (pending -> processing): só um processo
+                # faz a transferência, mesmo se outro retomar a mesma liquidação
+                claimed = await db.execute(
+                    update(SettlementDB)
+                    .where(and_(
+                        SettlementDB.settlement_id == settlement.settlement_id,
+                        SettlementDB.status == SettlementStatus.PENDING.value
+                    ))
+                    .values(status=SettlementStatus.PROCESSING.value)
+                )
+                if claimed.rowcount != 1:
+                    logger.info(f"Settlement {settlement.settlement_id} is no longer pending; skipping transfer")
+                    return
                 
-                db_settlement.status = SettlementStatus.PROCESSING.value
-                db.commit()
+                db_settlement = await db.get(SettlementDB, settlement.settlement_id, populate_existing=True)
                 
                 # Busca dados do comerciante
-                merchant = db.query(MerchantDB).filter(
-                    MerchantDB.merchant_id == settlement.merchant_id
-                ).first()
+                merchant = await db.get(MerchantDB, settlement.merchant_id)
                 
                 if not merchant:
                     raise ValueError("Merchant not found")
                 
+                await self._update_rollup(
+                    db, db_settlement.merchant_id, db_settlement.settlement_date,
+                    old_status=SettlementStatus.PENDING.value, new_status=db_settlement.status,
+                    old_net=db_settlement.net_amount
+                )
+                # Commit antes da chamada ao Asaas: nenhuma transação fica aberta durante o HTTP
+                await db.commit()
+                
                 # Cria transferência no Asaas
                 transfer_response = await self.asaas_client.create_transfer(
                     destination_account_id=merchant.asaas_account_id,
@@ -127,129 +149,562 @@ class SettlementProcessor:
                 db_settlement.asaas_transfer_id = transfer_response.get("id")
                 db_settlement.status = SettlementStatus.COMPLETED.value
                 db_settlement.processed_at = datetime.utcnow()
-                db.commit()
-                
-                updated_settlement = self._db_to_response(db_settlement)
+                await self._update_rollup(
+                    db, db_settlement.merchant_id, db_settlement.settlement_date,
+                    old_status=SettlementStatus.PROCESSING.value, new_status=db_settlement.status,
+                    old_net=db_settlement.net_amount
+                )
+                updated_settlement = await self._db_to_response(db, db_settlement)
                 
-                # Envia webhook de liquidação
-                await self.webhook_sender.send_settlement_webhook(updated_settlement)
+                # Envia webhook de liquidação (enfileirado na mesma transação)
+                await self.webhook_sender.send_settlement_webhook(updated_settlement, db=db)
+                await db.commit()
                 
                 logger.info(f"Settlement {settlement.settlement_id} processed successfully via Asaas transfer {transfer_response.get('id')}")
-                
+        
         except Exception as e:
             logger.error(f"Failed to process settlement {settlement.settlement_id}: {e}")
             
             # Marca liquidação como falha
-            with get_db_session() as db:
-                db_settlement = db.query(SettlementDB).filter(
-                    SettlementDB.settlement_id == settlement.settlement_id
-                ).first()
+            async with get_async_db_session() as db:
+                db_settlement = await db.get(SettlementDB, settlement.settlement_id)
                 
                 if db_settlement:
+                    old_status = db_settlement.status
                     db_settlement.status = SettlementStatus.FAILED.value
                     db_settlement.processed_at = datetime.utcnow()
-                    db.commit()
+                    await self._update_rollup(
+                        db, db_settlement.merchant_id, db_settlement.settlement_date,
+                        old_status=old_status, new_status=db_settlement.status, old_net=db_settlement.net_amount
+                    )
+                    await db.commit()
     
     async def get_settlement(self, settlement_id: str) -> Optional[SettlementResponse]:
         """Busca liquidação por ID"""
         
-        with get_db_session() as db:
-            settlement = db.query(SettlementDB).filter(
-                SettlementDB.settlement_id == settlement_id
-            ).first()
+        async with get_async_read_db_session() as db:
+            settlement = await db.get(SettlementDB, settlement_id)
             
-            if not settlement:
+            if not settlement or settlement.status == SETTLEMENT_BUILDING:
                 return None
             
-            return self._db_to_response(settlement)
+            return await self._db_to_response(db, settlement)
     
     async def list_settlements(
         self,
         merchant_id: Optional[str] = None,
         status: Optional[SettlementStatus] = None,
         page: int = 1,
-        per_page: int = 20
-    ) -> List[SettlementResponse]:
-        """Lista liquidações com filtros"""
+        per_page: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[SettlementResponse], Optional[str]]:
+        """Lista liquidações com filtros; retorna a página e o cursor da próxima
+        
+        Com `cursor` a página é buscada por keyset em (created_at, settlement_id);
+        `page` é ignorado.
+        """
         
-        with get_db_session() as db:
-            query = db.query(SettlementDB)
+        async with get_async_read_db_session() as db:
+            query = select(SettlementDB).where(SettlementDB.status != SETTLEMENT_BUILDING)
             
             if merchant_id:
-                query = query.filter(SettlementDB.merchant_id == merchant_id)
+                query = query.where(SettlementDB.merchant_id == merchant_id)
             
             if status:
-                query = query.filter(SettlementDB.status == status.value)
+                query = query.where(SettlementDB.status == status.value)
             
             # Paginação
-            offset = (page - 1) * per_page
-            settlements = query.order_by(SettlementDB.created_at.desc()).offset(offset).limit(per_page).all()
+            if cursor:
+                query = query.where(keyset_filter(SettlementDB.created_at, SettlementDB.settlement_id, cursor))
+            else:
+                query = query.offset((page - 1) * per_page)
+            
+            # Uma linha extra indica se existe próxima página
+            query = query.order_by(SettlementDB.created_at.desc(), SettlementDB.settlement_id.desc()).limit(per_page + 1)
+            rows = (await db.execute(query)).scalars().all()
+            cursor_out = next_cursor(rows, per_page, "created_at", "settlement_id")
+            settlements = rows[:per_page]
+            
+            # Referências de toda a página em uma única query
+            refs = await self._fetch_transaction_refs(db, [s.settlement_id for s in settlements])
+            
+            return [self._build_response(s, refs[s.settlement_id]) for s in settlements], cursor_out
+    
+    async def auto_settle_eligible_transactions(self) -> Dict[str, Any]:
+        """Processa automaticamente as transações com liquidação prevista até hoje"""
+        return await self.settle_due_cohorts(date.today())
+    
+    async def settle_due_cohorts(self, up_to: date) -> Dict[str, Any]:
+        """Liquida as coortes com data prevista até `up_to` (inclusive)
+        
+        Uma coorte é o conjunto de transações aprovadas e não liquidadas de um
+        comerciante com a mesma expected_settlement_date; cada uma vira uma
+        liquidação com settlement_date igual à data prevista. As coortes saem
+        de uma varredura por faixa no índice idx_transactions_settle_due e as
+        transações são vinculadas com UPDATE em lotes de SETTLEMENT_BATCH_SIZE
+        (commit por lote), sem carregar as linhas em memória.
+        
+        Com `up_to` no passado é o modo de replay: liquida só o que já
+        deveria ter sido liquidado até aquela data, com as datas originais.
+        
+        Antes das coortes novas, retoma as liquidações interrompidas por uma
+        execução anterior (ver resume_interrupted_settlements).
+        """
+        
+        if up_to > date.today():
+            raise ValueError("up_to cannot be in the future; use force_settlement for early settlements")
+        
+        resumed = await self.resume_interrupted_settlements()
+        backfilled = await self.backfill_expected_dates()
+        
+        due = and_(
+            TransactionDB.status == TransactionStatus.APPROVED.value,
+            TransactionDB.settlement_id.is_(None),
+            TransactionDB.expected_settlement_date <= up_to
+        )
+        
+        async with get_async_read_db_session() as db:
+            cohorts = (await db.execute(
+                select(TransactionDB.merchant_id, TransactionDB.expected_settlement_date)
+                .where(due)
+                .group_by(TransactionDB.merchant_id, TransactionDB.expected_settlement_date)
+                .order_by(TransactionDB.merchant_id, TransactionDB.expected_settlement_date)
+            )).all()
+        
+        result = {
+            "up_to": up_to.isoformat(),
+            "cohorts": len(cohorts),
+            "settlements_created": 0,
+            "transactions_settled": 0,
+            "settlements_resumed": resumed,
+            "expected_dates_backfilled": backfilled
+        }
+        
+        if not cohorts:
+            logger.info(f"No settlement cohorts due up to {up_to}")
+            return result
+        
+        # Cria uma liquidação por comerciante e data prevista. Um cancelamento
+        # (timeout do agendador, shutdown) só interrompe entre coortes: a coorte
+        # em andamento termina em background, inclusive a transferência
+        for merchant_id, settlement_date in cohorts:
+            try:
+                settled_count = await asyncio.shield(self._settle_cohort(merchant_id, settlement_date))
+                if settled_count:
+                    result["settlements_created"] += 1
+                    result["transactions_settled"] += settled_count
             
-            return [self._db_to_response(s) for s in settlements]
+            except Exception as e:
+                logger.error(f"Failed to settle cohort {settlement_date} for merchant {merchant_id}: {e}")
+        
+        return result
     
-    async def auto_settle_eligible_transactions(self):
-        """Processa automaticamente transações elegíveis para liquidação"""
+    async def _settle_cohort(self, merchant_id: str, settlement_date: date) -> int:
+        """Liquida uma coorte e faz a transferência; retorna o número de transações liquidadas"""
+        
+        settlement, settled_count = await self._settle_merchant(merchant_id, settlement_date)
+        if settlement is None:
+            return 0
+        
+        logger.info(
+            f"Settlement cohort {settlement_date} created for merchant {merchant_id} "
+            f"with {settled_count} transactions"
+        )
+        
+        await self._process_settlement(settlement)
+        return settled_count
+    
+    async def backfill_expected_dates(self) -> int:
+        """Preenche expected_settlement_date de transações aprovadas anteriores à agenda
+        
+        Um UPDATE por (dia da captura, método), que é o que define a data.
+        """
+        
+        captured_day = func.date(func.coalesce(TransactionDB.captured_at, TransactionDB.created_at))
+        missing = and_(
+            TransactionDB.status == TransactionStatus.APPROVED.value,
+            TransactionDB.settlement_id.is_(None),
+            TransactionDB.expected_settlement_date.is_(None)
+        )
         
-        with get_db_session() as db:
-            # Busca transações aprovadas há mais tempo que o prazo de liquidação
-            cutoff_date = datetime.now() - timedelta(hours=settings.SETTLEMENT_DELAY_HOURS)
+        async with get_async_db_session() as db:
+            groups = (await db.execute(
+                select(captured_day, TransactionDB.payment_method).where(missing).distinct()
+            )).all()
             
-            eligible_transactions = db.query(TransactionDB).filter(
-                and_(
-                    TransactionDB.status == TransactionStatus.APPROVED.value,
-                    TransactionDB.settlement_id.is_(None),
-                    TransactionDB.captured_at <= cutoff_date
+            updated = 0
+            for day, payment_method in groups:
+                # date() devolve texto no SQLite
+                day = day if isinstance(day, date) else date.fromisoformat(day)
+                result = await db.execute(
+                    update(TransactionDB)
+                    .where(and_(missing, captured_day == day.isoformat(), TransactionDB.payment_method == payment_method))
+                    .values(expected_settlement_date=settlement_calendar.expected_settlement_date(day, payment_method))
+                    .execution_options(synchronize_session=False)
                 )
-            ).all()
-            
-            if not eligible_transactions:
-                logger.info("No eligible transactions found for auto settlement")
-                return
-            
-            # Agrupa por comerciante
-            transactions_by_merchant = {}
-            for transaction in eligible_transactions:
-                if transaction.merchant_id not in transactions_by_merchant:
-                    transactions_by_merchant[transaction.merchant_id] = []
-                transactions_by_merchant[transaction.merchant_id].append(transaction)
-            
-            # Cria liquidações para cada comerciante
-            for merchant_id, transactions in transactions_by_merchant.items():
-                try:
-                    settlement_data = SettlementCreate(
-                        merchant_id=merchant_id,
-                        transaction_refs=[t.external_event_id for t in transactions],
-                        settlement_date=date.today(),
-                        force_settlement=True
+                updated += result.rowcount
+        
+        if updated:
+            logger.info(f"Backfilled expected_settlement_date on {updated} transactions")
+        
+        return updated
+    
+    async def resume_interrupted_settlements(self) -> int:
+        """Conclui liquidações deixadas pela metade por uma execução interrompida
+        
+        Uma liquidação em BUILDING (queda ou cancelamento no meio dos lotes)
+        termina de vincular a sua coorte e é publicada; uma em PENDING (queda
+        antes da transferência) é processada. Liquidações em PROCESSING não
+        são retomadas: a transferência pode já ter sido feita no Asaas.
+        """
+        
+        async with get_async_read_db_session() as db:
+            stuck = (await db.execute(
+                select(SettlementDB.settlement_id, SettlementDB.merchant_id, SettlementDB.settlement_date, SettlementDB.status)
+                .where(SettlementDB.status.in_([SETTLEMENT_BUILDING, SettlementStatus.PENDING.value]))
+                .order_by(SettlementDB.created_at)
+            )).all()
+        
+        resumed = 0
+        for settlement_id, merchant_id, settlement_date, status in stuck:
+            try:
+                if await asyncio.shield(self._resume_settlement(settlement_id, merchant_id, settlement_date, status)):
+                    resumed += 1
+            
+            except Exception as e:
+                logger.error(f"Failed to resume settlement {settlement_id}: {e}")
+        
+        return resumed
+    
+    async def _resume_settlement(
+        self,
+        settlement_id: str,
+        merchant_id: str,
+        settlement_date: date,
+        status: Any
+    ) -> bool:
+        if getattr(status, "value", status) == SETTLEMENT_BUILDING:
+            settlement, _ = await self._settle_merchant(merchant_id, settlement_date, settlement_id)
+        else:
+            async with get_async_read_db_session() as db:
+                settlement = await self._db_to_response(db, await db.get(SettlementDB, settlement_id))
+        
+        if settlement is None:
+            return False
+        
+        logger.warning(f"Resuming interrupted settlement {settlement_id} for merchant {merchant_id}")
+        await self._process_settlement(settlement)
+        return True
+    
+    async def _settle_merchant(
+        self,
+        merchant_id: str,
+        settlement_date: date,
+        settlement_id: Optional[str] = None
+    ) -> Tuple[Optional[SettlementResponse], int]:
+        """Cria (ou retoma) a liquidação de uma coorte e vincula as transações em lotes
+        
+        A liquidação nasce em BUILDING e cada lote é vinculado com commit
+        próprio; só depois do último lote ela passa a PENDING, com os totais
+        finais, e entra nas leituras e no rollup. Se a execução cair no meio,
+        resume_interrupted_settlements retoma a mesma liquidação.
+        """
+        
+        batch_size = settings.SETTLEMENT_BATCH_SIZE
+        cohort = and_(
+            TransactionDB.status == TransactionStatus.APPROVED.value,
+            TransactionDB.settlement_id.is_(None),
+            TransactionDB.merchant_id == merchant_id,
+            TransactionDB.expected_settlement_date == settlement_date
+        )
+        
+        async with get_async_db_session() as db:
+            if settlement_id is None:
+                settlement_id = f"stl_{uuid.uuid4().hex[:12]}"
+                db.add(SettlementDB(
+                    settlement_id=settlement_id,
+                    merchant_id=merchant_id,
+                    gross_amount=0,
+                    fee_amount=0,
+                    net_amount=0,
+                    transaction_count=0,
+                    settlement_date=settlement_date,
+                    status=SETTLEMENT_BUILDING
+                ))
+                await db.commit()
+            
+            while True:
+                # Lote de transações elegíveis da coorte
+                chunk = (
+                    select(TransactionDB.transaction_id)
+                    .where(cohort)
+                    .limit(batch_size)
+                    .scalar_subquery()
+                )
+                
+                linked = (await db.execute(
+                    update(TransactionDB)
+                    .where(TransactionDB.transaction_id.in_(chunk))
+                    .values(
+                        settlement_id=settlement_id,
+                        status=TransactionStatus.SETTLED.value,
+                        updated_at=datetime.utcnow()
+                    )
+                    .returning(TransactionDB.gross_amount, TransactionDB.fee_amount, TransactionDB.net_amount)
+                    .execution_options(synchronize_session=False)
+                )).all()
+                
+                if linked:
+                    # Totais atualizados no mesmo commit do vínculo do lote
+                    await db.execute(
+                        update(SettlementDB)
+                        .where(SettlementDB.settlement_id == settlement_id)
+                        .values(
+                            gross_amount=SettlementDB.gross_amount + sum(row[0] for row in linked),
+                            fee_amount=SettlementDB.fee_amount + sum(row[1] for row in linked),
+                            net_amount=SettlementDB.net_amount + sum(row[2] for row in linked),
+                            transaction_count=SettlementDB.transaction_count + len(linked)
+                        )
                     )
-                    
-                    await self.create_settlement(settlement_data)
-                    logger.info(f"Auto settlement created for merchant {merchant_id} with {len(transactions)} transactions")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to create auto settlement for merchant {merchant_id}: {e}")
-    
-    def _db_to_response(self, db_settlement: SettlementDB) -> SettlementResponse:
+                    await db.commit()
+                
+                if len(linked) < batch_size:
+                    break
+            
+            db_settlement = await db.get(SettlementDB, settlement_id, populate_existing=True)
+            if db_settlement is None or db_settlement.status != SETTLEMENT_BUILDING:
+                # Outro processo concluiu esta liquidação
+                return None, 0
+            
+            if db_settlement.transaction_count == 0:
+                # Outro processo liquidou as transações antes deste
+                await db.delete(db_settlement)
+                await db.commit()
+                return None, 0
+            
+            # Publica a liquidação; o UPDATE condicional evita publicar duas vezes
+            published = await db.execute(
+                update(SettlementDB)
+                .where(and_(SettlementDB.settlement_id == settlement_id, SettlementDB.status == SETTLEMENT_BUILDING))
+                .values(status=SettlementStatus.PENDING.value)
+            )
+            if published.rowcount != 1:
+                await db.rollback()
+                return None, 0
+            
+            await self._update_rollup(
+                db, merchant_id, settlement_date,
+                old_status=None, new_status=SettlementStatus.PENDING.value, new_net=db_settlement.net_amount
+            )
+            await db.commit()
+            
+            db_settlement = await db.get(SettlementDB, settlement_id, populate_existing=True)
+            return await self._db_to_response(db, db_settlement), db_settlement.transaction_count
+    
+    async def get_merchant_summary(self, merchant_id: str) -> SettlementSummary:
+        """Resumo de liquidações do comerciante calculado no banco
+        
+        Com SETTLEMENT_ROLLUP_ENABLED lê a tabela materializada (custo constante);
+        caso contrário, ou se o comerciante ainda não tem rollup, usa uma única
+        query agregada.
+        """
+        
+        async with get_async_read_db_session() as db:
+            if not settings.SETTLEMENT_ROLLUP_ENABLED:
+                totals = await self._aggregate_summary(db, merchant_id)
+                return SettlementSummary(merchant_id=merchant_id, **totals)
+            
+            rollup = await db.get(MerchantSettlementRollupDB, merchant_id)
+        
+        # Só um rollup ausente precisa da conexão de escrita
+        if rollup is None:
+            async with get_async_db_session() as db:
+                rollup = await self._rebuild_rollup(db, merchant_id)
+                await db.commit()
+        
+        return SettlementSummary(
+            merchant_id=merchant_id,
+            pending_settlements=rollup.pending_count,
+            pending_amount=rollup.pending_amount,
+            completed_settlements=rollup.completed_count,
+            completed_amount=rollup.completed_amount,
+            total_settlements=rollup.total_count,
+            last_settlement_date=rollup.last_settlement_date
+        )
+    
+    async def _aggregate_summary(self, db, merchant_id: str) -> Dict[str, Any]:
+        """COUNT/SUM por status e MAX(settlement_date) em uma única query"""
+        
+        is_pending = SettlementDB.status == SettlementStatus.PENDING.value
+        is_completed = SettlementDB.status == SettlementStatus.COMPLETED.value
+        
+        row = (await db.execute(
+            select(
+                func.count(SettlementDB.settlement_id),
+                func.coalesce(func.sum(case((is_pending, 1), else_=0)), 0),
+                func.coalesce(func.sum(case((is_pending, SettlementDB.net_amount), else_=0)), 0),
+                func.coalesce(func.sum(case((is_completed, 1), else_=0)), 0),
+                func.coalesce(func.sum(case((is_completed, SettlementDB.net_amount), else_=0)), 0),
+                func.max(SettlementDB.settlement_date)
+            ).where(and_(SettlementDB.merchant_id == merchant_id, SettlementDB.status != SETTLEMENT_BUILDING))
+        )).one()
+        
+        return {
+            "total_settlements": row[0],
+            "pending_settlements": row[1],
+            "pending_amount": row[2],
+            "completed_settlements": row[3],
+            "completed_amount": row[4],
+            "last_settlement_date": row[5]
+        }
+    
+    async def _rebuild_rollup(self, db, merchant_id: str) -> MerchantSettlementRollupDB:
+        """Recalcula o rollup de um comerciante a partir da tabela de liquidações"""
+        
+        await db.flush()
+        totals = await self._aggregate_summary(db, merchant_id)
+        
+        rollup = await db.get(MerchantSettlementRollupDB, merchant_id)
+        if rollup is None:
+            rollup = MerchantSettlementRollupDB(merchant_id=merchant_id)
+            db.add(rollup)
+        
+        rollup.pending_count = totals["pending_settlements"]
+        rollup.pending_amount = totals["pending_amount"]
+        rollup.completed_count = totals["completed_settlements"]
+        rollup.completed_amount = totals["completed_amount"]
+        rollup.total_count = totals["total_settlements"]
+        rollup.last_settlement_date = totals["last_settlement_date"]
+        rollup.updated_at = datetime.utcnow()
+        
+        await db.flush()
+        return rollup
+    
+    async def rebuild_rollups(self, merchant_id: Optional[str] = None) -> int:
+        """Reconstrói os rollups (de um comerciante ou de todos) a partir das liquidações"""
+        
+        async with get_async_db_session() as db:
+            if merchant_id:
+                merchant_ids = [merchant_id]
+            else:
+                merchant_ids = (await db.execute(
+                    select(SettlementDB.merchant_id).distinct()
+                )).scalars().all()
+            
+            for current_id in merchant_ids:
+                await self._rebuild_rollup(db, current_id)
+                await db.commit()
+            
+            return len(merchant_ids)
+    
+    async def _update_rollup(
+        self,
+        db,
+        merchant_id: str,
+        settlement_date: Optional[date],
+        old_status: Optional[str],
+        new_status: Optional[str],
+        old_net: int = 0,
+        new_net: Optional[int] = None
+    ):
+        """Aplica ao rollup a mudança de uma liquidação (status e/ou valor líquido)
+        
+        old_status=None indica liquidação nova; new_status=None, removida. Deve
+        ser chamado na mesma transação da mudança, depois do flush.
+        """
+        
+        if not settings.SETTLEMENT_ROLLUP_ENABLED:
+            return
+        
+        if new_net is None:
+            new_net = old_net
+        
+        pending = SettlementStatus.PENDING.value
+        completed = SettlementStatus.COMPLETED.value
+        old_status = getattr(old_status, "value", old_status)
+        new_status = getattr(new_status, "value", new_status)
+        
+        values = {
+            "pending_count": MerchantSettlementRollupDB.pending_count
+                + (new_status == pending) - (old_status == pending),
+            "pending_amount": MerchantSettlementRollupDB.pending_amount
+                + (new_net if new_status == pending else 0) - (old_net if old_status == pending else 0),
+            "completed_count": MerchantSettlementRollupDB.completed_count
+                + (new_status == completed) - (old_status == completed),
+            "completed_amount": MerchantSettlementRollupDB.completed_amount
+                + (new_net if new_status == completed else 0) - (old_net if old_status == completed else 0),
+            "total_count": MerchantSettlementRollupDB.total_count
+                + (new_status is not None) - (old_status is not None),
+            "updated_at": datetime.utcnow()
+        }
+        if settlement_date is not None and new_status is not None:
+            values["last_settlement_date"] = case(
+                (
+                    MerchantSettlementRollupDB.last_settlement_date.is_(None)
+                    | (MerchantSettlementRollupDB.last_settlement_date < settlement_date),
+                    settlement_date
+                ),
+                else_=MerchantSettlementRollupDB.last_settlement_date
+            )
+        
+        result = await db.execute(
+            update(MerchantSettlementRollupDB)
+            .where(MerchantSettlementRollupDB.merchant_id == merchant_id)
+            .values(**values)
+        )
+        
+        if result.rowcount == 0 or new_status is None:
+            # Sem rollup ainda (ou remoção, que pode mudar o MAX da data):
+            # recalcula a partir das liquidações, que já incluem a mudança
+            await self._rebuild_rollup(db, merchant_id)
+    
+    @staticmethod
+    def _expected_date(transaction: TransactionDB) -> date:
+        """Data prevista da transação (calculada na hora para transações anteriores à agenda)"""
+        if transaction.expected_settlement_date is not None:
+            return transaction.expected_settlement_date
+        return settlement_calendar.expected_settlement_date(
+            transaction.captured_at or transaction.created_at, transaction.payment_method
+        )
+    
+    async def _fetch_transaction_refs(self, db, settlement_ids: List[str]) -> Dict[str, List[str]]:
+        """Busca as referências das transações de várias liquidações em uma única query"""
+        
+        refs: Dict[str, List[str]] = {settlement_id: [] for settlement_id in settlement_ids}
+        if not settlement_ids:
+            return refs
+        
+        rows = (await db.execute(
+            select(TransactionDB.settlement_id, TransactionDB.external_event_id).where(
+                TransactionDB.settlement_id.in_(settlement_ids)
+            )
+        )).all()
+        
+        for settlement_id, external_event_id in rows:
+            refs[settlement_id].append(external_event_id)
+        
+        return refs
+    
+    async def _db_to_response(self, db, db_settlement: SettlementDB) -> SettlementResponse:
         """Converte modelo do banco para modelo de resposta"""
         
-        with get_db_session() as db:
-            # Busca referências das transações
-            transaction_refs = db.query(TransactionDB.external_event_id).filter(
-                TransactionDB.settlement_id == db_settlement.settlement_id
-            ).all()
-            
-            return SettlementResponse(
-                settlement_id=db_settlement.settlement_id,
-                merchant_id=db_settlement.merchant_id,
-                gross_amount=db_settlement.gross_amount,
-                fee_amount=db_settlement.fee_amount,
-                net_amount=db_settlement.net_amount,
-                transaction_count=db_settlement.transaction_count,
-                transaction_refs=[ref[0] for ref in transaction_refs],
-                settlement_date=db_settlement.settlement_date,
-                status=SettlementStatus(db_settlement.status),
-                asaas_transfer_id=db_settlement.asaas_transfer_id,
-                processed_at=db_settlement.processed_at,
-                created_at=db_settlement.created_at,
-                updated_at=db_settlement.updated_at
-            )
\ No newline at end of file
+        refs = await self._fetch_transaction_refs(db, [db_settlement.settlement_id])
+        return self._build_response(db_settlement, refs[db_settlement.settlement_id])
+    
+    def _build_response(self, db_settlement: SettlementDB, transaction_refs: List[str]) -> SettlementResponse:
+        """Monta o modelo de resposta com as referências já carregadas"""
+        return SettlementResponse(
+            settlement_id=db_settlement.settlement_id,
+            merchant_id=db_settlement.merchant_id,
+            gross_amount=db_settlement.gross_amount,
+            fee_amount=db_settlement.fee_amount,
+            net_amount=db_settlement.net_amount,
+            transaction_count=db_settlement.transaction_count,
+            transaction_refs=transaction_refs,
+            settlement_date=db_settlement.settlement_date,
+            status=SettlementStatus(db_settlement.status),
+            asaas_transfer_id=db_settlement.asaas_transfer_id,
+            processed_at=db_settlement.processed_at,
+            created_at=db_settlement.created_at,
+            updated_at=db_settlement.updated_at
+        )
@@ -5,6 +5,7 @@ import uuid
 from datetime import datetime
 
 from app.database.models import TerminalDB, MerchantDB, TransactionDB, POSDeviceDB
+from app.database.pagination import keyset_filter, encode_cursor
 from app.models.terminal import (
     TerminalCreate, TerminalUpdate, TerminalResponse, TerminalListResponse,
     TerminalActivationRequest, TerminalActivationResponse, TerminalStats,
@@ -85,9 +86,17 @@ class TerminalService:
         filters: TerminalFilter,
         sort: TerminalSort = TerminalSort.CREATED_DESC,
         page: int = 1,
-        per_page: int = 20
+        per_page: int = 20,
+        cursor: Optional[str] = None,
+        include_total: bool = True
     ) -> TerminalListResponse:
-        """List terminals with filtering and pagination"""
+        """
+        List terminals with filtering and pagination
+        
+        With `cursor` (only for created_* sorts) the page is fetched by keyset on
+        (created_at, terminal_id) instead of OFFSET. `include_total=False` skips
+        the COUNT query.
+        """
         
         # Base query - only terminals belonging to reseller's merchants
         query = self.db.query(TerminalDB).join(MerchantDB).filter(
@@ -121,11 +130,23 @@ class TerminalService:
             else:
                 query = query.filter(~TerminalDB.terminal_id.in_(pos_devices_subquery))
         
+        # Get total count
+        total = query.count() if include_total else None
+        
+        # Keyset pagination
+        if cursor:
+            if sort not in (TerminalSort.CREATED_ASC, TerminalSort.CREATED_DESC):
+                raise ValueError("Cursor pagination is only supported for created_asc/created_desc sorting")
+            query = query.filter(keyset_filter(
+                TerminalDB.created_at, TerminalDB.terminal_id, cursor,
+                descending=sort == TerminalSort.CREATED_DESC
+            ))
+        
         # Apply sorting
         if sort == TerminalSort.CREATED_ASC:
-            query = query.order_by(asc(TerminalDB.created_at))
+            query = query.order_by(asc(TerminalDB.created_at), asc(TerminalDB.terminal_id))
         elif sort == TerminalSort.CREATED_DESC:
-            query = query.order_by(desc(TerminalDB.created_at))
+            query = query.order_by(desc(TerminalDB.created_at), desc(TerminalDB.terminal_id))
         elif sort == TerminalSort.UPDATED_ASC:
             query = query.order_by(asc(TerminalDB.updated_at))
         elif sort == TerminalSort.UPDATED_DESC:
@@ -139,12 +160,17 @@ class TerminalService:
         elif sort == TerminalSort.STATUS_DESC:
             query = query.order_by(desc(TerminalDB.status))
         
-        # Get total count
-        total = query.count()
+        # Apply pagination (one extra row tells whether there is a next page)
+        if not cursor:
+            query = query.offset((page - 1) * per_page)
+        terminals = query.limit(per_page + 1).all()
+        
+        has_next = len(terminals) > per_page
+        terminals = terminals[:per_page]
         
-        # Apply pagination
-        offset = (page - 1) * per_page
-        terminals = query.offset(offset).limit(per_page).all()
+        next_cursor = None
+        if has_next and sort in (TerminalSort.CREATED_ASC, TerminalSort.CREATED_DESC):
+            next_cursor = encode_cursor(terminals[-1].created_at, terminals[-1].terminal_id)
         
         # Convert to responses
         terminal_responses = [
@@ -157,8 +183,9 @@ class TerminalService:
             total=total,
             page=page,
             per_page=per_page,
-            has_next=offset + per_page < total,
-            has_prev=page > 1
+            has_next=has_next,
+            has_prev=page > 1 or cursor is not None,
+            next_cursor=next_cursor
         )
     
     def update_terminal(self, terminal_id: str, update_data: TerminalUpdate, reseller_id: str) -> Optional[TerminalResponse]:
@@ -1,56 +1,49 @@
 import logging
-from typing import Optional, List
-from datetime import datetime
-from sqlalchemy.orm import Session
+import random
+from typing import Any, Dict, Optional, List, Tuple
+from datetime import date, datetime
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
 
-from config.settings import settings
-from app.database.connection import get_db_session
+from app.database.connection import get_async_db_session, get_async_read_db_session
 from app.database.models import TransactionDB, MerchantDB
-from app.models.transaction import TransactionCreate, TransactionResponse
+from app.database.pagination import keyset_filter, next_cursor
+from app.models.transaction import TransactionCreate, TransactionResponse, BulkItemStatus
 from app.models.common import TransactionStatus, PaymentMethod
+from .change_feed import ChangeFeed
+from .fee_engine import CompiledFeeSchedule, fee_engine
+from .settlement_calendar import settlement_calendar
 from .webhook_sender import WebhookSender
 
 logger = logging.getLogger(__name__)
 
+# INSERT com ON CONFLICT DO NOTHING ... RETURNING, por dialeto
+CONFLICT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
 class TransactionProcessor:
     """Processador de transações do simulador Cappta"""
     
     def __init__(self):
         self.webhook_sender = WebhookSender()
     
-    def calculate_fees(self, gross_amount: int, payment_method: PaymentMethod, installments: int = 1) -> int:
-        """Calcula taxas baseado no valor e método de pagamento"""
-        
-        # Taxa percentual baseada no método de pagamento
-        if payment_method == PaymentMethod.DEBIT:
-            percentage_fee = 2.0  # 2% para débito
-        elif payment_method == PaymentMethod.CREDIT:
-            if installments == 1:
-                percentage_fee = settings.DEFAULT_FEE_PERCENTAGE  # 3% para crédito à vista
-            else:
-                percentage_fee = settings.DEFAULT_FEE_PERCENTAGE + (installments * 0.5)  # +0.5% por parcela
-        elif payment_method == PaymentMethod.PIX:
-            percentage_fee = 1.0  # 1% para PIX
-        else:
-            percentage_fee = settings.DEFAULT_FEE_PERCENTAGE
-        
-        # Calcula taxa percentual
-        percentage_amount = int(gross_amount * (percentage_fee / 100))
+    def calculate_fees(
+        self,
+        gross_amount: int,
+        payment_method: PaymentMethod,
+        installments: int = 1,
+        schedule: Optional[CompiledFeeSchedule] = None
+    ) -> int:
+        """Calcula taxas pela tabela do plano (ou pela tabela padrão do settings)"""
         
-        # Adiciona taxa fixa
-        total_fee = percentage_amount + settings.DEFAULT_FEE_FIXED
-        
-        # Garante que a taxa não seja maior que o valor da transação
-        return min(total_fee, gross_amount - 1)
+        schedule = schedule or fee_engine.default_schedule()
+        return schedule.calculate(gross_amount, payment_method, installments)
     
     async def create_transaction(self, transaction_data: TransactionCreate) -> TransactionResponse:
         """Cria uma nova transação"""
         
-        with get_db_session() as db:
+        async with get_async_db_session() as db:
             # Verifica se o comerciante existe
-            merchant = db.query(MerchantDB).filter(
-                MerchantDB.merchant_id == transaction_data.merchant_id
-            ).first()
+            merchant = await db.get(MerchantDB, transaction_data.merchant_id)
             
             if not merchant:
                 raise ValueError(f"Merchant {transaction_data.merchant_id} not found")
@@ -59,24 +52,27 @@ class TransactionProcessor:
                 raise ValueError(f"Merchant {transaction_data.merchant_id} is not active")
             
             # Verifica se já existe transação com mesmo external_event_id (idempotência)
-            existing = db.query(TransactionDB).filter(
-                TransactionDB.external_event_id == transaction_data.external_event_id
-            ).first()
+            existing = (await db.execute(
+                select(TransactionDB).where(
+                    TransactionDB.external_event_id == transaction_data.external_event_id
+                )
+            )).scalars().first()
             
             if existing:
                 logger.info(f"Transaction {existing.transaction_id} already exists for event {transaction_data.external_event_id}")
                 return self._db_to_response(existing)
             
-            # Calcula taxas
+            # Calcula taxas pela tabela do plano do comerciante
+            schedule = await fee_engine.get_schedule_async(db, merchant.plan_id)
             fee_amount = self.calculate_fees(
                 transaction_data.gross_amount,
                 transaction_data.payment_method,
-                transaction_data.installments
+                transaction_data.installments,
+                schedule
             )
             net_amount = transaction_data.gross_amount - fee_amount
             
             # Simula aprovação/recusa (95% de aprovação)
-            import random
             is_approved = random.random() < 0.95
             status = TransactionStatus.APPROVED if is_approved else TransactionStatus.DECLINED
             
@@ -95,30 +91,219 @@ class TransactionProcessor:
                 installments=transaction_data.installments,
                 status=status.value,
                 captured_at=transaction_data.captured_at,
+                expected_settlement_date=self._expected_settlement_date(
+                    status, transaction_data.captured_at, transaction_data.payment_method
+                ),
                 external_event_id=transaction_data.external_event_id
             )
             
             db.add(db_transaction)
-            db.commit()
-            db.refresh(db_transaction)
+            await db.flush()
             
             response = self._db_to_response(db_transaction)
             
-            # Envia webhook se aprovada
+            # Enfileira webhook se aprovada (mesmo commit da transação)
             if is_approved:
-                await self._send_transaction_webhook(response)
+                await self._send_transaction_webhook(response, db)
+            
+            await db.commit()
             
             logger.info(f"Transaction {response.transaction_id} created with status {response.status}")
             
             return response
     
+    async def create_transactions_bulk(self, items: List[Tuple[int, TransactionCreate]]) -> List[Dict[str, Any]]:
+        """Cria um lote de transações em um único commit
+        
+        `items` são pares (posição na requisição, transação). Os comerciantes
+        são validados com uma única consulta IN e a idempotência fica com o
+        INSERT ... ON CONFLICT DO NOTHING: transações cujo external_event_id já
+        existe voltam como "duplicate" com os dados da original. Os webhooks das
+        aprovadas são enfileirados em lote no mesmo commit.
+        
+        Retorna um resultado por item, na ordem recebida.
+        """
+        
+        results: Dict[int, Dict[str, Any]] = {}
+        
+        # Repetições do mesmo external_event_id dentro do lote viram duplicatas
+        # da primeira ocorrência
+        first_by_event: Dict[str, int] = {}
+        repeated: List[Tuple[int, str]] = []
+        unique_items = []
+        for index, data in items:
+            if data.external_event_id in first_by_event:
+                repeated.append((index, data.external_event_id))
+            else:
+                first_by_event[data.external_event_id] = index
+                unique_items.append((index, data))
+        
+        # Consultas de leitura antes de abrir a sessão de escrita
+        async with get_async_read_db_session() as db:
+            merchant_ids = {data.merchant_id for _, data in unique_items}
+            merchants = {
+                row.merchant_id: row
+                for row in (await db.execute(
+                    select(MerchantDB.merchant_id, MerchantDB.is_active, MerchantDB.plan_id).where(
+                        MerchantDB.merchant_id.in_(merchant_ids)
+                    )
+                )).all()
+            }
+            
+            schedules = {}
+            for merchant in merchants.values():
+                if merchant.plan_id not in schedules:
+                    schedules[merchant.plan_id] = await fee_engine.get_schedule_async(db, merchant.plan_id)
+        
+        now = datetime.utcnow()
+        rows = []
+        for index, data in unique_items:
+            merchant = merchants.get(data.merchant_id)
+            if not merchant or not merchant.is_active:
+                results[index] = self.bulk_item_result(
+                    index, BulkItemStatus.ERROR, data.external_event_id,
+                    error=f"Merchant {data.merchant_id} {'is not active' if merchant else 'not found'}"
+                )
+                continue
+            
+            try:
+                fee_amount = self.calculate_fees(
+                    data.gross_amount, data.payment_method, data.installments, schedules[merchant.plan_id]
+                )
+            except ValueError as e:
+                # Parcelas acima do limite do plano
+                results[index] = self.bulk_item_result(index, BulkItemStatus.ERROR, data.external_event_id, error=str(e))
+                continue
+            
+            # Mesma simulação de aprovação/recusa do fluxo unitário (95%)
+            status = TransactionStatus.APPROVED if random.random() < 0.95 else TransactionStatus.DECLINED
+            
+            rows.append({
+                "transaction_id": data.transaction_id,
+                "merchant_id": data.merchant_id,
+                "terminal_id": data.terminal_id,
+                "nsu": data.nsu,
+                "authorization_code": data.authorization_code,
+                "external_event_id": data.external_event_id,
+                "payment_method": data.payment_method.value,
+                "card_brand": data.card_brand.value if data.card_brand else None,
+                "installments": data.installments,
+                "gross_amount": data.gross_amount,
+                "fee_amount": fee_amount,
+                "net_amount": data.gross_amount - fee_amount,
+                "status": status.value,
+                "captured_at": data.captured_at,
+                "expected_settlement_date": self._expected_settlement_date(status, data.captured_at, data.payment_method),
+                "created_at": now
+            })
+        
+        async with get_async_db_session() as db:
+            inserted = set()
+            if rows:
+                # Sem alvo no ON CONFLICT: colisões de transaction_id ou NSU também
+                # descartam só o item, em vez de abortar o lote inteiro
+                dialect = db.get_bind().dialect.name
+                if dialect not in CONFLICT_INSERTS:
+                    raise ValueError(f"Bulk ingest is not supported on {dialect}")
+                statement = CONFLICT_INSERTS[dialect](TransactionDB.__table__).on_conflict_do_nothing().returning(
+                    TransactionDB.__table__.c.external_event_id
+                )
+                await ChangeFeed.assign_change_seqs(db, rows)
+                inserted = set((await db.execute(statement, rows)).scalars().all())
+            
+            created = [row for row in rows if row["external_event_id"] in inserted]
+            approved = [row for row in created if row["status"] == TransactionStatus.APPROVED.value]
+            await self.webhook_sender.enqueue_outbox_rows(
+                db, self.webhook_sender.build_transaction_outbox_rows(approved)
+            )
+            
+            # Dados das transações já existentes, para responder as duplicatas
+            conflicted = {row["external_event_id"] for row in rows if row["external_event_id"] not in inserted}
+            conflicted.update(event_id for _, event_id in repeated)
+            existing = {}
+            if conflicted:
+                existing = {
+                    row.external_event_id: row
+                    for row in (await db.execute(
+                        select(
+                            TransactionDB.transaction_id,
+                            TransactionDB.external_event_id,
+                            TransactionDB.status,
+                            TransactionDB.fee_amount,
+                            TransactionDB.net_amount
+                        ).where(TransactionDB.external_event_id.in_(conflicted))
+                    )).all()
+                }
+        
+        for row in rows:
+            index = first_by_event[row["external_event_id"]]
+            if row["external_event_id"] in inserted:
+                results[index] = self.bulk_item_result(
+                    index, BulkItemStatus.CREATED, row["external_event_id"],
+                    transaction_id=row["transaction_id"],
+                    status=row["status"],
+                    fee_amount=row["fee_amount"],
+                    net_amount=row["net_amount"]
+                )
+            else:
+                results[index] = self._duplicate_result(index, row["external_event_id"], existing)
+        
+        for index, event_id in repeated:
+            first = results[first_by_event[event_id]]
+            if first["result"] == BulkItemStatus.ERROR.value and event_id not in existing:
+                results[index] = {**first, "index": index}
+            else:
+                results[index] = self._duplicate_result(index, event_id, existing)
+        
+        logger.info(f"Bulk transactions: {len(items)} items, {len(created)} created, {len(approved)} webhooks enqueued")
+        
+        return [results[index] for index, _ in items]
+    
+    def _duplicate_result(self, index: int, external_event_id: str, existing: Dict[str, Any]) -> Dict[str, Any]:
+        """Resultado de um item cujo external_event_id já estava gravado"""
+        original = existing.get(external_event_id)
+        if original is None:
+            return self.bulk_item_result(
+                index, BulkItemStatus.ERROR, external_event_id,
+                error="Conflicts with an existing transaction_id or nsu"
+            )
+        
+        return self.bulk_item_result(
+            index, BulkItemStatus.DUPLICATE, external_event_id,
+            transaction_id=original.transaction_id,
+            status=original.status.value,
+            fee_amount=original.fee_amount,
+            net_amount=original.net_amount
+        )
+    
+    @staticmethod
+    def bulk_item_result(
+        index: int,
+        result: BulkItemStatus,
+        external_event_id: Optional[str],
+        transaction_id: Optional[str] = None,
+        status: Optional[str] = None,
+        fee_amount: Optional[int] = None,
+        net_amount: Optional[int] = None,
+        error: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Resultado de um item do lote (formato de BulkTransactionResult)"""
+        return {
+            "index": index,
+            "result": result.value,
+            "external_event_id": external_event_id,
+            "transaction_id": transaction_id,
+            "status": status,
+            "fee_amount": fee_amount,
+            "net_amount": net_amount,
+            "error": error
+        }
+    
     async def get_transaction(self, transaction_id: str) -> Optional[TransactionResponse]:
         """Busca transação por ID"""
         
-        with get_db_session() as db:
-            transaction = db.query(TransactionDB).filter(
-                TransactionDB.transaction_id == transaction_id
-            ).first()
+        async with get_async_read_db_session() as db:
+            transaction = await db.get(TransactionDB, transaction_id)
             
             if not transaction:
                 return None
@@ -130,24 +315,36 @@ class TransactionProcessor:
         merchant_id: Optional[str] = None,
         status: Optional[TransactionStatus] = None,
         page: int = 1,
-        per_page: int = 20
-    ) -> List[TransactionResponse]:
-        """Lista transações com filtros"""
+        per_page: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[TransactionResponse], Optional[str]]:
+        """Lista transações com filtros; retorna a página e o cursor da próxima
         
-        with get_db_session() as db:
-            query = db.query(TransactionDB)
+        Com `cursor` a página é buscada por keyset em (created_at, transaction_id),
+        com custo constante independentemente da profundidade; `page` é ignorado.
+        """
+        
+        async with get_async_read_db_session() as db:
+            query = select(TransactionDB)
             
             if merchant_id:
-                query = query.filter(TransactionDB.merchant_id == merchant_id)
+                query = query.where(TransactionDB.merchant_id == merchant_id)
             
             if status:
-                query = query.filter(TransactionDB.status == status.value)
+                query = query.where(TransactionDB.status == status.value)
             
             # Paginação
-            offset = (page - 1) * per_page
-            transactions = query.order_by(TransactionDB.created_at.desc()).offset(offset).limit(per_page).all()
+            if cursor:
+                query = query.where(keyset_filter(TransactionDB.created_at, TransactionDB.transaction_id, cursor))
+            else:
+                query = query.offset((page - 1) * per_page)
             
-            return [self._db_to_response(t) for t in transactions]
+            # Uma linha extra indica se existe próxima página
+            query = query.order_by(TransactionDB.created_at.desc(), TransactionDB.transaction_id.desc()).limit(per_page + 1)
+            transactions = (await db.execute(query)).scalars().all()
+            
+            cursor_out = next_cursor(transactions, per_page, "created_at", "transaction_id")
+            return [self._db_to_response(t) for t in transactions[:per_page]], cursor_out
     
     async def update_transaction_status(
         self, 
@@ -157,10 +354,8 @@ class TransactionProcessor:
     ) -> Optional[TransactionResponse]:
         """Atualiza status de uma transação"""
         
-        with get_db_session() as db:
-            transaction = db.query(TransactionDB).filter(
-                TransactionDB.transaction_id == transaction_id
-            ).first()
+        async with get_async_db_session() as db:
+            transaction = await db.get(TransactionDB, transaction_id)
             
             if not transaction:
                 return None
@@ -169,19 +364,37 @@ class TransactionProcessor:
             transaction.status = new_status.value
             transaction.updated_at = datetime.utcnow()
             
-            db.commit()
-            db.refresh(transaction)
+            # Aprovada depois da captura (ex.: pendente -> aprovada): entra na agenda agora
+            if new_status == TransactionStatus.APPROVED and transaction.expected_settlement_date is None:
+                transaction.expected_settlement_date = self._expected_settlement_date(
+                    new_status, transaction.captured_at or transaction.created_at, transaction.payment_method
+                )
+            
+            await db.flush()
             
             response = self._db_to_response(transaction)
             
-            # Envia webhook para mudanças de status relevantes
+            # Enfileira webhook para mudanças de status relevantes
             if old_status != new_status.value and new_status in [TransactionStatus.APPROVED, TransactionStatus.DECLINED, TransactionStatus.CANCELLED]:
-                await self._send_transaction_webhook(response)
+                await self._send_transaction_webhook(response, db)
+            
+            await db.commit()
             
             logger.info(f"Transaction {transaction_id} status updated from {old_status} to {new_status}")
             
             return response
     
+    @staticmethod
+    def _expected_settlement_date(
+        status: TransactionStatus,
+        captured_at: Optional[datetime],
+        payment_method: PaymentMethod
+    ) -> Optional[date]:
+        """Data prevista de liquidação (só transações aprovadas entram na agenda)"""
+        if status != TransactionStatus.APPROVED:
+            return None
+        return settlement_calendar.expected_settlement_date(captured_at or datetime.utcnow(), payment_method)
+    
     def _db_to_response(self, db_transaction: TransactionDB) -> TransactionResponse:
         """Converte modelo do banco para modelo de resposta"""
         return TransactionResponse(
@@ -198,15 +411,16 @@ class TransactionProcessor:
             installments=db_transaction.installments,
             status=TransactionStatus(db_transaction.status),
             captured_at=db_transaction.captured_at,
+            expected_settlement_date=db_transaction.expected_settlement_date,
             external_event_id=db_transaction.external_event_id,
             created_at=db_transaction.created_at,
             updated_at=db_transaction.updated_at
         )
     
-    async def _send_transaction_webhook(self, transaction: TransactionResponse):
-        """Envia webhook de transação para o Tricket"""
+    async def _send_transaction_webhook(self, transaction: TransactionResponse, db=None):
+        """Enfileira webhook de transação para o Tricket"""
         try:
-            await self.webhook_sender.send_transaction_webhook(transaction)
+            await self.webhook_sender.send_transaction_webhook(transaction, db=db)
         except Exception as e:
             logger.error(f"Failed to send transaction webhook for {transaction.transaction_id}: {e}")
             # Não falha a transação por causa do webhook
\ No newline at end of file
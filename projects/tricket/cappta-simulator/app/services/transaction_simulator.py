@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from sqlalchemy import select
+
+from config.settings import settings
+from app.database.connection import get_async_db_session, get_async_read_db_session
+from app.database.models import MerchantDB, TerminalDB, TransactionDB, TerminalStatus
+from app.models.common import PaymentMethod, TransactionStatus
+from app.models.transaction import TransactionSimulationRequest
+from .change_feed import ChangeFeed
+from .fee_engine import CompiledFeeSchedule, fee_engine
+from .settlement_calendar import settlement_calendar
+from .webhook_sender import WebhookSender
+
+logger = logging.getLogger(__name__)
+
+
+class SimulationPlan:
+    """Estado de uma simulação: distribuições já acumuladas e terminais reais"""
+    
+    def __init__(
+        self,
+        config: TransactionSimulationRequest,
+        terminals: List[Tuple[str, str]],
+        schedules: Dict[str, CompiledFeeSchedule]
+    ):
+        self.simulation_id = uuid.uuid4().hex[:8]
+        self.count = config.count
+        self.chunk_size = config.chunk_size or settings.SIMULATION_CHUNK_SIZE
+        self.approval_rate = config.approval_rate
+        self.send_webhooks = config.send_webhooks
+        self.rng = random.Random(config.seed)
+        
+        # (terminal_id, merchant_id) e a tabela de taxas de cada comerciante
+        self.terminals = terminals
+        self.schedules = schedules
+        
+        # random.choices com cum_weights evita reacumular os pesos a cada sorteio
+        self.methods, self.method_weights = self._cumulative(
+            {method.value: weight for method, weight in config.method_mix.items()}
+        )
+        self.installments, self.installment_weights = self._cumulative(config.installment_mix)
+        self.card_brands, self.card_brand_weights = self._cumulative(
+            {brand.value: weight for brand, weight in config.card_brand_mix.items()}
+        )
+        self.buckets, self.bucket_weights = self._cumulative({
+            (bucket.min_amount, bucket.max_amount): bucket.weight for bucket in config.amount_histogram
+        })
+        
+        captured_to = config.captured_to or datetime.utcnow()
+        self.captured_from = config.captured_from or captured_to - timedelta(days=1)
+        self.window_seconds = (captured_to - self.captured_from).total_seconds()
+    
+    @staticmethod
+    def _cumulative(mix: Dict[Any, float]) -> Tuple[List[Any], List[float]]:
+        population = [key for key, weight in mix.items() if weight > 0]
+        return population, list(accumulate(mix[key] for key in population))
+
+
+class TransactionSimulator:
+    """Gerador de transações em massa para testes de carga do Tricket
+    
+    As transações são sorteadas a partir das distribuições da requisição
+    (mix de métodos, parcelas e bandeiras, histograma de valores e taxa de
+    aprovação) sobre terminais reais, com as taxas do plano de cada
+    comerciante. Cada lote é gravado com um INSERT executemany e os webhooks
+    das aprovadas vão para a outbox no mesmo commit; a entrega fica com o
+    WebhookDispatcher.
+    """
+    
+    def __init__(self):
+        self.webhook_sender = WebhookSender()
+    
+    async def prepare(self, config: TransactionSimulationRequest) -> SimulationPlan:
+        """Valida a configuração e carrega terminais e tabelas de taxas
+        
+        Levanta ValueError antes de qualquer escrita, para que a API possa
+        responder 400 antes de começar o streaming.
+        """
+        
+        if config.count > settings.SIMULATION_MAX_TRANSACTIONS:
+            raise ValueError(f"A simulation cannot exceed {settings.SIMULATION_MAX_TRANSACTIONS} transactions")
+        
+        for bucket in config.amount_histogram:
+            if bucket.min_amount < settings.MIN_TRANSACTION_AMOUNT or bucket.max_amount > settings.MAX_TRANSACTION_AMOUNT:
+                raise ValueError(
+                    f"Amount buckets must be within {settings.MIN_TRANSACTION_AMOUNT} "
+                    f"and {settings.MAX_TRANSACTION_AMOUNT} cents"
+                )
+        
+        async with get_async_read_db_session() as db:
+            query = select(TerminalDB.terminal_id, TerminalDB.merchant_id, MerchantDB.plan_id).join(
+                MerchantDB, MerchantDB.merchant_id == TerminalDB.merchant_id
+            ).where(
+                MerchantDB.is_active == True,
+                TerminalDB.status == TerminalStatus.ACTIVE
+            )
+            if config.merchant_ids:
+                query = query.where(TerminalDB.merchant_id.in_(config.merchant_ids))
+            
+            rows = (await db.execute(query)).all()
+            if not rows:
+                raise ValueError("No active terminals found for the selected merchants")
+            
+            plan_schedules = {}
+            schedules = {}
+            for _, merchant_id, plan_id in rows:
+                if plan_id not in plan_schedules:
+                    plan_schedules[plan_id] = await fee_engine.get_schedule_async(db, plan_id)
+                schedules[merchant_id] = plan_schedules[plan_id]
+        
+        return SimulationPlan(config, [(terminal_id, merchant_id) for terminal_id, merchant_id, _ in rows], schedules)
+    
+    def generate_chunk(self, plan: SimulationPlan, start: int, size: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Gera um lote de transações e as linhas de outbox das aprovadas
+        
+        Só CPU: roda numa thread para não travar o event loop.
+        """
+        
+        rng = plan.rng
+        terminals = rng.choices(plan.terminals, k=size)
+        methods = rng.choices(plan.methods, cum_weights=plan.method_weights, k=size)
+        installments = rng.choices(plan.installments, cum_weights=plan.installment_weights, k=size)
+        brands = rng.choices(plan.card_brands, cum_weights=plan.card_brand_weights, k=size)
+        buckets = rng.choices(plan.buckets, cum_weights=plan.bucket_weights, k=size)
+        
+        credit = PaymentMethod.CREDIT.value
+        pix = PaymentMethod.PIX.value
+        randint = rng.randint
+        uniform = rng.random
+        
+        amounts = [randint(low, high) for low, high in buckets]
+        installments = [count if method == credit else 1 for method, count in zip(methods, installments)]
+        
+        # Taxas: um calculate_many por tabela de taxas presente no lote
+        fees = [0] * size
+        by_schedule = defaultdict(list)
+        for i, (_, merchant_id) in enumerate(terminals):
+            by_schedule[plan.schedules[merchant_id]].append(i)
+        for schedule, indexes in by_schedule.items():
+            # O mix de parcelas é global; cada plano aceita só até o seu limite
+            for i in indexes:
+                if installments[i] > schedule.max_installments:
+                    installments[i] = schedule.max_installments
+            chunk_fees = schedule.calculate_many(
+                [amounts[i] for i in indexes],
+                [methods[i] for i in indexes],
+                [installments[i] for i in indexes]
+            )
+            for i, fee in zip(indexes, chunk_fees):
+                fees[i] = fee
+        
+        now = datetime.utcnow()
+        approved = TransactionStatus.APPROVED.value
+        declined = TransactionStatus.DECLINED.value
+        prefix = plan.simulation_id
+        expected_date = settlement_calendar.expected_settlement_date
+        
+        transactions = []
+        for i in range(size):
+            seq = start + i
+            terminal_id, merchant_id = terminals[i]
+            is_approved = uniform() < plan.approval_rate
+            captured_at = plan.captured_from + timedelta(seconds=uniform() * plan.window_seconds)
+            transactions.append({
+                "transaction_id": f"txn_sim_{prefix}_{seq}",
+                "merchant_id": merchant_id,
+                "terminal_id": terminal_id,
+                "nsu": f"{prefix}{seq:012d}",
+                "authorization_code": f"{rng.getrandbits(32):08X}",
+                "external_event_id": f"evt_sim_{prefix}_{seq}",
+                "payment_method": methods[i],
+                "card_brand": None if methods[i] == pix else brands[i],
+                "installments": installments[i],
+                "gross_amount": amounts[i],
+                "fee_amount": fees[i],
+                "net_amount": amounts[i] - fees[i],
+                "status": approved if is_approved else declined,
+                "is_captured": is_approved,
+                "authorized_at": captured_at if is_approved else None,
+                "captured_at": captured_at,
+                "expected_settlement_date": expected_date(captured_at, methods[i]) if is_approved else None,
+                "created_at": now
+            })
+        
+        outbox_rows = []
+        if plan.send_webhooks:
+            outbox_rows = self.webhook_sender.build_transaction_outbox_rows(
+                [transaction for transaction in transactions if transaction["status"] == approved]
+            )
+        
+        return transactions, outbox_rows
+    
+    async def run(self, plan: SimulationPlan) -> AsyncIterator[Dict[str, Any]]:
+        """Executa a simulação, emitindo o progresso a cada lote gravado
+        
+        Cada lote é um commit próprio: se o cliente desconectar, os lotes já
+        gravados permanecem e a geração para no lote seguinte.
+        """
+        
+        started = time.perf_counter()
+        inserted = approved = webhooks = 0
+        
+        logger.info(f"Simulation {plan.simulation_id} started: {plan.count} transactions in chunks of {plan.chunk_size}")
+        
+        for start in range(0, plan.count, plan.chunk_size):
+            size = min(plan.chunk_size, plan.count - start)
+            transactions, outbox_rows = await asyncio.to_thread(self.generate_chunk, plan, start, size)
+            
+            # A sessão de escrita fica aberta só durante os INSERTs do lote
+            async with get_async_db_session() as db:
+                await ChangeFeed.assign_change_seqs(db, transactions)
+                await db.execute(TransactionDB.__table__.insert(), transactions)
+                webhooks += await self.webhook_sender.enqueue_outbox_rows(db, outbox_rows)
+            
+            inserted += size
+            approved += sum(1 for transaction in transactions if transaction["is_captured"])
+            elapsed = time.perf_counter() - started
+            
+            yield self._progress(plan, inserted, approved, webhooks, elapsed, done=inserted >= plan.count)
+        
+        logger.info(
+            f"Simulation {plan.simulation_id} finished: {inserted} transactions, "
+            f"{webhooks} webhooks in {time.perf_counter() - started:.1f}s"
+        )
+    
+    @staticmethod
+    def _progress(
+        plan: SimulationPlan,
+        inserted: int,
+        approved: int,
+        webhooks: int,
+        elapsed: float,
+        done: bool
+    ) -> Dict[str, Any]:
+        return {
+            "simulation_id": plan.simulation_id,
+            "total": plan.count,
+            "inserted": inserted,
+            "approved": approved,
+            "declined": inserted - approved,
+            "webhooks_enqueued": webhooks,
+            "elapsed_ms": int(elapsed * 1000),
+            "rate_per_sec": int(inserted / elapsed) if elapsed > 0 else None,
+            "done": done
+        }
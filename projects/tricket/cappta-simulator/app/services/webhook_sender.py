@@ -1,22 +1,32 @@
 import httpx
+import asyncio
 import hashlib
 import hmac
-import json
 import logging
-from typing import Dict, Any
-from datetime import datetime
-from sqlalchemy.orm import Session
+import random
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, and_, func, event
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config.settings import settings
-from app.database.connection import get_db_session
+from config.serialization import dumps_str
+from app.database.connection import get_async_db_session, get_async_read_db_session
 from app.database.models import WebhookLogDB
 from app.models.transaction import TransactionResponse
 from app.models.settlement import SettlementResponse
+from .http_client import http_client_pool
 
 logger = logging.getLogger(__name__)
 
 class WebhookSender:
-    """Classe responsável por enviar webhooks para o sistema Tricket"""
+    """Classe responsável por enviar webhooks para o sistema Tricket
+    
+    Os webhooks não são mais enviados inline: cada evento é gravado na tabela
+    webhook_logs (outbox) e entregue em background pelo WebhookDispatcher.
+    """
     
     def __init__(self):
         self.webhook_url = settings.TRICKET_WEBHOOK_URL
@@ -24,6 +34,8 @@ class WebhookSender:
         self.timeout = settings.WEBHOOK_TIMEOUT
         self.retry_attempts = settings.WEBHOOK_RETRY_ATTEMPTS
         self.retry_delay = settings.WEBHOOK_RETRY_DELAY
+        self.batch_enabled = settings.WEBHOOK_BATCH_ENABLED
+        self.batch_window = settings.WEBHOOK_BATCH_WINDOW_MS / 1000
     
     def _generate_signature(self, payload: str) -> str:
         """Gera assinatura HMAC-SHA256 para o webhook"""
@@ -33,118 +45,233 @@ class WebhookSender:
             hashlib.sha256
         ).hexdigest()
     
+    def _due_at(self) -> datetime:
+        """Quando um evento novo fica disponível para entrega"""
+        
+        # Em modo batch o evento aguarda a janela para ser agrupado com outros
+        # eventos do mesmo comerciante
+        due_at = datetime.utcnow()
+        if self.batch_enabled:
+            due_at += timedelta(seconds=self.batch_window)
+        return due_at
+    
+    def _outbox_row(
+        self,
+        event_type: str,
+        payload: Dict[str, Any],
+        merchant_id: str,
+        transaction_id: str = None,
+        settlement_id: str = None,
+        due_at: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Colunas de um evento na outbox (webhook_logs), prontas para INSERT"""
+        
+        payload_str = dumps_str(payload)
+        
+        return {
+            "event_type": event_type,
+            "event_id": f"whk_{uuid.uuid4().hex}",
+            "merchant_id": merchant_id,
+            "transaction_id": transaction_id,
+            "settlement_id": settlement_id,
+            "webhook_url": self.webhook_url,
+            "payload": payload_str,
+            "signature": self._generate_signature(payload_str),
+            "attempt_count": 0,
+            "max_attempts": self.retry_attempts,
+            "next_retry_at": due_at or self._due_at(),
+            "success": False,
+            "is_final": False
+        }
+    
     async def _send_webhook(
-        self, 
+        self,
         event_type: str,
         payload: Dict[str, Any],
         merchant_id: str,
         transaction_id: str = None,
-        settlement_id: str = None
+        settlement_id: str = None,
+        db: Optional[AsyncSession] = None
     ) -> bool:
-        """Envia webhook com retry automático"""
+        """Enfileira webhook na outbox para entrega em background
+        
+        Se `db` for informado, o evento é gravado na mesma sessão (e commit)
+        da operação de negócio; caso contrário abre uma sessão própria.
+        """
+        
+        webhook_log = WebhookLogDB(**self._outbox_row(
+            event_type, payload, merchant_id,
+            transaction_id=transaction_id,
+            settlement_id=settlement_id
+        ))
+        
+        try:
+            if db is not None:
+                db.add(webhook_log)
+                # Acorda o dispatcher só depois que o evento estiver visível
+                event.listen(db.sync_session, "after_commit", lambda _: webhook_dispatcher.notify(), once=True)
+                return True
+            
+            async with get_async_db_session() as session:
+                session.add(webhook_log)
+        except Exception as e:
+            logger.error(f"Failed to enqueue webhook {event_type}: {e}")
+            return False
+        
+        webhook_dispatcher.notify()
+        return True
+    
+    async def deliver(self, webhook_logs: List[WebhookLogDB]) -> Dict[str, Any]:
+        """Faz uma única tentativa de entrega de um ou mais webhooks da outbox
         
-        payload_str = json.dumps(payload, default=str, separators=(',', ':'))
-        signature = self._generate_signature(payload_str)
+        Vários eventos (mesmo comerciante e URL) são enviados como um único
+        array JSON assinado; um evento isolado mantém o payload original.
+        """
+        
+        first = webhook_logs[0]
+        
+        if len(webhook_logs) == 1:
+            payload = first.payload
+            signature = first.signature
+            event_type = first.event_type
+            delivery_id = first.event_id or str(first.id)
+        else:
+            payload = "[" + ",".join(log.payload for log in webhook_logs) + "]"
+            signature = self._generate_signature(payload)
+            event_type = "batch"
+            delivery_id = f"batch_{first.event_id or first.id}"
         
         headers = {
             "Content-Type": "application/json",
             "X-Cappta-Signature": f"sha256={signature}",
             "X-Cappta-Event": event_type,
+            "X-Cappta-Delivery": delivery_id,
             "X-Cappta-Timestamp": str(int(datetime.now().timestamp())),
             "User-Agent": "Cappta-Fake-Simulator/1.0"
         }
+        if len(webhook_logs) > 1:
+            headers["X-Cappta-Batch-Size"] = str(len(webhook_logs))
         
-        success = False
-        last_error = None
-        response_status = None
-        response_body = None
+        result = {
+            "success": False,
+            "response_status": None,
+            "response_body": None,
+            "response_time_ms": None,
+            "error_message": None,
+            "error_type": None
+        }
         
-        for attempt in range(self.retry_attempts):
-            try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(
-                        self.webhook_url,
-                        headers=headers,
-                        content=payload_str
-                    )
-                    
-                    response_status = response.status_code
-                    response_body = response.text[:1000]  # Limita a 1000 caracteres
-                    
-                    if response.status_code < 400:
-                        success = True
-                        logger.info(f"Webhook {event_type} sent successfully (attempt {attempt + 1})")
-                        break
-                    else:
-                        last_error = f"HTTP {response.status_code}: {response.text}"
-                        logger.warning(f"Webhook {event_type} failed with status {response.status_code} (attempt {attempt + 1})")
-                        
-            except httpx.RequestError as e:
-                last_error = str(e)
-                logger.warning(f"Webhook {event_type} request failed (attempt {attempt + 1}): {e}")
-            except Exception as e:
-                last_error = str(e)
-                logger.error(f"Unexpected error sending webhook {event_type} (attempt {attempt + 1}): {e}")
+        started = time.perf_counter()
+        try:
+            client = http_client_pool.get_client("webhook", timeout=self.timeout)
+            response = await client.post(
+                first.webhook_url,
+                headers=headers,
+                content=payload
+            )
             
-            # Aguarda antes da próxima tentativa (exceto na última)
-            if attempt < self.retry_attempts - 1:
-                await asyncio.sleep(self.retry_delay)
-        
-        # Log do webhook no banco
-        await self._log_webhook(
-            event_type=event_type,
-            merchant_id=merchant_id,
-            transaction_id=transaction_id,
-            settlement_id=settlement_id,
-            payload=payload_str,
-            response_status=response_status,
-            response_body=response_body,
-            attempt_count=attempt + 1,
-            success=success
-        )
+            result["response_status"] = response.status_code
+            result["response_body"] = response.text[:1000]  # Limita a 1000 caracteres
+            
+            if response.status_code < 400:
+                result["success"] = True
+            else:
+                result["error_message"] = f"HTTP {response.status_code}: {response.text[:500]}"
+                result["error_type"] = "http_error"
         
-        if not success:
-            logger.error(f"Failed to send webhook {event_type} after {self.retry_attempts} attempts. Last error: {last_error}")
+        except httpx.RequestError as e:
+            result["error_message"] = str(e) or type(e).__name__
+            result["error_type"] = "request_error"
+        except Exception as e:
+            result["error_message"] = str(e)
+            result["error_type"] = "unexpected_error"
         
-        return success
+        result["response_time_ms"] = int((time.perf_counter() - started) * 1000)
+        return result
     
-    async def send_transaction_webhook(self, transaction: TransactionResponse) -> bool:
-        """Envia webhook de transação"""
-        
-        event_type = f"transaction.{transaction.status.value}"
+    def _transaction_payload(self, transaction: Dict[str, Any]) -> Dict[str, Any]:
+        """Payload do webhook de transação a partir das colunas da transação"""
         
-        # Prepara dados do webhook
-        
-        payload = {
-            "event": event_type,
+        return {
+            "event": f"transaction.{transaction['status']}",
             "data": {
-                "transaction_id": transaction.transaction_id,
-                "merchant_id": transaction.merchant_id,
-                "terminal_id": transaction.terminal_id,
-                "nsu": transaction.nsu,
-                "authorization_code": transaction.authorization_code,
-                "payment_method": transaction.payment_method.value,
-                "card_brand": transaction.card_brand,
-                "gross_amount": transaction.gross_amount,
-                "fee_amount": transaction.fee_amount,
-                "net_amount": transaction.net_amount,
-                "installments": transaction.installments,
-                "status": transaction.status.value,
-                "captured_at": transaction.captured_at.isoformat(),
-                "external_event_id": transaction.external_event_id
+                "transaction_id": transaction["transaction_id"],
+                "merchant_id": transaction["merchant_id"],
+                "terminal_id": transaction["terminal_id"],
+                "nsu": transaction["nsu"],
+                "authorization_code": transaction["authorization_code"],
+                "payment_method": transaction["payment_method"],
+                "card_brand": transaction["card_brand"],
+                "gross_amount": transaction["gross_amount"],
+                "fee_amount": transaction["fee_amount"],
+                "net_amount": transaction["net_amount"],
+                "installments": transaction["installments"],
+                "status": transaction["status"],
+                "captured_at": transaction["captured_at"].isoformat(),
+                "external_event_id": transaction["external_event_id"]
             },
             "timestamp": datetime.now().isoformat(),
-            "signature": None  # Será calculado em _send_webhook
+            "signature": None  # Enviada no header X-Cappta-Signature
         }
+    
+    async def send_transaction_webhook(self, transaction: TransactionResponse, db: Optional[AsyncSession] = None) -> bool:
+        """Envia webhook de transação"""
+        
+        event_type = f"transaction.{transaction.status.value}"
+        
+        payload = self._transaction_payload({
+            **transaction.model_dump(include={
+                "transaction_id", "merchant_id", "terminal_id", "nsu", "authorization_code",
+                "card_brand", "gross_amount", "fee_amount", "net_amount", "installments",
+                "captured_at", "external_event_id"
+            }),
+            "payment_method": transaction.payment_method.value,
+            "status": transaction.status.value
+        })
         
         return await self._send_webhook(
             event_type=event_type,
             payload=payload,
             merchant_id=transaction.merchant_id,
-            transaction_id=transaction.transaction_id
+            transaction_id=transaction.transaction_id,
+            db=db
         )
     
-    async def send_settlement_webhook(self, settlement: SettlementResponse) -> bool:
+    def build_transaction_outbox_rows(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Linhas da outbox para os webhooks de um lote de transações
+        
+        `transactions` são as colunas das transações, como inseridas. Só monta
+        payloads e assinaturas (CPU), sem tocar no banco: pode rodar fora do
+        event loop e fora da sessão de escrita.
+        """
+        
+        due_at = self._due_at()
+        return [
+            self._outbox_row(
+                f"transaction.{transaction['status']}",
+                self._transaction_payload(transaction),
+                transaction["merchant_id"],
+                transaction_id=transaction["transaction_id"],
+                due_at=due_at
+            )
+            for transaction in transactions
+        ]
+    
+    async def enqueue_outbox_rows(self, db: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+        """Grava linhas da outbox com um único INSERT executemany na sessão `db`
+        
+        Os eventos entram no mesmo commit da operação de negócio; o dispatcher
+        é acordado depois do commit.
+        """
+        
+        if not rows:
+            return 0
+        
+        await db.execute(WebhookLogDB.__table__.insert(), rows)
+        event.listen(db.sync_session, "after_commit", lambda _: webhook_dispatcher.notify(), once=True)
+        return len(rows)
+    
+    async def send_settlement_webhook(self, settlement: SettlementResponse, db: Optional[AsyncSession] = None) -> bool:
         """Envia webhook de liquidação"""
         
         event_type = f"settlement.{settlement.status.value}"
@@ -165,50 +292,313 @@ class WebhookSender:
                 "processed_at": settlement.processed_at.isoformat() if settlement.processed_at else None
             },
             "timestamp": datetime.now().isoformat(),
-            "signature": None  # Será calculado em _send_webhook
+            "signature": None  # Enviada no header X-Cappta-Signature
         }
         
         return await self._send_webhook(
             event_type=event_type,
             payload=payload,
             merchant_id=settlement.merchant_id,
-            settlement_id=settlement.settlement_id
+            settlement_id=settlement.settlement_id,
+            db=db
         )
+
+
+class WebhookDispatcher:
+    """Pool de workers que drena a outbox de webhooks (webhook_logs)
     
-    async def _log_webhook(
-        self,
-        event_type: str,
-        merchant_id: str,
-        payload: str,
-        response_status: int = None,
-        response_body: str = None,
-        attempt_count: int = 1,
-        success: bool = False,
-        transaction_id: str = None,
-        settlement_id: str = None
-    ):
-        """Registra log do webhook no banco"""
+    Um poller reivindica os eventos vencidos (next_retry_at <= agora) movendo
+    next_retry_at para frente (lease), o que evita entrega duplicada entre
+    processos e devolve o evento à fila se o processo cair no meio do envio.
+    Os workers fazem uma tentativa por evento e reagendam falhas com backoff
+    exponencial e jitter.
+    
+    Com WEBHOOK_BATCH_ENABLED, os eventos vencidos de um mesmo comerciante são
+    entregues juntos em um único POST (até WEBHOOK_BATCH_MAX_SIZE eventos).
+    """
+    
+    def __init__(self, sender: Optional[WebhookSender] = None):
+        self.sender = sender or WebhookSender()
+        self.worker_count = max(1, settings.WEBHOOK_WORKER_COUNT)
+        self.poll_interval = settings.WEBHOOK_POLL_INTERVAL
+        self.claim_timeout = settings.WEBHOOK_CLAIM_TIMEOUT
+        self.claim_batch = settings.WEBHOOK_CLAIM_BATCH
+        self.base_delay = settings.WEBHOOK_RETRY_DELAY
+        self.max_delay = settings.WEBHOOK_RETRY_MAX_DELAY
+        self.batch_enabled = settings.WEBHOOK_BATCH_ENABLED
+        self.batch_window = settings.WEBHOOK_BATCH_WINDOW_MS / 1000
+        self.batch_max_size = max(1, settings.WEBHOOK_BATCH_MAX_SIZE) if self.batch_enabled else 1
+        self.claim_batch = max(self.claim_batch, self.batch_max_size)
+        self.shutdown_timeout = settings.WEBHOOK_TIMEOUT + 5
+        
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+        
+        self.stats = {"delivered": 0, "retried": 0, "failed": 0, "requests": 0}
+    
+    @property
+    def is_running(self) -> bool:
+        return self._running
+    
+    def notify(self):
+        """Acorda o poller quando um novo evento é enfileirado"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    def compute_backoff(self, attempt_count: int) -> float:
+        """Backoff exponencial com jitter: metade fixa, metade aleatória"""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, attempt_count - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    async def start(self):
+        """Inicia poller e workers"""
+        if self._running:
+            return
+        
+        self._running = True
+        self._queue = asyncio.Queue(maxsize=self.worker_count * 2)
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()  # Drena pendências deixadas por execuções anteriores
+        
+        self._poller = asyncio.create_task(self._poll_loop(), name="webhook-poller")
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(), name=f"webhook-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        
+        logger.info(f"Webhook dispatcher started with {self.worker_count} workers")
+    
+    async def stop(self):
+        """Para o poller, entrega o que já foi enfileirado e encerra os workers
+        
+        Em modo batch, os eventos ainda dentro da janela de agrupamento também
+        são enviados antes de encerrar. O que não couber no timeout volta à
+        fila quando o lease expira.
+        """
+        if not self._running:
+            return
+        
+        self._running = False
+        self._poller.cancel()
+        await asyncio.gather(self._poller, return_exceptions=True)
         
         try:
-            with get_db_session() as db:
-                webhook_log = WebhookLogDB(
-                    event_type=event_type,
-                    merchant_id=merchant_id,
-                    transaction_id=transaction_id,
-                    settlement_id=settlement_id,
-                    payload=payload,
-                    response_status=response_status,
-                    response_body=response_body,
-                    attempt_count=attempt_count,
-                    success=success,
-                    processed_at=datetime.now() if success else None
-                )
+            await asyncio.wait_for(self._flush(), timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook dispatcher shutdown timed out with deliveries pending")
+        except Exception as e:
+            logger.error(f"Webhook flush on shutdown failed: {e}")
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        logger.info("Webhook dispatcher stopped")
+    
+    async def _flush(self):
+        """Enfileira os eventos pendentes (inclusive os da janela de batch) e aguarda a entrega"""
+        horizon = datetime.utcnow()
+        if self.batch_enabled:
+            horizon += timedelta(seconds=self.batch_window)
+        
+        while True:
+            groups = await self._claim_due(horizon)
+            if not groups:
+                break
+            for group in groups:
+                await self._queue.put(group)
+        await self._queue.join()
+    
+    async def _poll_loop(self):
+        while self._running:
+            try:
+                groups = await self._claim_due()
+                for group in groups:
+                    await self._queue.put(group)
                 
-                db.add(webhook_log)
-                db.commit()
+                # Lote cheio: provavelmente há mais eventos vencidos
+                if sum(len(group) for group in groups) >= self.claim_batch:
+                    continue
                 
-        except Exception as e:
-            logger.error(f"Failed to log webhook: {e}")
+                # Em modo batch os eventos vencem ao fim da janela, não na notificação
+                timeout = min(self.poll_interval, self.batch_window) if self.batch_enabled else self.poll_interval
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook poller error: {e}")
+                await asyncio.sleep(self.poll_interval)
+    
+    async def _claim_due(self, until: Optional[datetime] = None) -> List[List[int]]:
+        """Reivindica eventos vencidos movendo next_retry_at para o fim do lease
+        
+        Retorna grupos de IDs a entregar juntos: um por evento, ou por
+        comerciante/URL (limitado a batch_max_size) em modo batch.
+        """
+        
+        now = datetime.utcnow()
+        until = until or now
+        lease_until = now + timedelta(seconds=self.claim_timeout)
+        
+        due = (
+            select(WebhookLogDB.id)
+            .where(and_(
+                WebhookLogDB.is_final == False,
+                WebhookLogDB.next_retry_at <= until
+            ))
+            .order_by(WebhookLogDB.next_retry_at)
+            .limit(self.claim_batch)
+        )
+        
+        # Um único UPDATE: o SQLite serializa escritas, então nenhum outro
+        # worker reivindica os mesmos eventos entre o SELECT e o UPDATE
+        async with get_async_db_session() as db:
+            claimed = (await db.execute(
+                update(WebhookLogDB)
+                .where(WebhookLogDB.id.in_(due.scalar_subquery()))
+                .values(next_retry_at=lease_until)
+                .returning(WebhookLogDB.id, WebhookLogDB.merchant_id, WebhookLogDB.webhook_url)
+                .execution_options(synchronize_session=False)
+            )).all()
+            
+            # RETURNING não preserva a ordem; IDs seguem a ordem de criação
+            groups: Dict[tuple, List[List[int]]] = {}
+            for webhook_id, merchant_id, webhook_url in sorted(claimed, key=lambda row: row.id):
+                key = (merchant_id, webhook_url) if self.batch_enabled else (webhook_id,)
+                chunks = groups.setdefault(key, [[]])
+                if len(chunks[-1]) >= self.batch_max_size:
+                    chunks.append([])
+                chunks[-1].append(webhook_id)
+            
+            return [chunk for chunks in groups.values() for chunk in chunks]
+    
+    async def _worker_loop(self):
+        while True:
+            webhook_ids = await self._queue.get()
+            try:
+                await self._process(webhook_ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook worker failed processing {webhook_ids}: {e}")
+            finally:
+                self._queue.task_done()
+    
+    async def _process(self, webhook_ids: List[int]):
+        """Faz uma tentativa de entrega e grava o resultado na outbox"""
+        
+        async with get_async_read_db_session() as db:
+            webhook_logs = (await db.execute(
+                select(WebhookLogDB).where(
+                    and_(WebhookLogDB.id.in_(webhook_ids), WebhookLogDB.is_final == False)
+                ).order_by(WebhookLogDB.id)
+            )).scalars().all()
+        
+        if not webhook_logs:
+            return
+        
+        result = await self.sender.deliver(webhook_logs)
+        self.stats["requests"] += 1
+        now = datetime.utcnow()
+        
+        async with get_async_db_session() as db:
+            for webhook_log in webhook_logs:
+                values = self._attempt_values(webhook_log, result, now)
+                await db.execute(
+                    update(WebhookLogDB).where(WebhookLogDB.id == webhook_log.id).values(**values)
+                )
+    
+    def _attempt_values(self, webhook_log: WebhookLogDB, result: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        """Calcula o novo estado de um evento após uma tentativa"""
+        
+        attempt_count = (webhook_log.attempt_count or 0) + 1
+        max_attempts = webhook_log.max_attempts or self.sender.retry_attempts
+        
+        values = {
+            "attempt_count": attempt_count,
+            "last_attempt_at": now,
+            "response_status": result["response_status"],
+            "response_body": result["response_body"],
+            "response_time_ms": result["response_time_ms"],
+            "error_message": result["error_message"],
+            "error_type": result["error_type"],
+            "success": result["success"]
+        }
+        
+        if result["success"]:
+            values.update(is_final=True, next_retry_at=None, processed_at=now)
+            self.stats["delivered"] += 1
+            logger.info(f"Webhook {webhook_log.event_type} sent successfully (attempt {attempt_count})")
+        elif attempt_count >= max_attempts:
+            values.update(is_final=True, next_retry_at=None)
+            self.stats["failed"] += 1
+            logger.error(
+                f"Failed to send webhook {webhook_log.event_type} after {attempt_count} attempts. "
+                f"Last error: {result['error_message']}"
+            )
+        else:
+            delay = self.compute_backoff(attempt_count)
+            values["next_retry_at"] = now + timedelta(seconds=delay)
+            self.stats["retried"] += 1
+            logger.warning(
+                f"Webhook {webhook_log.event_type} failed (attempt {attempt_count}), "
+                f"retrying in {delay:.0f}s: {result['error_message']}"
+            )
+        
+        return values
+    
+    async def retry_overdue(self) -> Dict[str, Any]:
+        """Varredura periódica da outbox (job webhook_retries do agendador)
+        
+        Retentativas vencidas e eventos cujo lease expirou (worker caiu no
+        meio do envio) já voltam à fila pelo poller; a varredura acorda o
+        poller deste worker para drená-los e mede o atraso da outbox, com
+        alerta quando há eventos vencidos há mais de um lease.
+        """
+        
+        now = datetime.utcnow()
+        async with get_async_read_db_session() as db:
+            overdue, oldest = (await db.execute(
+                select(func.count(WebhookLogDB.id), func.min(WebhookLogDB.next_retry_at)).where(
+                    and_(WebhookLogDB.is_final == False, WebhookLogDB.next_retry_at <= now)
+                )
+            )).one()
+        
+        lag = (now - oldest).total_seconds() if oldest else 0.0
+        if lag > self.claim_timeout:
+            logger.warning(f"Webhook outbox lagging: {overdue} overdue events, oldest due {lag:.0f}s ago")
+        
+        if overdue:
+            self.notify()
+        
+        return {"overdue": overdue, "oldest_overdue_seconds": round(lag, 1), "dispatcher_running": self._running}
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas do dispatcher e tamanho da outbox"""
+        
+        async with get_async_read_db_session() as db:
+            pending = (await db.execute(
+                select(func.count(WebhookLogDB.id)).where(WebhookLogDB.is_final == False)
+            )).scalar()
+        
+        return {
+            "running": self._running,
+            "workers": self.worker_count,
+            "batch_enabled": self.batch_enabled,
+            "pending": pending,
+            "in_memory_queue": self._queue.qsize() if self._queue else 0,
+            **self.stats
+        }
+
 
-# Importa asyncio no final para evitar problemas de importação circular
-import asyncio
\ No newline at end of file
+# Global dispatcher instance
+webhook_dispatcher = WebhookDispatcher()
@@ -1,9 +1,57 @@
+import atexit
+import contextvars
+import copy
 import logging
+import queue
 import sys
-from typing import Dict, Any
-import json
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, Optional
 from datetime import datetime
 
+from config.serialization import dumps_str
+
+
+# Per-request logging context. Each asyncio task (and each threadpool call made
+# from it) sees its own copy, so concurrent requests never share correlation IDs.
+# The dict is never mutated in place; binding always sets a new one.
+_log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+
+def bind_log_context(**kwargs) -> contextvars.Token:
+    """
+    Add fields to the logging context of the current task
+    
+    Returns:
+        Token for reset_log_context()
+    """
+    return _log_context.set({**_log_context.get(), **kwargs})
+
+
+def reset_log_context(token: contextvars.Token) -> None:
+    """Restore the logging context to what it was before bind_log_context()"""
+    _log_context.reset(token)
+
+
+def get_log_context() -> Dict[str, Any]:
+    """Current logging context (read-only)"""
+    return _log_context.get()
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copy the current logging context onto every record
+    
+    Runs in the thread that emits the record, before any queue hand-off, so
+    records logged through plain get_logger() loggers are correlated too.
+    Explicit `extra` fields win over context fields.
+    """
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
 
 class JSONFormatter(logging.Formatter):
     """
@@ -12,7 +60,7 @@ class JSONFormatter(logging.Formatter):
     
     def format(self, record: logging.LogRecord) -> str:
         log_entry: Dict[str, Any] = {
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -34,21 +82,93 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, 'request_id'):
             log_entry['request_id'] = record.request_id
             
-        # Add exception info if present
+        # Add exception info if present (exc_text when pre-formatted by the queue handler)
         if record.exc_info:
             log_entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_entry['exception'] = record.exc_text
             
-        return json.dumps(log_entry, ensure_ascii=False)
+        return dumps_str(log_entry)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler over a bounded queue
+    
+    Records are dropped (and counted) instead of blocking the caller when the
+    listener thread falls behind. Only the message and traceback are resolved
+    in the calling thread; formatting and I/O happen in the listener.
+    """
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
 
+class DrainingQueueListener(QueueListener):
+    """QueueListener whose stop() waits for room in a full queue instead of raising queue.Full"""
+    
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+_exception_formatter = logging.Formatter()
+_queue_listener: Optional[DrainingQueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread (no-op without a queue)"""
+    global _queue_listener
+    
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
 
-def setup_logging(log_level: str = "INFO", json_format: bool = True) -> None:
+
+atexit.register(stop_logging)
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    """Queue depth and dropped records of the async log handler (for /health/detailed)"""
+    if _queue_handler is None:
+        return {"queue_enabled": False}
+    
+    return {
+        "queue_enabled": True,
+        "queued": _queue_handler.queue.qsize(),
+        "capacity": _queue_handler.queue.maxsize,
+        "dropped": _queue_handler.dropped
+    }
+
+
+def setup_logging(log_level: str = "INFO", json_format: bool = True, queue_size: int = 0) -> None:
     """
     Setup logging configuration for the application
     
     Args:
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         json_format: Use JSON format for structured logging
+        queue_size: When > 0, log through a bounded queue drained by a
+            listener thread, keeping formatting and stdout writes off the
+            event loop
     """
+    global _queue_listener, _queue_handler
     
     # Convert string level to logging constant
     numeric_level = getattr(logging, log_level.upper(), logging.INFO)
@@ -60,6 +180,8 @@ def setup_logging(log_level: str = "INFO", json_format: bool = True) -> None:
     # Remove existing handlers
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
+    stop_logging()
+    _queue_handler = None
     
     # Create console handler
     console_handler = logging.StreamHandler(sys.stdout)
@@ -73,7 +195,18 @@ def setup_logging(log_level: str = "INFO", json_format: bool = True) -> None:
         )
     
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    
+    if queue_size > 0:
+        queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        queue_handler.setLevel(numeric_level)
+        queue_handler.addFilter(ContextFilter())
+        _queue_listener = DrainingQueueListener(queue_handler.queue, console_handler, respect_handler_level=True)
+        _queue_listener.start()
+        root_logger.addHandler(queue_handler)
+        _queue_handler = queue_handler
+    else:
+        console_handler.addFilter(ContextFilter())
+        root_logger.addHandler(console_handler)
     
     # Configure specific loggers
     loggers_config = {
@@ -106,25 +239,33 @@ def get_logger(name: str) -> logging.Logger:
 class ContextLogger:
     """
     Logger with context information for tracking requests
+    
+    The context is stored in a contextvar (see bind_log_context), not on the
+    instance, so a module-level ContextLogger is safe to share between
+    concurrent requests.
     """
     
     def __init__(self, name: str):
         self.logger = get_logger(name)
-        self.context: Dict[str, Any] = {}
     
-    def set_context(self, **kwargs):
-        """Set context information for all log messages"""
-        self.context.update(kwargs)
+    @property
+    def context(self) -> Dict[str, Any]:
+        return get_log_context()
+    
+    def set_context(self, **kwargs) -> contextvars.Token:
+        """Set context information for all log messages of the current request"""
+        return bind_log_context(**kwargs)
     
-    def clear_context(self):
-        """Clear all context information"""
-        self.context.clear()
+    def clear_context(self, token: Optional[contextvars.Token] = None):
+        """Restore the context saved in `token`, or clear it for the current request"""
+        if token is not None:
+            reset_log_context(token)
+        else:
+            _log_context.set({})
     
     def _log_with_context(self, level: int, msg: str, *args, **kwargs):
-        """Log message with context information"""
-        extra = kwargs.get('extra', {})
-        extra.update(self.context)
-        kwargs['extra'] = extra
+        """Log message with context information (explicit `extra` fields win)"""
+        kwargs['extra'] = {**get_log_context(), **(kwargs.get('extra') or {})}
         self.logger.log(level, msg, *args, **kwargs)
     
     def debug(self, msg: str, *args, **kwargs):
@@ -0,0 +1,89 @@
+"""
+JSON serialization shared by logs, webhooks and API responses.
+
+Uses orjson when it is installed and falls back to the stdlib json module
+otherwise. Both paths produce compact UTF-8 output and handle the same
+types: datetime/date/time (ISO 8601), Enum (its value), Decimal (string, to
+keep it exact), UUID, sets and pydantic models.
+"""
+
+import dataclasses
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for types neither backend serializes natively"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, BaseException):
+        # pydantic validation errors carry the raised exception in ctx
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if HAS_ORJSON:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+    
+    def dumps(obj: Any) -> bytes:
+        """Serialize `obj` to compact UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Parse JSON from bytes or str"""
+        return orjson.loads(data)
+
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+    
+    def dumps(obj: Any) -> bytes:
+        """Serialize `obj` to compact UTF-8 JSON bytes"""
+        return _encoder.encode(obj).encode("utf-8")
+    
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Parse JSON from bytes or str"""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+
+def dumps_str(obj: Any) -> str:
+    """Serialize `obj` to a compact JSON str (for text columns and log lines)"""
+    return dumps(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered through dumps()
+    
+    Equivalent to FastAPI's ORJSONResponse when orjson is installed, but
+    keeps working without it and also serializes Decimal/Enum/date values.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
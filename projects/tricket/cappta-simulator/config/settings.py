@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
+from datetime import date
 from enum import Enum
 import os
 
@@ -27,15 +28,25 @@ class Settings(BaseSettings):
     CAPPTA_API_TOKEN: str = "cappta_fake_token_dev_123"  # Alias para compatibilidade
     CAPPTA_API_URL: str = "http://localhost:8000"  # URL base da API (simulador)
     RESELLER_DOCUMENT: str = "00000000000191"  # CNPJ do reseller padrão
+    RESELLER_TOKEN_CACHE_SIZE: int = 1024  # Tokens validados mantidos em memória (0 desativa)
+    RESELLER_TOKEN_CACHE_TTL: float = 60.0  # seconds
     
     # Legacy authentication (manter para compatibilidade)
     ALLOWED_IPS: List[str] = ["127.0.0.1", "localhost", "::1", "0.0.0.0/0"]
     TOKEN_EXPIRY_HOURS: int = 24
+    TOKEN_CACHE_TTL: float = 30.0  # seconds (releitura do token no banco; revogações entre workers)
+    TOKEN_CACHE_MAX_MISSING: int = 10000  # Tokens inválidos lembrados em memória
+    TOKEN_USAGE_FLUSH_INTERVAL: float = 10.0  # seconds (write-behind de last_used/usage_count)
     
     # Rate Limiting
     RATE_LIMIT_REQUESTS_PER_MINUTE: int = 1000
     RATE_LIMIT_BURST: int = 100
     RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory (por processo) ou redis (compartilhado entre workers)
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_KEY_PREFIX: str = "cappta:ratelimit:"
+    RATE_LIMIT_FAIL_OPEN: bool = True  # Permite requisições se o backend estiver indisponível
+    RATE_LIMIT_WINDOW_MODE: str = "approximate"  # approximate (2 contadores, memória constante) ou exact (1 registro por requisição)
     
     # Asaas Integration (Transferências)
     ASAAS_API_KEY: str = "SUBSTITUIR_PELA_API_KEY_REAL"
@@ -51,13 +62,34 @@ class Settings(BaseSettings):
     WEBHOOK_SIGNATURE_SECRET: str = "signature_secret_dev_xyz"
     WEBHOOK_TIMEOUT: int = 30  # seconds
     WEBHOOK_RETRY_ATTEMPTS: int = 5
-    WEBHOOK_RETRY_DELAY: int = 60  # seconds
+    WEBHOOK_RETRY_DELAY: int = 60  # seconds (base do backoff exponencial)
+    WEBHOOK_RETRY_MAX_DELAY: int = 3600  # seconds
+    WEBHOOK_WORKER_COUNT: int = 4
+    WEBHOOK_POLL_INTERVAL: float = 5.0  # seconds
+    WEBHOOK_CLAIM_TIMEOUT: int = 120  # seconds (lease de um evento em entrega)
+    WEBHOOK_CLAIM_BATCH: int = 50
+    WEBHOOK_BATCH_ENABLED: bool = False  # Agrupa eventos por comerciante em um único POST
+    WEBHOOK_BATCH_WINDOW_MS: int = 500
+    WEBHOOK_BATCH_MAX_SIZE: int = 100
+    
+    # Outbound HTTP (clientes compartilhados para webhook e Asaas)
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_KEEPALIVE: int = 20
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 30.0  # seconds
+    HTTP_CLIENT_TIMEOUT: float = 30.0  # seconds
+    HTTP_CLIENT_HTTP2: bool = True
     
     # Database Configuration
     DATABASE_URL: str = "sqlite:///./cappta_simulator.db"
     DATABASE_POOL_SIZE: int = 10
     DATABASE_ECHO: bool = False
     
+    # SQLite tuning (file databases only; applied to every new connection)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # Safe with WAL; FULL fsyncs every commit
+    SQLITE_CACHE_SIZE_KB: int = 65536  # Page cache per connection
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MB
+    
     # Business Rules
     DEFAULT_FEE_PERCENTAGE: float = 3.0  # 3%
     DEFAULT_FEE_FIXED: int = 30  # R$ 0,30 in cents
@@ -65,16 +97,62 @@ class Settings(BaseSettings):
     DEBIT_FEE_PERCENTAGE: float = 2.0  # 2%
     DEBIT_FEE_FIXED: int = 20  # R$ 0,20 in cents
     INSTALLMENT_FEE_PERCENTAGE: float = 0.5  # 0.5% por parcela adicional
+    FEE_SCHEDULE_CACHE_TTL: float = 300.0  # Segundos até recompilar a tabela de taxas de um plano
+    PLAN_QUOTE_MAX_ITEMS: int = 5000  # Combinações por cotação em lote (/plans/{plan_id}/quotes)
     
     SETTLEMENT_DELAY_CREDIT: int = 24  # D+1 para crédito
     SETTLEMENT_DELAY_DEBIT: int = 0   # D+0 para débito
     SETTLEMENT_DELAY_PIX: int = 0     # D+0 para PIX
+    SETTLEMENT_EXTRA_HOLIDAYS: List[date] = []  # Feriados sem liquidação além dos nacionais (ex.: municipais)
     SETTLEMENT_MIN_AMOUNT: int = 1000 # R$ 10,00 mínimo para liquidação
+    SETTLEMENT_BATCH_SIZE: int = 5000  # Transações vinculadas por UPDATE/commit
+    SETTLEMENT_ROLLUP_ENABLED: bool = False  # Resumo por comerciante em tabela materializada
     
     MAX_TRANSACTION_AMOUNT: int = 1000000  # R$ 10.000,00 in cents
     MIN_TRANSACTION_AMOUNT: int = 100      # R$ 1,00 in cents
     MAX_INSTALLMENTS: int = 12
     
+    # Simulação em massa (POST /transactions/simulate-batch)
+    SIMULATION_MAX_TRANSACTIONS: int = 5000000
+    SIMULATION_CHUNK_SIZE: int = 5000  # Transações por INSERT executemany/commit
+    
+    # Ingestão em lote (POST /transactions/bulk)
+    BULK_TRANSACTIONS_MAX_ITEMS: int = 50000
+    BULK_TRANSACTIONS_CHUNK_SIZE: int = 2000  # Itens por INSERT ... ON CONFLICT/commit
+    
+    # Exportação em streaming (GET /transactions/export, /settlements/export)
+    EXPORT_BATCH_SIZE: int = 1000  # Linhas por lote do cursor (yield_per) e por escrita
+    
+    # Feed de mudanças (GET /changes)
+    CHANGE_FEED_DEFAULT_LIMIT: int = 500
+    CHANGE_FEED_MAX_LIMIT: int = 5000
+    
+    # Agendador de jobs periódicos (cron em UTC; expressão vazia desativa o job)
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_JITTER_SECONDS: float = 30.0  # Atraso aleatório máximo após o horário do cron
+    SCHEDULER_JOB_TIMEOUT: int = 600  # seconds
+    SCHEDULER_LEASE_MARGIN: int = 60  # seconds (lease = timeout + margem; depois outro worker pode assumir)
+    SCHEDULER_RUN_RETENTION_DAYS: int = 30  # Histórico de execuções (job_runs)
+    SCHEDULER_SETTLEMENT_CRON: str = "0 6 * * *"  # Liquidação das coortes vencidas
+    SCHEDULER_SETTLEMENT_TIMEOUT: int = 14400  # seconds (cancela só entre coortes; a coorte em andamento termina)
+    SCHEDULER_WEBHOOK_RETRY_CRON: str = "*/5 * * * *"  # Varredura de webhooks atrasados
+    SCHEDULER_TOKEN_CLEANUP_CRON: str = "0 * * * *"
+    SCHEDULER_RATE_LIMIT_CLEANUP_CRON: str = "*/10 * * * *"  # Roda em todos os workers (estado em memória)
+    SCHEDULER_ROLLUP_REFRESH_CRON: str = "30 3 * * *"  # Só com SETTLEMENT_ROLLUP_ENABLED
+    SCHEDULER_RUN_CLEANUP_CRON: str = "15 4 * * *"
+    
+    # Logging & Audit
+    LOG_QUEUE_SIZE: int = 10000  # Fila do handler assíncrono de logs (0 = escrita síncrona no stdout)
+    AUDIT_ENABLED: bool = True
+    AUDIT_SAMPLE_RATE: float = 1.0  # Fração das requisições bem-sucedidas registradas (erros sempre)
+    AUDIT_ROUTE_SAMPLE_RATES: Dict[str, float] = {"/health": 0.0}  # Prefixo de rota -> taxa (prefixo mais longo vence)
+    AUDIT_HEADER_ALLOWLIST: List[str] = ["user-agent", "content-type", "content-length", "x-forwarded-for", "x-request-id"]
+    AUDIT_RESPONSE_HEADER_ALLOWLIST: List[str] = ["content-type", "content-length"]
+    AUDIT_PERSIST_ENABLED: bool = False  # Grava as entradas de auditoria na tabela audit_logs
+    AUDIT_PERSIST_BATCH_SIZE: int = 200
+    AUDIT_PERSIST_INTERVAL: float = 2.0  # seconds
+    AUDIT_PERSIST_MAX_BUFFER: int = 10000  # Entradas pendentes antes de descartar
+    
     # Monitoring & Observability
     SENTRY_DSN: Optional[str] = None
     PROMETHEUS_ENABLED: bool = False
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark do custo por requisição do AuditMiddleware
+
+Monta uma app FastAPI mínima (uma rota GET /ping) e mede a latência média
+de requisições sequenciais via ASGI em cada cenário:
+
+- sem_auditoria: app sem middleware
+- middleware_vazio: middleware HTTP que só repassa a requisição (linha de
+  base; isola o custo do BaseHTTPMiddleware do Starlette)
+- sincrono: 100% amostrado, JSON escrito no handler do próprio event loop
+- fila: 100% amostrado, logs via QueueHandler/QueueListener
+- fila_amostrado: fila + AUDIT_SAMPLE_RATE (padrão 0.1)
+- fila_persistencia: fila + gravação em lote na tabela audit_logs
+
+Os logs vão para um arquivo temporário, não para o terminal.
+
+    python scripts/bench_audit_overhead.py
+    python scripts/bench_audit_overhead.py --requests 5000 --sample-rate 0.05
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def setup_environment():
+    """Aponta o simulador para um SQLite temporário"""
+    tmp_dir = tempfile.mkdtemp(prefix="cappta_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    os.environ["DEBUG"] = "false"
+    os.environ.setdefault("API_TOKEN", "bench_token")
+    return os.path.join(tmp_dir, "audit.log")
+
+
+async def passthrough_middleware(request, call_next):
+    return await call_next(request)
+
+
+def build_app(middleware):
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    if middleware == "audit":
+        from app.middleware.audit import AuditMiddleware
+        app.middleware("http")(AuditMiddleware())
+    elif middleware == "passthrough":
+        app.middleware("http")(passthrough_middleware)
+
+    return app
+
+
+def configure_logging(log_file, queue_size):
+    """Reconfigura o logging raiz escrevendo JSON em `log_file`"""
+    from config.logging import setup_logging
+
+    with contextlib.redirect_stdout(log_file):
+        setup_logging(log_level="INFO", json_format=True, queue_size=queue_size)
+
+
+async def run_requests(app, total):
+    import httpx
+
+    latencies = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        # Aquecimento
+        for _ in range(min(50, total)):
+            await client.get("/ping", headers={"User-Agent": "bench"})
+
+        for _ in range(total):
+            started = time.perf_counter()
+            await client.get("/ping", headers={"User-Agent": "bench"})
+            latencies.append((time.perf_counter() - started) * 1_000_000)
+
+    return latencies
+
+
+async def run_scenario(name, log_file, total, middleware="audit", queue_size=0, sample_rate=1.0, persist=False):
+    from config.logging import stop_logging
+    from config.settings import settings
+    from app.middleware.audit import audit_log_writer
+
+    settings.AUDIT_SAMPLE_RATE = sample_rate
+    settings.AUDIT_ROUTE_SAMPLE_RATES = {}
+    configure_logging(log_file, queue_size)
+
+    if persist:
+        await audit_log_writer.start()
+
+    latencies = await run_requests(build_app(middleware), total)
+
+    # Tempo para esvaziar a fila de logs e o buffer do audit_logs
+    started = time.perf_counter()
+    if persist:
+        await audit_log_writer.stop()
+    stop_logging()
+    log_file.flush()
+    drain_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "scenario": name,
+        "mean_us": statistics.mean(latencies),
+        "p50_us": statistics.median(latencies),
+        "drain_ms": drain_ms,
+        "persisted": audit_log_writer.written
+    }
+
+
+async def main_async(args, log_path):
+    from app.database.connection import create_tables, close_db
+
+    create_tables()
+
+    results = []
+    with open(log_path, "w") as log_file:
+        results.append(await run_scenario("sem_auditoria", log_file, args.requests, middleware=None))
+        results.append(await run_scenario("middleware_vazio", log_file, args.requests, middleware="passthrough"))
+        results.append(await run_scenario("sincrono", log_file, args.requests))
+        results.append(await run_scenario("fila", log_file, args.requests, queue_size=args.queue_size))
+        results.append(await run_scenario(
+            "fila_amostrado", log_file, args.requests,
+            queue_size=args.queue_size, sample_rate=args.sample_rate
+        ))
+        results.append(await run_scenario(
+            "fila_persistencia", log_file, args.requests,
+            queue_size=args.queue_size, persist=True
+        ))
+
+    # Conexões aiosqlite em pool mantêm threads vivas até o dispose
+    await close_db()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    log_path = setup_environment()
+    results = asyncio.run(main_async(args, log_path))
+
+    baseline = results[1]["mean_us"]
+    print(f"=== AuditMiddleware ({args.requests} requisições sequenciais) ===")
+    for result in results:
+        overhead = result["mean_us"] - baseline if result["scenario"] != "sem_auditoria" else 0.0
+        print(f"{result['scenario']:<18} média={result['mean_us']:>8.1f} us  p50={result['p50_us']:>8.1f} us  "
+              f"overhead={overhead:>7.1f} us  drenagem={result['drain_ms']:>6.1f} ms  "
+              f"audit_logs={result['persisted']}")
+    print(f"\nLogs em {log_path}")
+
+
+if __name__ == "__main__":
+    main()
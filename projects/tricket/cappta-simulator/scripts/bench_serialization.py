@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark da serialização JSON (config/serialization.py)
+
+Compara o caminho antigo (json da stdlib) com o módulo compartilhado nos
+três pontos em que ele é usado, com payloads realistas:
+
+- webhook: payload de transação e de liquidação (json.dumps(default=str))
+- resposta: TransactionListResponse / SettlementListResponse com N itens
+  (JSONResponse da stdlib vs FastJSONResponse, após jsonable_encoder)
+- log: JSONFormatter.format de um registro com request_id
+
+    python scripts/bench_serialization.py
+    python scripts/bench_serialization.py --items 500 --rounds 2000
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import timeit
+import uuid
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_payloads(items):
+    from app.models.common import TransactionStatus, PaymentMethod, CardBrand, SettlementStatus
+    from app.models.transaction import TransactionResponse, TransactionListResponse
+    from app.models.settlement import SettlementResponse, SettlementListResponse
+
+    now = datetime.utcnow()
+    transactions = [
+        TransactionResponse(
+            transaction_id=str(uuid.uuid4()),
+            merchant_id=str(uuid.uuid4()),
+            terminal_id="term_bench_0001",
+            nsu=f"{i:012d}",
+            authorization_code="A1B2C3",
+            payment_method=PaymentMethod.CREDIT,
+            card_brand=CardBrand.VISA,
+            gross_amount=10000 + i,
+            fee_amount=330,
+            net_amount=9670 + i,
+            installments=1 + i % 12,
+            status=TransactionStatus.APPROVED,
+            captured_at=now,
+            external_event_id=f"evt_{uuid.uuid4().hex}",
+            created_at=now,
+            updated_at=now
+        )
+        for i in range(items)
+    ]
+    settlements = [
+        SettlementResponse(
+            settlement_id=str(uuid.uuid4()),
+            merchant_id=str(uuid.uuid4()),
+            gross_amount=1000000,
+            fee_amount=33000,
+            net_amount=967000,
+            transaction_count=20,
+            transaction_refs=[f"evt_{uuid.uuid4().hex}" for _ in range(20)],
+            settlement_date=date.today(),
+            status=SettlementStatus.COMPLETED,
+            asaas_transfer_id="tra_000000000001",
+            processed_at=now,
+            created_at=now
+        )
+        for _ in range(items)
+    ]
+
+    transaction = transactions[0]
+    transaction_webhook = {
+        "event": "transaction.approved",
+        "data": {
+            **transaction.model_dump(exclude={"created_at", "updated_at"}),
+            "captured_at": transaction.captured_at.isoformat()
+        },
+        "timestamp": now.isoformat(),
+        "signature": None
+    }
+    settlement = settlements[0]
+    settlement_webhook = {
+        "event": "settlement.completed",
+        "data": {
+            **settlement.model_dump(exclude={"created_at", "updated_at"}),
+            "settlement_date": settlement.settlement_date.isoformat(),
+            "processed_at": settlement.processed_at.isoformat()
+        },
+        "timestamp": now.isoformat(),
+        "signature": None
+    }
+
+    return {
+        "transaction_webhook": transaction_webhook,
+        "settlement_webhook": settlement_webhook,
+        "transaction_list": TransactionListResponse(message="ok", data=transactions, total=items),
+        "settlement_list": SettlementListResponse(message="ok", data=settlements, total=items)
+    }
+
+
+def measure(func, rounds):
+    """Tempo médio por chamada em microssegundos (melhor de 3)"""
+    return min(timeit.repeat(func, number=rounds, repeat=3)) / rounds * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100, help="Itens por página nas listagens")
+    parser.add_argument("--rounds", type=int, default=1000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("API_TOKEN", "bench_token")
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from config.logging import JSONFormatter
+    from config.serialization import HAS_ORJSON, FastJSONResponse, dumps_str
+
+    payloads = build_payloads(args.items)
+    cases = []
+
+    for name in ("transaction_webhook", "settlement_webhook"):
+        payload = payloads[name]
+        cases.append((
+            f"webhook {name.split('_')[0]}",
+            lambda p=payload: json.dumps(p, default=str, separators=(',', ':')),
+            lambda p=payload: dumps_str(p)
+        ))
+
+    stdlib_response = JSONResponse.__new__(JSONResponse)
+    fast_response = FastJSONResponse.__new__(FastJSONResponse)
+    for name in ("transaction_list", "settlement_list"):
+        content = jsonable_encoder(payloads[name])
+        cases.append((
+            f"resposta {name.split('_')[0]} x{args.items}",
+            lambda c=content: stdlib_response.render(c),
+            lambda c=content: fast_response.render(c)
+        ))
+
+    formatter = JSONFormatter()
+    record = logging.LogRecord("cappta_simulator.bench", logging.INFO, __file__, 1, "Request completed", None, None)
+    record.request_id = "a1b2c3d4"
+    record.merchant_id = str(uuid.uuid4())
+    stdlib_formatter = JSONFormatter()
+    stdlib_formatter.format = lambda r: json.dumps({
+        "timestamp": datetime.utcfromtimestamp(r.created).isoformat() + "Z",
+        "level": r.levelname,
+        "logger": r.name,
+        "message": r.getMessage(),
+        "module": r.module,
+        "function": r.funcName,
+        "line": r.lineno,
+        "merchant_id": r.merchant_id,
+        "request_id": r.request_id
+    }, ensure_ascii=False)
+    cases.append(("log JSONFormatter", lambda: stdlib_formatter.format(record), lambda: formatter.format(record)))
+
+    print(f"=== Serialização JSON (backend: {'orjson' if HAS_ORJSON else 'stdlib'}) ===")
+    for label, before, after in cases:
+        rounds = max(10, args.rounds // (args.items if label.startswith("resposta") else 1))
+        before_us = measure(before, rounds)
+        after_us = measure(after, rounds)
+        print(f"{label:<28} stdlib={before_us:>9.2f} us  novo={after_us:>9.2f} us  ganho={before_us / after_us:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark de regressão: número de queries da listagem de liquidações
+
+Garante que SettlementProcessor.list_settlements executa a mesma quantidade
+de queries independentemente do tamanho da página (sem N+1 ao carregar
+transaction_refs). Roda sobre um SQLite temporário.
+
+    python scripts/bench_settlement_queries.py
+    python scripts/bench_settlement_queries.py --settlements 2000 --page-sizes 1 10 100 1000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def setup_environment():
+    """Aponta o simulador para um SQLite temporário"""
+    db_path = os.path.join(tempfile.mkdtemp(prefix="cappta_bench_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["DEBUG"] = "false"
+    os.environ.setdefault("API_TOKEN", "bench_token")
+
+
+def seed(settlement_count, transactions_per_settlement):
+    """Cria um comerciante com N liquidações e suas transações"""
+    from app.database.connection import create_tables, get_db_session
+    from app.database.models import ResellerDB, MerchantDB, TerminalDB, SettlementDB, TransactionDB
+
+    create_tables()
+
+    merchant_id = str(uuid.uuid4())
+    with get_db_session() as db:
+        db.add(ResellerDB(
+            reseller_id="reseller_bench",
+            document="00000000000191",
+            business_name="Bench Reseller",
+            email="bench@example.com",
+            api_token="bench_reseller_token"
+        ))
+        db.add(MerchantDB(
+            merchant_id=merchant_id,
+            reseller_id="reseller_bench",
+            asaas_account_id="acc_bench",
+            business_name="Bench Merchant",
+            document="00000000000272",
+            email="bench@example.com",
+            phone="11999999999"
+        ))
+        db.add(TerminalDB(terminal_id="term_bench", merchant_id=merchant_id, serial_number="SN_BENCH"))
+
+        for i in range(settlement_count):
+            settlement_id = f"stl_{i:08d}"
+            db.add(SettlementDB(
+                settlement_id=settlement_id,
+                merchant_id=merchant_id,
+                gross_amount=1000 * transactions_per_settlement,
+                fee_amount=30 * transactions_per_settlement,
+                net_amount=970 * transactions_per_settlement,
+                transaction_count=transactions_per_settlement,
+                settlement_date=date.today(),
+                status="completed"
+            ))
+            for j in range(transactions_per_settlement):
+                db.add(TransactionDB(
+                    transaction_id=f"txn_{i:08d}_{j}",
+                    merchant_id=merchant_id,
+                    terminal_id="term_bench",
+                    nsu=f"{i:08d}{j:04d}",
+                    authorization_code="BENCH",
+                    external_event_id=f"evt_{i:08d}_{j}",
+                    payment_method="credit",
+                    gross_amount=1000,
+                    fee_amount=30,
+                    net_amount=970,
+                    status="settled",
+                    captured_at=datetime.utcnow(),
+                    settlement_id=settlement_id
+                ))
+
+    return merchant_id
+
+
+async def measure(merchant_id, page_sizes):
+    from sqlalchemy import event
+    from app.database.connection import async_engine, async_read_engine, close_db
+    from app.services.settlement_processor import SettlementProcessor
+
+    counter = {"queries": 0}
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        counter["queries"] += 1
+
+    # Leituras vão para o pool de leitura no SQLite; conta nos dois engines
+    engines = {async_engine.sync_engine, async_read_engine.sync_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count_query)
+
+    processor = SettlementProcessor()
+    results = []
+    for per_page in page_sizes:
+        counter["queries"] = 0
+        started = time.perf_counter()
+        settlements, _ = await processor.list_settlements(merchant_id=merchant_id, page=1, per_page=per_page)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        results.append({
+            "per_page": per_page,
+            "returned": len(settlements),
+            "queries": counter["queries"],
+            "elapsed_ms": round(elapsed_ms, 2)
+        })
+
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", count_query)
+
+    # Conexões aiosqlite em pool mantêm threads vivas até o dispose
+    await close_db()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--settlements", type=int, default=1000)
+    parser.add_argument("--transactions-per-settlement", type=int, default=3)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    args = parser.parse_args()
+
+    setup_environment()
+    merchant_id = seed(args.settlements, args.transactions_per_settlement)
+    results = asyncio.run(measure(merchant_id, args.page_sizes))
+
+    print("=== list_settlements ===")
+    for result in results:
+        print(f"per_page={result['per_page']:>5}  retornadas={result['returned']:>5}  "
+              f"queries={result['queries']:>3}  tempo={result['elapsed_ms']} ms")
+
+    query_counts = {result["queries"] for result in results}
+    if len(query_counts) != 1:
+        print("\nFALHA: número de queries varia com o tamanho da página (N+1)")
+        sys.exit(1)
+
+    print(f"\nOK: {query_counts.pop()} queries independentemente do tamanho da página")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latência do POST /transactions sob carga concorrente
+
+Mede p50/p95/p99 de criação de transações com N requisições simultâneas.
+
+Modos de execução:
+- Em processo (padrão): monta o router de transactions numa app FastAPI
+  mínima sobre um SQLite temporário e dispara as requisições via ASGI.
+- Servidor remoto (--url): dispara contra um simulador já em execução, usando
+  um comerciante existente (--merchant-id).
+
+Para comparar antes/depois, salve o resultado de cada build com --output e
+passe o arquivo anterior em --baseline:
+
+    python scripts/bench_transactions.py --output antes.json      # build antigo
+    python scripts/bench_transactions.py --baseline antes.json    # build novo
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, pct):
+    """Percentil por interpolação linear"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def build_in_process_app():
+    """Monta app mínima com SQLite temporário (webhooks falham rápido)"""
+    db_path = os.path.join(tempfile.mkdtemp(prefix="cappta_bench_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["DEBUG"] = "false"
+    os.environ.setdefault("API_TOKEN", "bench_token")
+    os.environ["TRICKET_WEBHOOK_URL"] = "http://127.0.0.1:9/webhook"
+    os.environ["WEBHOOK_RETRY_ATTEMPTS"] = "1"
+    os.environ["WEBHOOK_TIMEOUT"] = "1"
+    os.environ["ALLOWED_IPS"] = '["127.0.0.1"]'
+
+    from fastapi import FastAPI
+    from app.api import transactions
+    from app.database.connection import create_tables
+
+    create_tables()
+
+    app = FastAPI()
+    app.include_router(transactions.router, prefix="/transactions")
+    return app, os.environ["API_TOKEN"], seed_merchant()
+
+
+def seed_merchant():
+    """Cria reseller, comerciante e terminal diretamente no banco temporário"""
+    from app.database.connection import get_db_session
+    from app.database.models import ResellerDB, MerchantDB, TerminalDB
+
+    suffix = uuid.uuid4().int % 10**8
+    merchant_id = str(uuid.uuid4())
+
+    with get_db_session() as db:
+        db.add(ResellerDB(
+            reseller_id=f"reseller_bench_{suffix}",
+            document=f"{suffix:014d}",
+            business_name="Bench Reseller",
+            email="bench@example.com",
+            api_token="bench_reseller_token"
+        ))
+        db.add(MerchantDB(
+            merchant_id=merchant_id,
+            reseller_id=f"reseller_bench_{suffix}",
+            asaas_account_id=f"acc_bench_{suffix}",
+            business_name="Bench Merchant",
+            document=f"{suffix + 1:014d}",
+            email="bench@example.com",
+            phone="11999999999"
+        ))
+        db.add(TerminalDB(
+            terminal_id="term_bench",
+            merchant_id=merchant_id,
+            serial_number=f"SN_BENCH_{suffix}"
+        ))
+
+    return merchant_id
+
+
+async def run_benchmark(client, token, merchant_id, total, concurrency):
+    headers = {"Authorization": f"Bearer {token}"}
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one_request(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            resp = await client.post("/transactions/", headers=headers, json={
+                "merchant_id": merchant_id,
+                "terminal_id": "term_bench",
+                "gross_amount": 10000 + i,
+                "installments": 1
+            })
+            latencies.append((time.perf_counter() - started) * 1000)
+            if resp.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+        "mean_ms": round(statistics.mean(latencies), 2)
+    }
+
+
+async def main_async(args):
+    import httpx
+
+    if args.url:
+        if not args.merchant_id:
+            raise SystemExit("--merchant-id é obrigatório com --url")
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        token, merchant_id = args.token, args.merchant_id
+    else:
+        app, token, merchant_id = build_in_process_app()
+        client = httpx.AsyncClient(app=app, base_url="http://bench", timeout=60)
+
+    async with client:
+        # Aquecimento (conexões, caches, criação do arquivo SQLite)
+        await run_benchmark(client, token, merchant_id, min(20, args.requests), args.concurrency)
+        result = await run_benchmark(client, token, merchant_id, args.requests, args.concurrency)
+
+    if not args.url:
+        # Conexões aiosqlite em pool mantêm threads vivas até o dispose
+        from app.database.connection import close_db
+        await close_db()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="URL base de um simulador em execução")
+    parser.add_argument("--token", default=os.environ.get("API_TOKEN", "cappta_fake_token_dev_123"))
+    parser.add_argument("--merchant-id", help="Comerciante existente (modo --url)")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", help="Salva o resultado em JSON")
+    parser.add_argument("--baseline", help="Resultado anterior (JSON) para comparação")
+    args = parser.parse_args()
+
+    result = asyncio.run(main_async(args))
+
+    print("=== POST /transactions ===")
+    for key, value in result.items():
+        print(f"{key:>16}: {value}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print("\n=== Comparação com baseline ===")
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            before, after = baseline.get(key), result[key]
+            if before:
+                print(f"{key:>16}: {before} -> {after} ({(after - before) / before * 100:+.1f}%)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
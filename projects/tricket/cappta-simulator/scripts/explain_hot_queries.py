@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Relatório de uso de índices das queries quentes
+
+Executa a migração do DatabaseMigrator (tabelas faltantes e estágio de
+índices, que cria os índices declarados que faltarem) e imprime o EXPLAIN
+QUERY PLAN de cada query quente. Sai com código 1 se alguma delas fizer
+varredura completa de tabela.
+
+    python scripts/explain_hot_queries.py                  # banco de DATABASE_URL
+    python scripts/explain_hot_queries.py --database-url sqlite:///./outro.db
+    python scripts/explain_hot_queries.py --no-create      # só reporta
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Banco a analisar (padrão: DATABASE_URL)")
+    parser.add_argument("--no-create", action="store_true", help="Não migra; só reporta")
+    args = parser.parse_args()
+
+    from app.database.migrations import DatabaseMigrator
+
+    migrator = DatabaseMigrator(args.database_url)
+
+    if not args.no_create:
+        if not migrator.run_migration():
+            print("FALHA: migração do banco")
+            sys.exit(1)
+
+    report = migrator.explain_hot_queries()
+    for name, result in report.items():
+        marker = "SCAN" if result["full_scan"] else "ok"
+        print(f"[{marker:>4}] {name}")
+        for line in result["plan"]:
+            print(f"         {line}")
+
+    full_scans = [name for name, result in report.items() if result["full_scan"]]
+    if full_scans:
+        print(f"\nFALHA: varredura completa em {', '.join(full_scans)}")
+        sys.exit(1)
+
+    print(f"\nOK: {len(report)} queries quentes usando índice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+import os
+
+# Settings() requires API_TOKEN
+os.environ.setdefault("API_TOKEN", "cappta_fake_token_test")
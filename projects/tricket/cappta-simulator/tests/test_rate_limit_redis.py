@@ -0,0 +1,101 @@
+"""
+Runs the Redis rate limiter Lua scripts on fakeredis (with its embedded Lua
+interpreter), checking that limiters sharing a server share the limits
+"""
+
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from app.middleware.rate_limit_backends import (
+    APPROXIMATE_WINDOW_SCRIPT,
+    SLIDING_WINDOW_SCRIPT,
+    TOKEN_BUCKET_SCRIPT,
+    RedisRateLimitBackend,
+)
+
+
+def shared_limiters(window_mode: str = "approximate"):
+    """Two backends, each with its own client, on the same Redis server"""
+    
+    server = fakeredis.FakeServer()
+    return [
+        RedisRateLimitBackend(
+            client=fakeredis.FakeAsyncRedis(server=server),
+            key_prefix="test:",
+            window_mode=window_mode
+        )
+        for _ in range(2)
+    ]
+
+
+def test_token_bucket_is_shared():
+    async def scenario():
+        first, second = shared_limiters()
+        
+        # Refill is negligible during the test: 3 tokens in total
+        results = [
+            await first.consume_token("client", 3, 0.001),
+            await second.consume_token("client", 3, 0.001),
+            await first.consume_token("client", 3, 0.001),
+        ]
+        denied_first = await first.consume_token("client", 3, 0.001)
+        denied_second = await second.consume_token("client", 3, 0.001)
+        other_key = await second.consume_token("other", 3, 0.001)
+        
+        return results, denied_first, denied_second, other_key
+    
+    results, denied_first, denied_second, other_key = asyncio.run(scenario())
+    
+    assert all(allowed for allowed, _ in results)
+    assert denied_first[0] is False and denied_first[1] > 0
+    assert denied_second[0] is False and denied_second[1] > 0
+    assert other_key[0] is True
+
+
+@pytest.mark.parametrize("window_mode", ["exact", "approximate"])
+def test_sliding_window_is_shared(window_mode):
+    async def scenario():
+        first, second = shared_limiters(window_mode)
+        
+        hits = []
+        for limiter in (first, second, first, second):
+            hits.append(await limiter.hit_sliding_window("client", 4, 60))
+        
+        denied_first = await first.hit_sliding_window("client", 4, 60)
+        denied_second = await second.hit_sliding_window("client", 4, 60)
+        return hits, denied_first, denied_second
+    
+    hits, denied_first, denied_second = asyncio.run(scenario())
+    
+    # Counts reflect requests made through both limiters
+    assert [allowed for allowed, _, _ in hits] == [True] * 4
+    assert [count for _, count, _ in hits] == [1, 2, 3, 4]
+    assert denied_first[0] is False and denied_first[1] >= 4
+    assert denied_second[0] is False and denied_second[1] >= 4
+
+
+def test_scripts_fall_back_to_eval_and_are_cached():
+    async def scenario():
+        first, second = shared_limiters()
+        scripts = [TOKEN_BUCKET_SCRIPT, SLIDING_WINDOW_SCRIPT, APPROXIMATE_WINDOW_SCRIPT]
+        
+        before = await first.client.script_exists(*[script.sha for script in scripts])
+        
+        # The first call of each script gets NOSCRIPT and loads it through EVAL
+        await first.consume_token("client", 10, 1.0)
+        await first.hit_sliding_window("client", 10, 60)
+        first.window_mode = "exact"
+        await first.hit_sliding_window("client", 10, 60)
+        
+        # The other client finds the scripts cached on the shared server
+        after = await second.client.script_exists(*[script.sha for script in scripts])
+        return before, after
+    
+    before, after = asyncio.run(scenario())
+    
+    assert not any(before)
+    assert all(after)
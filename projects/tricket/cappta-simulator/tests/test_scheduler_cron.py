@@ -0,0 +1,79 @@
+"""
+CronSchedule parsing and next_after (pure logic, no database)
+"""
+
+from datetime import datetime
+
+import pytest
+
+from app.services.scheduler import CronSchedule
+
+
+def test_steps_ranges_and_lists():
+    schedule = CronSchedule("*/15 8-18/5 1,15 * *")
+    
+    assert schedule.minutes == {0, 15, 30, 45}
+    assert schedule.hours == {8, 13, 18}
+    assert schedule.days == {1, 15}
+    assert schedule.months == set(range(1, 13))
+
+
+def test_weekday_seven_is_sunday():
+    assert CronSchedule("0 0 * * 7").weekdays == {0}
+    # 2024-09-01 is a Sunday
+    assert CronSchedule("0 0 * * 7").next_after(datetime(2024, 8, 31, 12, 0)) == datetime(2024, 9, 1, 0, 0)
+
+
+def test_day_of_month_or_weekday_when_both_restricted():
+    # Day 13 OR Friday
+    schedule = CronSchedule("0 0 13 * 5")
+    
+    assert schedule.next_after(datetime(2024, 10, 1)) == datetime(2024, 10, 4)   # Friday
+    assert schedule.next_after(datetime(2024, 10, 11)) == datetime(2024, 10, 13)  # Sunday the 13th
+
+
+def test_step_day_of_month_does_not_trigger_the_or_rule():
+    # `*/2` is unrestricted for the OR rule: odd days that are also Mondays
+    schedule = CronSchedule("0 0 */2 * 1")
+    
+    assert schedule.any_day
+    # Sunday 2024-09-01 is odd but not Monday; Monday 09-02 is even
+    assert schedule.next_after(datetime(2024, 8, 31)) == datetime(2024, 9, 9)
+
+
+def test_next_after_is_strictly_later():
+    schedule = CronSchedule("0 6 * * *")
+    
+    assert schedule.next_after(datetime(2024, 5, 10, 6, 0)) == datetime(2024, 5, 11, 6, 0)
+    assert schedule.next_after(datetime(2024, 5, 10, 5, 59, 30)) == datetime(2024, 5, 10, 6, 0)
+
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    # Month rollover from the last minute of January
+    ("30 6 1 * *", datetime(2024, 1, 31, 23, 59), datetime(2024, 2, 1, 6, 30)),
+    # Day 31 skips the months that do not have it
+    ("0 0 31 * *", datetime(2024, 4, 1), datetime(2024, 5, 31)),
+    # Year rollover
+    ("0 0 1 1 *", datetime(2024, 12, 31, 12, 0), datetime(2025, 1, 1)),
+    # Next leap day
+    ("0 0 29 2 *", datetime(2025, 1, 1), datetime(2028, 2, 29)),
+])
+def test_next_after_rolls_over_months_and_years(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "* * * *",
+    "60 * * * *",
+    "*/0 * * * *",
+    "0 0 32 * *",
+    "0 0 * * mon",
+])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_never_matching_expression():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 31 2 *").next_after(datetime(2024, 1, 1))
@@ -0,0 +1,66 @@
+"""
+Business-day calendar behind expected_settlement_date (pure logic, no database)
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from app.models.common import PaymentMethod
+from app.services.settlement_calendar import SettlementCalendar, easter_sunday, national_holidays
+
+
+@pytest.mark.parametrize("year, expected", [
+    (2024, date(2024, 3, 31)),
+    (2025, date(2025, 4, 20)),
+    (2026, date(2026, 4, 5)),
+])
+def test_easter_sunday(year, expected):
+    assert easter_sunday(year) == expected
+
+
+def test_movable_holidays_2025():
+    holidays = national_holidays(2025)
+    
+    assert {date(2025, 3, 3), date(2025, 3, 4)} <= holidays  # Carnaval
+    assert date(2025, 4, 18) in holidays                     # Sexta-feira Santa
+    assert date(2025, 6, 19) in holidays                     # Corpus Christi
+    assert date(2025, 11, 20) in holidays                    # Consciência Negra
+
+
+def test_consciencia_negra_only_from_2024():
+    assert date(2023, 11, 20) not in national_holidays(2023)
+    assert date(2024, 11, 20) in national_holidays(2024)
+
+
+def test_saturday_capture_with_d_plus_1_settles_on_tuesday():
+    calendar = SettlementCalendar()
+    
+    # 2024-06-01 is a Saturday: counting starts on Monday 06-03
+    assert calendar.add_business_days(date(2024, 6, 1), 1) == date(2024, 6, 4)
+    assert calendar.add_business_days(date(2024, 6, 1), 0) == date(2024, 6, 3)
+
+
+def test_d_plus_1_skips_carnival():
+    calendar = SettlementCalendar()
+    
+    # Friday before Carnaval 2024 (Monday 02-12 and Tuesday 02-13)
+    assert calendar.add_business_days(date(2024, 2, 9), 1) == date(2024, 2, 14)
+
+
+def test_extra_holidays():
+    calendar = SettlementCalendar(extra_holidays=[date(2024, 6, 4)])
+    
+    assert calendar.add_business_days(date(2024, 6, 1), 1) == date(2024, 6, 5)
+
+
+def test_expected_settlement_date_uses_the_method_delay(monkeypatch):
+    from app.services import settlement_calendar as module
+    
+    monkeypatch.setattr(module.settings, "SETTLEMENT_DELAY_CREDIT", 24)
+    monkeypatch.setattr(module.settings, "SETTLEMENT_DELAY_PIX", 0)
+    calendar = SettlementCalendar()
+    captured_at = datetime(2024, 6, 1, 15, 30)  # Saturday
+    
+    assert calendar.expected_settlement_date(captured_at, PaymentMethod.CREDIT) == date(2024, 6, 4)
+    assert calendar.expected_settlement_date(captured_at, "pix") == date(2024, 6, 3)